@@ -0,0 +1,22 @@
+"""
+Timing helpers shared by the benchmark scripts.
+"""
+
+import time
+
+
+def best_time(func, num_repeats):
+    """
+    Args:
+        func (callable): function to time, called without arguments
+        num_repeats (int): number of runs
+
+    Returns:
+        float: fastest of num_repeats runs in seconds
+    """
+    times = []
+    for _ in range(num_repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -0,0 +1,62 @@
+"""
+Benchmark requests per second of TidepoolAPI against a local stand-in server,
+comparing a new connection per request with a pooled keep-alive session.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI, create_session
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+def run_requests(tp_api, num_requests, num_threads=1):
+    """
+    Time repeated small requests so connection setup is a large share of each request.
+
+    Args:
+        tp_api (TidepoolAPI): logged in api
+        num_requests (int): total requests to make
+        num_threads (int): number of threads making requests
+
+    Returns:
+        float: requests per second
+    """
+    def fetch(_):
+        tp_api.get_users_sharing_with()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        list(executor.map(fetch, range(num_requests)))
+    elapsed = time.perf_counter() - start
+
+    return num_requests / elapsed
+
+
+def benchmark_sessions(num_requests=2000, num_threads=4):
+    """
+    Compare connection per request against a pooled keep-alive session.
+
+    Returns:
+        dict: requests per second for each configuration
+    """
+    results = {}
+    with MockTidepoolServer(separate_process=True) as server:
+
+        configurations = {
+            "no_keep_alive": create_session(keep_alive=False),
+            "pooled_keep_alive": create_session(pool_maxsize=num_threads),
+        }
+        for name, session in configurations.items():
+            tp_api = TidepoolAPI("user", "pass", session=session, api_base_url=server.base_url)
+            tp_api.login()
+            results[name] = run_requests(tp_api, num_requests, num_threads=num_threads)
+            session.close()
+
+    return results
+
+
+if __name__ == "__main__":
+
+    for name, requests_per_sec in benchmark_sessions().items():
+        print("{:<20} {:>10.1f} req/s".format(name, requests_per_sec))
@@ -0,0 +1,176 @@
+"""
+End-to-end download benchmarks for TidepoolAPI and AsyncTidepoolAPI against the
+local mock server: throughput, request latency percentiles and peak memory for
+single-user and cohort workloads.
+"""
+
+import time
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI, create_session
+from data_science_tidepool_api_python.makedata.async_tidepool_api import download_observed_users_data
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+def measure(func):
+    """
+    Run a function and measure wall time.
+
+    Returns:
+        (object, float): function result and seconds elapsed
+    """
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def measure_peak_memory(func):
+    """
+    Run a function and measure peak python memory allocated while it runs.
+
+    Returns:
+        float: peak MB allocated
+    """
+    tracemalloc.start()
+    func()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak_bytes / 1e6
+
+
+def get_latency_percentiles(latencies_sec, percentiles=(50, 90, 99)):
+    """
+    Returns:
+        dict: percentile mapped to latency in ms
+    """
+    return {p: np.percentile(latencies_sec, p) * 1000 for p in percentiles}
+
+
+def benchmark_single_user(server, window_days=30, num_latency_requests=20):
+    """
+    Download all of one user's data in different modes.
+
+    Args:
+        server (MockTidepoolServer): running server
+        window_days (int): window size for the windowed mode
+        num_latency_requests (int): number of repeated requests for latency percentiles
+
+    Returns:
+        dict: mode mapped to stats
+    """
+    user_id = server.user_ids[0]
+    tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url)
+    tp_api.login()
+
+    modes = {
+        "single_request": lambda: tp_api.get_user_event_data(server.start_date, server.end_date,
+                                                             observed_user_id=user_id),
+        "windowed_{}d".format(window_days): lambda: tp_api.get_user_event_data(
+            server.start_date, server.end_date, observed_user_id=user_id, window_days=window_days),
+        "streaming": lambda: sum(1 for _ in tp_api.get_user_event_data(
+            server.start_date, server.end_date, observed_user_id=user_id, stream=True)),
+    }
+
+    results = {}
+    for mode, download in modes.items():
+        download()  # warm up server response cache
+
+        latencies = [measure(download)[1] for _ in range(num_latency_requests)]
+        events = download()
+        num_events = events if isinstance(events, int) else len(events)
+
+        results[mode] = {
+            "num_events": num_events,
+            "events_per_sec": num_events / np.median(latencies),
+            "latency_ms": get_latency_percentiles(latencies),
+            "peak_mb": measure_peak_memory(download),
+        }
+
+    tp_api.close()
+
+    return results
+
+
+def benchmark_cohort(server, max_workers=16, max_concurrency=100):
+    """
+    Download data and notes for every user of the observer account.
+
+    Args:
+        server (MockTidepoolServer): running server
+        max_workers (int): threads for the threaded client
+        max_concurrency (int): requests in flight for the async client
+
+    Returns:
+        dict: client mapped to stats
+    """
+    user_ids = server.user_ids
+
+    def download_threaded():
+        session = create_session(pool_maxsize=max_workers)
+        tp_api = TidepoolAPI("user", "pass", session=session, api_base_url=server.base_url)
+        tp_api.login()
+
+        def download_user(user_id):
+            events = tp_api.get_user_event_data(server.start_date, server.end_date, observed_user_id=user_id)
+            tp_api.get_notes(server.start_date, server.end_date, observed_user_id=user_id)
+            return len(events)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            num_events = sum(executor.map(download_user, user_ids))
+
+        session.close()
+        return num_events
+
+    def download_async():
+        # Users are written to disk as they finish, without column tables to stay close to the threaded client
+        with tempfile.TemporaryDirectory() as data_dir:
+            user_entries = download_observed_users_data("user", "pass", server.start_date, server.end_date,
+                                                        user_ids=user_ids, max_concurrency=max_concurrency,
+                                                        api_base_url=server.base_url, write_columns=False,
+                                                        data_dir=data_dir)
+        return sum(user_entry.get("num_events", 0) for user_entry in user_entries.values())
+
+    results = {}
+    for client, download in [("threaded_{}".format(max_workers), download_threaded),
+                             ("async_{}".format(max_concurrency), download_async)]:
+        num_events, elapsed = measure(download)
+        results[client] = {
+            "num_users": len(user_ids),
+            "num_events": num_events,
+            "users_per_sec": len(user_ids) / elapsed,
+            "events_per_sec": num_events / elapsed,
+            "seconds": elapsed,
+        }
+
+    return results
+
+
+def print_results(title, results):
+
+    print(title)
+    for name, stats in results.items():
+        line = "  {:<20}".format(name)
+        for key, value in stats.items():
+            if isinstance(value, dict):
+                value = "/".join("{:.1f}".format(v) for v in value.values())
+                key += "(p50/p90/p99)"
+            elif isinstance(value, float):
+                value = "{:.1f}".format(value)
+            line += " {}={}".format(key, value)
+        print(line)
+
+
+if __name__ == "__main__":
+
+    with MockTidepoolServer(num_users=1, num_days=365, separate_process=True) as server:
+        print_results("Single user, 1 year", benchmark_single_user(server))
+
+    with MockTidepoolServer(num_users=1, num_days=365, latency_sec=0.05, separate_process=True) as server:
+        print_results("Single user, 1 year, 50ms latency", benchmark_single_user(server, num_latency_requests=5))
+
+    with MockTidepoolServer(num_users=200, num_days=14, latency_sec=0.05, separate_process=True) as server:
+        print_results("Cohort of 200 users, 2 weeks each, 50ms latency", benchmark_cohort(server))
@@ -0,0 +1,62 @@
+"""
+Benchmark file size, write time and load time of user event data for each
+available compression codec.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+
+from data_science_tidepool_api_python.makedata.compression import get_available_compressions, get_compressed_path
+from data_science_tidepool_api_python.makedata.make_user import save_json_atomic, load_json_file, EVENT_DATA_FILENAME
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+
+def benchmark_compression(num_days=365, num_repeats=3):
+    """
+    Write and load a synthetic user's event data with each codec.
+
+    Args:
+        num_days (int): days of synthetic data
+        num_repeats (int): repeats per measurement, the best is reported
+
+    Returns:
+        dict: codec mapped to stats
+    """
+    event_json = make_synthetic_user_events(num_days)
+    save_dir = tempfile.mkdtemp()
+
+    results = {}
+    try:
+        for compression in get_available_compressions():
+            path = get_compressed_path(os.path.join(save_dir, EVENT_DATA_FILENAME), compression)
+
+            write_times = []
+            load_times = []
+            for _ in range(num_repeats):
+                start = time.perf_counter()
+                save_json_atomic(event_json, path, compression=compression)
+                write_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                load_json_file(path)
+                load_times.append(time.perf_counter() - start)
+
+            results[str(compression)] = {
+                "size_mb": os.path.getsize(path) / 1e6,
+                "write_sec": min(write_times),
+                "load_sec": min(load_times),
+            }
+    finally:
+        shutil.rmtree(save_dir)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    print("{:<8} {:>10} {:>10} {:>10}".format("codec", "size_mb", "write_sec", "load_sec"))
+    for compression, stats in benchmark_compression().items():
+        print("{:<8} {:>10.2f} {:>10.3f} {:>10.3f}".format(compression, stats["size_mb"], stats["write_sec"],
+                                                           stats["load_sec"]))
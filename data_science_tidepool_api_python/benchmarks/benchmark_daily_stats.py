@@ -0,0 +1,149 @@
+"""
+Benchmark TidepoolUser.compute_daily_stats against the previous implementation, which scanned
+every timeline once per day, for synthetic users from 30 days to 5 years.
+"""
+
+import datetime as dt
+import warnings
+from collections import OrderedDict
+
+from scipy.stats import gmean, gstd
+
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser
+from data_science_tidepool_api_python.benchmarks.synthetic_data import (
+    make_synthetic_user_events, DEFAULT_SYNTHETIC_START_DATE
+)
+from data_science_tidepool_api_python.benchmarks._timing import best_time
+
+DEFAULT_SPAN_DAYS = [30, 365, 2 * 365, 5 * 365]
+
+
+def get_loop_timelines(user):
+    """
+    Copy the user timelines into the OrderedDicts the previous implementation stored them in.
+    """
+    return {
+        timeline_name: OrderedDict(user.get_timeline(timeline_name).items())
+        for timeline_name in ["glucose_timeline", "food_timeline", "basal_timeline", "bolus_timeline"]
+    }
+
+
+def get_total_insulin_loop(timelines, start_date, end_date):
+    """
+    The previous TidepoolUser.get_total_insulin, summing whole basal segments that start in the range.
+    """
+    total_bolus = 0.0
+    num_bolus_events = 0
+    total_basal = 0.0
+    num_basal_events = 0
+
+    for time, bolus in timelines["bolus_timeline"].items():
+        if start_date <= time <= end_date:
+            total_bolus += bolus.get_value()
+            num_bolus_events += 1
+
+    for time, basal in timelines["basal_timeline"].items():
+        if start_date <= time <= end_date:
+            rate = basal.get_value()
+            amount_delivered = rate * basal.get_duration_hours()
+            total_basal += amount_delivered
+            num_basal_events += 1
+
+    return total_bolus, num_bolus_events, total_basal, num_basal_events
+
+
+def get_total_carbs_loop(timelines, start_date, end_date):
+    """
+    The previous TidepoolUser.get_total_carbs.
+    """
+    total_carbs = 0.0
+    num_carb_events = 0
+    for time, food in timelines["food_timeline"].items():
+        if start_date <= time <= end_date:
+            total_carbs += food.get_value()
+            num_carb_events += 1
+
+    return total_carbs, num_carb_events
+
+
+def get_cgm_stats_loop(timelines, start_date, end_date):
+    """
+    The previous TidepoolUser.get_cgm_stats.
+    """
+    cgm_values = []
+    for time, cgm_event in timelines["glucose_timeline"].items():
+        if start_date <= time <= end_date:
+            cgm_value = cgm_event.get_value()
+            cgm_values.append(cgm_value)
+
+    return gmean(cgm_values), gstd(cgm_values)
+
+
+def compute_daily_stats_per_day(timelines, start_date, end_date, circadian_hour):
+    """
+    The previous TidepoolUser.compute_daily_stats, which scanned every timeline once per day, for comparison.
+    """
+    target_bg = 100
+    num_days = int((end_date - start_date).total_seconds() / 3600 / 24)
+    start_datetime_withoffset = dt.datetime(year=start_date.year, month=start_date.month, day=start_date.day,
+                                            hour=circadian_hour)
+
+    daily_stats = []
+    for i in range(num_days):
+        daily_start_datetime = start_datetime_withoffset + dt.timedelta(days=i)
+        daily_end_datetime = daily_start_datetime + dt.timedelta(days=1)
+
+        total_bolus, _, total_basal, _ = get_total_insulin_loop(timelines, daily_start_datetime, daily_end_datetime)
+        total_insulin = total_bolus + total_basal
+        total_carbs, _ = get_total_carbs_loop(timelines, daily_start_datetime, daily_end_datetime)
+        cgm_geo_mean, cgm_geo_std = get_cgm_stats_loop(timelines, daily_start_datetime, daily_end_datetime)
+
+        daily_stats.append({
+            "date": daily_start_datetime,
+            "total_insulin": total_insulin,
+            "total_basal": total_basal,
+            "total_bolus": total_bolus,
+            "total_carbs": total_carbs,
+            "cgm_geo_mean": cgm_geo_mean,
+            "cgm_geo_std": cgm_geo_std,
+            "carb_insulin_ratio": total_carbs / (total_insulin * 0.5),
+            "residual_cgm": cgm_geo_mean - target_bg
+        })
+
+    return daily_stats
+
+
+def benchmark_daily_stats(span_days=DEFAULT_SPAN_DAYS, num_repeats=3):
+    """
+    Args:
+        span_days (list): number of days of data per synthetic user
+        num_repeats (int): repeats per measurement, the best is reported
+
+    Returns:
+        dict: span in days mapped to seconds for each implementation
+    """
+    results = {}
+    for num_days in span_days:
+        user = TidepoolUser(make_synthetic_user_events(num_days))
+        start_date = DEFAULT_SYNTHETIC_START_DATE
+        end_date = start_date + dt.timedelta(days=num_days)
+        circadian_hour = user.detect_circadian_hr()
+        timelines = get_loop_timelines(user)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results[num_days] = {
+                "per_day_sec": best_time(
+                    lambda: compute_daily_stats_per_day(timelines, start_date, end_date, circadian_hour), num_repeats),
+                "vectorized_sec": best_time(lambda: user.compute_daily_stats(start_date, end_date), num_repeats),
+            }
+
+    return results
+
+
+if __name__ == "__main__":
+
+    print("{:>6} {:>12} {:>15} {:>8}".format("days", "per_day_sec", "vectorized_sec", "speedup"))
+    for num_days, stats in benchmark_daily_stats().items():
+        print("{:>6} {:>12.3f} {:>15.4f} {:>7.0f}x".format(
+            num_days, stats["per_day_sec"], stats["vectorized_sec"], stats["per_day_sec"] / stats["vectorized_sec"]))
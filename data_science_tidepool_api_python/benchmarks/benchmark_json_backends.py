@@ -0,0 +1,73 @@
+"""
+Benchmark each installed json backend on synthetic user payloads: decoding bytes,
+loading a saved user file and downloading from the local mock server.
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+from data_science_tidepool_api_python.makedata import json_backend
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI
+from data_science_tidepool_api_python.makedata.make_user import save_json_atomic, load_json_file, EVENT_DATA_FILENAME
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+from data_science_tidepool_api_python.benchmarks._timing import best_time
+
+
+def benchmark_json_backends(num_days=365, num_repeats=3):
+    """
+    Decode, load and download a synthetic user's event data with each backend.
+
+    Args:
+        num_days (int): days of synthetic data
+        num_repeats (int): repeats per measurement, the best is reported
+
+    Returns:
+        dict: backend mapped to stats
+    """
+    event_json = make_synthetic_user_events(num_days)
+    payload_bytes = json.dumps(event_json).encode()
+
+    save_dir = tempfile.mkdtemp()
+    path = os.path.join(save_dir, EVENT_DATA_FILENAME)
+    save_json_atomic(event_json, path)
+
+    results = {}
+    try:
+        with MockTidepoolServer(num_users=1, num_days=num_days, separate_process=True) as server:
+            tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url)
+            tp_api.login()
+
+            def download():
+                tp_api.get_user_event_data(server.start_date, server.end_date, observed_user_id=server.user_ids[0])
+
+            download()  # warm up server response cache
+
+            for backend in json_backend.get_available_json_backends():
+                json_backend.set_json_backend(backend)
+
+                decode_sec = best_time(lambda: json_backend.loads(payload_bytes), num_repeats)
+                results[backend] = {
+                    "decode_sec": decode_sec,
+                    "decode_mb_per_sec": len(payload_bytes) / 1e6 / decode_sec,
+                    "load_file_sec": best_time(lambda: load_json_file(path), num_repeats),
+                    "download_sec": best_time(download, num_repeats),
+                }
+
+            tp_api.close()
+    finally:
+        json_backend.set_json_backend()
+        shutil.rmtree(save_dir)
+
+    return results
+
+
+if __name__ == "__main__":
+
+    print("{:<10} {:>11} {:>8} {:>14} {:>13}".format("backend", "decode_sec", "MB/s", "load_file_sec",
+                                                     "download_sec"))
+    for backend, stats in benchmark_json_backends().items():
+        print("{:<10} {:>11.3f} {:>8.1f} {:>14.3f} {:>13.3f}".format(
+            backend, stats["decode_sec"], stats["decode_mb_per_sec"], stats["load_file_sec"], stats["download_sec"]))
@@ -0,0 +1,86 @@
+"""
+Benchmark memory per event of a user's timelines for a synthetic year of data: the
+timeline arrays, the slotted event objects built for the mapping view, and event
+objects with a __dict__ per instance as they were before.
+"""
+
+import gc
+import tracemalloc
+
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+TIMELINE_NAMES = ["glucose_timeline", "food_timeline", "basal_timeline", "bolus_timeline"]
+
+
+class DictEvent(object):
+    """
+    The previous event layout with a __dict__ per instance and a units string per event, for comparison.
+    """
+
+    def __init__(self, attributes):
+        self.__dict__.update(attributes)
+
+
+def measure_bytes(func):
+    """
+    Returns:
+        int: bytes allocated by func that are still held by its result
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        result = func()
+        gc.collect()
+        end_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del result
+    return end_bytes - start_bytes
+
+
+def benchmark_memory(num_days=365):
+    """
+    Args:
+        num_days (int): days of synthetic data
+
+    Returns:
+        dict: timeline name mapped to number of events and bytes per event for each layout
+    """
+    user = TidepoolUser(make_synthetic_user_events(num_days))
+
+    results = {}
+    for timeline_name in TIMELINE_NAMES:
+        timeline = user.get_timeline(timeline_name)
+        num_events = max(len(timeline), 1)
+
+        # is_cgm only picks the glucose class, it was never an attribute
+        attribute_names = [column_name for column_name in timeline.columns if column_name != "is_cgm"]
+
+        def make_rows():
+            return zip(*[column.tolist() for column in timeline.columns.values()])
+
+        array_bytes = timeline.times.nbytes + sum(column.nbytes for column in timeline.columns.values())
+        slotted_bytes = measure_bytes(lambda: [timeline.event_factory(*row) for row in make_rows()])
+        dict_bytes = measure_bytes(lambda: [DictEvent(zip(attribute_names, row)) for row in make_rows()])
+
+        results[timeline_name] = {
+            "num_events": len(timeline),
+            "array_bytes_per_event": array_bytes / num_events,
+            "slotted_object_bytes_per_event": slotted_bytes / num_events,
+            "dict_object_bytes_per_event": dict_bytes / num_events,
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+
+    print("Bytes per event")
+    print("{:<18} {:>9} {:>8} {:>9} {:>7}".format("timeline", "events", "arrays", "slotted", "dict"))
+    for timeline_name, stats in benchmark_memory().items():
+        print("{:<18} {:>9,} {:>8.1f} {:>9.1f} {:>7.1f}".format(
+            timeline_name, stats["num_events"], stats["array_bytes_per_event"],
+            stats["slotted_object_bytes_per_event"], stats["dict_object_bytes_per_event"]))
@@ -0,0 +1,83 @@
+"""
+Benchmark rolling CGM metrics over a sliding window ending at each sample: rescanning the
+glucose timeline per window against the incremental RollingCGMMetrics engine in batch and
+streaming modes.
+"""
+
+import time
+import datetime as dt
+
+import numpy as np
+
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser
+from data_science_tidepool_api_python.models.rolling_cgm import RollingCGMMetrics
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+DEFAULT_SPAN_DAYS = [30, 90, 365]
+
+
+def compute_rolling_metrics_rescan(user, window_hours):
+    """
+    Rescan the window for every sample, for comparison. Covers the sum based metrics only.
+    """
+    times = user.glucose_timeline.times[user.glucose_timeline.columns["is_cgm"]]
+    window = dt.timedelta(hours=window_hours)
+
+    window_metrics = []
+    for sample_time in times.tolist():
+        values = user.glucose_timeline.get_values(sample_time - window + dt.timedelta(milliseconds=1), sample_time)
+        mean = values.mean()
+        window_metrics.append((mean, values.std() / mean, np.mean((values >= 70) & (values <= 180))))
+
+    return window_metrics
+
+
+def benchmark_rolling_cgm(span_days=DEFAULT_SPAN_DAYS, window_hours=24):
+    """
+    Args:
+        span_days (list): number of days of data per synthetic user
+        window_hours (float): window length
+
+    Returns:
+        dict: span in days mapped to samples per second for each mode
+    """
+    results = {}
+    for num_days in span_days:
+        user = TidepoolUser(make_synthetic_user_events(num_days))
+        is_cgm = user.glucose_timeline.columns["is_cgm"]
+        times = user.glucose_timeline.times[is_cgm]
+        values = user.glucose_timeline.columns["value"][is_cgm]
+        num_samples = len(times)
+
+        start = time.perf_counter()
+        compute_rolling_metrics_rescan(user, window_hours)
+        rescan_sec = time.perf_counter() - start
+
+        start = time.perf_counter()
+        RollingCGMMetrics(window_hours).compute(times, values)
+        batch_sec = time.perf_counter() - start
+
+        engine = RollingCGMMetrics(window_hours)
+        start = time.perf_counter()
+        for sample_time, value in zip(times.tolist(), values.tolist()):
+            engine.update(sample_time, value)
+        streaming_sec = time.perf_counter() - start
+
+        results[num_days] = {
+            "num_samples": num_samples,
+            "rescan_per_sec": num_samples / rescan_sec,
+            "batch_per_sec": num_samples / batch_sec,
+            "streaming_per_sec": num_samples / streaming_sec,
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+
+    print("Samples per second, 24 hour window")
+    print("{:>6} {:>9} {:>10} {:>10} {:>10}".format("days", "samples", "rescan", "batch", "streaming"))
+    for num_days, stats in benchmark_rolling_cgm().items():
+        print("{:>6} {:>9,} {:>10,.0f} {:>10,.0f} {:>10,.0f}".format(
+            num_days, stats["num_samples"], stats["rescan_per_sec"], stats["batch_per_sec"],
+            stats["streaming_per_sec"]))
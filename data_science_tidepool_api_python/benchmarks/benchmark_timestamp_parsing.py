@@ -0,0 +1,66 @@
+"""
+Benchmark parsing event timestamps one at a time with strptime against the
+vectorized parse_api_timestamps, and the effect on building a TidepoolUser,
+for a synthetic year of CGM.
+"""
+
+import datetime as dt
+
+import numpy as np
+
+from data_science_tidepool_api_python.models.event_columns import parse_api_timestamps
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+from data_science_tidepool_api_python.benchmarks._timing import best_time
+from data_science_tidepool_api_python.util import API_DATA_TIMESTAMP_FORMAT
+
+
+def parse_api_timestamps_strptime(time_strs):
+    """
+    The previous per-event parse, for comparison.
+    """
+    return np.array([dt.datetime.strptime(time_str, API_DATA_TIMESTAMP_FORMAT) for time_str in time_strs],
+                    dtype="datetime64[ms]")
+
+
+def benchmark_timestamp_parsing(num_days=365, malformed_fraction=0.01, num_repeats=3):
+    """
+    Args:
+        num_days (int): days of synthetic data
+        malformed_fraction (float): fraction of timestamps rewritten without milliseconds to
+            exercise the per-row fallback
+        num_repeats (int): repeats per measurement, the best is reported
+
+    Returns:
+        dict: case mapped to events per second
+    """
+    event_json = make_synthetic_user_events(num_days)
+    time_strs = [event["time"] for event in event_json]
+
+    rng = np.random.RandomState(0)
+    mixed_time_strs = [time_str[:19] + "Z" if rng.rand() < malformed_fraction else time_str
+                       for time_str in time_strs]
+
+    if not np.array_equal(parse_api_timestamps(time_strs), parse_api_timestamps_strptime(time_strs)):
+        raise Exception("Vectorized parse does not match strptime.")
+
+    def build_user():
+        user = TidepoolUser(event_json)
+        for timeline_name in ["glucose_timeline", "food_timeline", "basal_timeline", "bolus_timeline"]:
+            user.get_timeline(timeline_name)
+
+    num_events = len(time_strs)
+    cases = {
+        "strptime": lambda: parse_api_timestamps_strptime(time_strs),
+        "vectorized": lambda: parse_api_timestamps(time_strs),
+        "vectorized_{:.0%}_malformed".format(malformed_fraction): lambda: parse_api_timestamps(mixed_time_strs),
+        "tidepool_user": build_user,
+    }
+
+    return {case: num_events / best_time(func, num_repeats) for case, func in cases.items()}
+
+
+if __name__ == "__main__":
+
+    for case, events_per_sec in benchmark_timestamp_parsing().items():
+        print("{:<26} {:>12,.0f} events/s".format(case, events_per_sec))
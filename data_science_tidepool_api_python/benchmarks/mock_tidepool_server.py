@@ -0,0 +1,349 @@
+"""
+Local stand-in for the Tidepool API so TidepoolAPI can be exercised and benchmarked
+without network access or real accounts.
+
+Implements auth login/logout, event data, notes, sharing and invitation endpoints
+with synthetic data for a configurable number of users and days, plus injectable
+latency and errors.
+"""
+
+import gzip
+import json
+import multiprocessing
+import random
+import re
+import threading
+import time
+import zlib
+import datetime as dt
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from data_science_tidepool_api_python.benchmarks.synthetic_data import (
+    make_synthetic_user_events, make_synthetic_notes, DEFAULT_SYNTHETIC_START_DATE
+)
+
+MOCK_SESSION_TOKEN = "mock-session-token"
+MOCK_LOGIN_USER_ID = "mockobserver"
+
+# Max number of encoded responses kept so repeated requests do not pay for encoding
+RESPONSE_CACHE_SIZE = 256
+
+# Responses smaller than this are not compressed
+MIN_COMPRESS_BYTES = 1024
+
+
+class MockTidepoolRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler implementing the subset of endpoints TidepoolAPI uses.
+    """
+    protocol_version = "HTTP/1.1"  # required for keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload_bytes, status=200, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload_bytes)))
+        if self.headers.get("Connection", "").lower() == "close":
+            self.send_header("Connection", "close")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload_bytes)
+
+    def _read_body(self):
+        content_length = int(self.headers.get("Content-Length", 0))
+        if content_length:
+            self.rfile.read(content_length)
+
+    def _is_authorized(self):
+        return self.headers.get("x-tidepool-session-token") == MOCK_SESSION_TOKEN
+
+    def _handle(self, routes):
+        """
+        Apply injected latency and errors, then dispatch to the matching route.
+        """
+        self._read_body()
+        self.server.count_request()
+
+        if self.server.latency_sec > 0:
+            time.sleep(self.server.latency_sec)
+
+        if self.server.rng_random() < self.server.error_rate:
+            headers = {"Retry-After": "0"} if self.server.error_status == 429 else None
+            self._send_json(b"{}", status=self.server.error_status, headers=headers)
+            return
+
+        url = urlparse(self.path)
+        for pattern, requires_auth, route in routes:
+            match = re.match(pattern, url.path)
+            if match is None:
+                continue
+            if requires_auth and not self._is_authorized():
+                self._send_json(b"{}", status=401)
+                return
+            status, payload_bytes, headers = route(*match.groups(), query=parse_qs(url.query))
+            if self.server.compress_responses and "gzip" in self.headers.get("Accept-Encoding", "") \
+                    and len(payload_bytes) >= MIN_COMPRESS_BYTES:
+                payload_bytes = self.server.get_gzipped(payload_bytes)
+                headers = dict(headers or {}, **{"Content-Encoding": "gzip"})
+            self._send_json(payload_bytes, status=status, headers=headers)
+            return
+
+        self._send_json(b"{}", status=404)
+
+    def do_POST(self):
+        self._handle([
+            (r"^/auth/login$", False, self.server.login),
+            (r"^/auth/logout$", False, self.server.logout),
+        ])
+
+    def do_GET(self):
+        self._handle([
+            (r"^/data/(\w+)$", True, self.server.get_user_event_data),
+            (r"^/message/notes/(\w+)$", True, self.server.get_notes),
+            (r"^/metadata/users/(\w+)/users$", True, self.server.get_users_sharing_to),
+            (r"^/access/groups/(\w+)$", True, self.server.get_users_sharing_with),
+            (r"^/confirm/invitations/(\w+)$", True, self.server.get_invitations),
+        ])
+
+    def do_PUT(self):
+        self._handle([
+            (r"^/confirm/accept/invite/(\w+)/(\w+)$", True, self.server.accept_invitation),
+        ])
+
+
+class MockTidepoolHTTPServer(ThreadingHTTPServer):
+    """
+    Threaded server holding the synthetic account state that handlers read.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, num_users, num_days, num_invitations, latency_sec, error_rate, error_status,
+                 start_date, seed, compress_responses):
+
+        super().__init__(server_address, MockTidepoolRequestHandler)
+
+        self.user_ids = ["user{}".format(i) for i in range(num_users)]
+        self.num_days = num_days
+        self.start_date = start_date
+        self.latency_sec = latency_sec
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        self.compress_responses = compress_responses
+
+        self.pending_invitations = OrderedDict(
+            ("key{}".format(i), {"key": "key{}".format(i), "creatorId": "inviter{}".format(i)})
+            for i in range(num_invitations)
+        )
+
+        self.num_requests = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._user_events = {}
+        self._response_cache = OrderedDict()
+        self._gzip_cache = OrderedDict()
+
+    def count_request(self):
+        with self._lock:
+            self.num_requests += 1
+
+    def rng_random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _get_user_seed(self, user_id):
+        return zlib.crc32(user_id.encode()) ^ self.seed
+
+    def _get_events(self, user_id):
+        with self._lock:
+            events = self._user_events.get(user_id)
+        if events is None:
+            events = make_synthetic_user_events(self.num_days, start_date=self.start_date,
+                                                seed=self._get_user_seed(user_id))
+            with self._lock:
+                self._user_events[user_id] = events
+        return events
+
+    def _get_cached_response(self, key, make_payload):
+        with self._lock:
+            payload_bytes = self._response_cache.get(key)
+            if payload_bytes is not None:
+                self._response_cache.move_to_end(key)
+                return payload_bytes
+
+        payload_bytes = json.dumps(make_payload()).encode()
+        with self._lock:
+            self._response_cache[key] = payload_bytes
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+        return payload_bytes
+
+    def get_gzipped(self, payload_bytes):
+        """
+        Gzip a response, caching by identity of the cached uncompressed bytes.
+        """
+        key = id(payload_bytes)
+        with self._lock:
+            cached = self._gzip_cache.get(key)
+        if cached is not None and cached[0] is payload_bytes:
+            return cached[1]
+
+        gzipped_bytes = gzip.compress(payload_bytes, compresslevel=6)
+        with self._lock:
+            # Holding the uncompressed bytes keeps their id from being reused
+            self._gzip_cache[key] = (payload_bytes, gzipped_bytes)
+            if len(self._gzip_cache) > RESPONSE_CACHE_SIZE:
+                self._gzip_cache.popitem(last=False)
+        return gzipped_bytes
+
+    def login(self, query):
+        body = json.dumps({"userid": MOCK_LOGIN_USER_ID}).encode()
+        return 200, body, {"x-tidepool-session-token": MOCK_SESSION_TOKEN}
+
+    def logout(self, query):
+        return 200, b"{}", None
+
+    def get_user_event_data(self, user_id, query):
+        start_date_str = query.get("startDate", [""])[0]
+        end_date_str = query.get("endDate", ["~"])[0]
+        types = None
+        if "type" in query:
+            types = set(query["type"][0].split(","))
+
+        def make_payload():
+            # Timestamps share one format so string comparison is time comparison
+            return [
+                event for event in self._get_events(user_id)
+                if start_date_str <= event["time"] <= end_date_str and (types is None or event["type"] in types)
+            ]
+
+        key = ("data", user_id, start_date_str, end_date_str, tuple(sorted(types or [])))
+        return 200, self._get_cached_response(key, make_payload), None
+
+    def get_notes(self, user_id, query):
+        start_date_str = query.get("startDate", [""])[0]
+        end_date_str = query.get("endDate", ["~"])[0]
+
+        def make_payload():
+            notes_json = make_synthetic_notes(self.num_days, start_date=self.start_date,
+                                              seed=self._get_user_seed(user_id), user_id=user_id)
+            notes_json["messages"] = [
+                message for message in notes_json["messages"]
+                if start_date_str <= message["timestamp"] <= end_date_str
+            ]
+            return notes_json
+
+        key = ("notes", user_id, start_date_str, end_date_str)
+        return 200, self._get_cached_response(key, make_payload), None
+
+    def get_users_sharing_to(self, user_id, query):
+        return 200, json.dumps([{"userid": MOCK_LOGIN_USER_ID}]).encode(), None
+
+    def get_users_sharing_with(self, user_id, query):
+        users_sharing_with = {user_id: {"view": {}, "note": {}} for user_id in self.user_ids}
+        return 200, json.dumps(users_sharing_with).encode(), None
+
+    def get_invitations(self, user_id, query):
+        with self._lock:
+            invitations = list(self.pending_invitations.values())
+        if not invitations:
+            return 404, b"{}", None
+        return 200, json.dumps(invitations).encode(), None
+
+    def accept_invitation(self, observer_id, user_id, query):
+        with self._lock:
+            for key, invitation in self.pending_invitations.items():
+                if invitation["creatorId"] == user_id:
+                    del self.pending_invitations[key]
+                    return 200, b"{}", None
+        return 404, b"{}", None
+
+
+class MockTidepoolServer(object):
+    """
+    Threaded http server serving synthetic Tidepool data on localhost.
+
+    Example:
+        with MockTidepoolServer(num_users=50, num_days=90, latency_sec=0.05) as server:
+            tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url)
+    """
+
+    def __init__(self, num_users=10, num_days=30, num_invitations=0, latency_sec=0.0, error_rate=0.0,
+                 error_status=503, start_date=DEFAULT_SYNTHETIC_START_DATE, seed=0, host="127.0.0.1", port=0,
+                 separate_process=False, compress_responses=False):
+        """
+        Args:
+            num_users (int): number of users sharing with the observer account
+            num_days (int): days of synthetic data per user starting at start_date
+            num_invitations (int): number of pending invitations for the observer
+            latency_sec (float): delay added to every response
+            error_rate (float): fraction of requests answered with error_status
+            error_status (int): status code of injected errors, e.g. 429 or 503
+            start_date (dt.DateTime): start of synthetic data
+            seed (int): random seed for data and errors
+            host (str): host to bind
+            port (int): port to bind, 0 picks a free port
+            separate_process (bool): serve from a forked process so the server does not share the
+                GIL with the client being benchmarked. Request counts are then not available.
+            compress_responses (bool): gzip responses when the client accepts it
+        """
+        self.httpd = MockTidepoolHTTPServer((host, port), num_users, num_days, num_invitations, latency_sec,
+                                            error_rate, error_status, start_date, seed, compress_responses)
+        self.separate_process = separate_process
+        self._thread = None
+        self._process = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def user_ids(self):
+        return self.httpd.user_ids
+
+    @property
+    def num_requests(self):
+        if self.separate_process:
+            raise Exception("Request counts are not available from a separate process.")
+        return self.httpd.num_requests
+
+    @property
+    def start_date(self):
+        return self.httpd.start_date
+
+    @property
+    def end_date(self):
+        return self.httpd.start_date + dt.timedelta(days=self.httpd.num_days - 1)
+
+    def start(self):
+        if self.separate_process:
+            # Fork so the child inherits the bound socket
+            self._process = multiprocessing.get_context("fork").Process(target=self.httpd.serve_forever, daemon=True)
+            self._process.start()
+        else:
+            self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+        else:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
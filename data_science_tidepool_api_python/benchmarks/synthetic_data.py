@@ -0,0 +1,133 @@
+"""
+Synthetic Tidepool user data in the v1 api format for benchmarks and the mock server.
+"""
+
+import random
+import datetime as dt
+
+DEFAULT_SYNTHETIC_START_DATE = dt.datetime(2020, 1, 1)
+
+CGM_INTERVAL_MINUTES = 5
+BASAL_SEGMENT_HOURS = 1
+MEAL_HOURS = [7, 12, 18]
+
+
+def format_api_time(time):
+    """
+    Format a datetime like the api, with millisecond precision.
+
+    Args:
+        time (dt.DateTime): time
+
+    Returns:
+        str: e.g. "2020-01-02T23:15:12.611Z"
+    """
+    return time.strftime("%Y-%m-%dT%H:%M:%S.") + "{:03d}Z".format(time.microsecond // 1000)
+
+
+def make_synthetic_user_events(num_days, start_date=DEFAULT_SYNTHETIC_START_DATE, seed=0,
+                               cgm_interval_minutes=CGM_INTERVAL_MINUTES, mmol_fraction=0.0):
+    """
+    Make a realistic mix of cgm, smbg, basal, bolus, food and time change events.
+
+    Args:
+        num_days (int): number of days of data
+        start_date (dt.DateTime): start of data
+        seed (int): random seed so users are reproducible
+        cgm_interval_minutes (int): minutes between cgm readings
+        mmol_fraction (float): fraction of glucose values reported in mmol/L
+
+    Returns:
+        list: events sorted by time
+    """
+    rng = random.Random(seed)
+    events = []
+
+    def add_event(event_type, time, **fields):
+        event = {
+            "id": "{}{:x}{}".format(event_type, seed, len(events)),
+            "type": event_type,
+            "time": format_api_time(time),
+            "uploadId": "upload{:x}".format(seed),
+        }
+        event.update(fields)
+        events.append(event)
+
+    def glucose_fields(value_mg_dl):
+        if rng.random() < mmol_fraction:
+            return {"value": round(value_mg_dl / 18.0182, 1), "units": "mmol/L"}
+        return {"value": int(value_mg_dl), "units": "mg/dL"}
+
+    glucose = 120.0
+    for day in range(num_days):
+        day_start = start_date + dt.timedelta(days=day, milliseconds=rng.randint(0, 999))
+
+        # cgm with a random walk
+        for i in range(24 * 60 // cgm_interval_minutes):
+            glucose = min(400.0, max(40.0, glucose + rng.gauss(0, 4) + (120.0 - glucose) * 0.02))
+            time = day_start + dt.timedelta(minutes=cgm_interval_minutes * i, seconds=rng.randint(0, 30))
+            add_event("cbg", time, **glucose_fields(glucose))
+
+        # fingersticks
+        for _ in range(rng.randint(0, 3)):
+            time = day_start + dt.timedelta(minutes=rng.randint(0, 24 * 60 - 1))
+            add_event("smbg", time, **glucose_fields(glucose + rng.gauss(0, 10)))
+
+        # scheduled basal segments
+        for hour in range(0, 24, BASAL_SEGMENT_HOURS):
+            time = day_start + dt.timedelta(hours=hour)
+            add_event("basal", time, deliveryType="scheduled", rate=round(rng.uniform(0.5, 1.5), 3),
+                      duration=BASAL_SEGMENT_HOURS * 3600 * 1000)
+
+        # meals with boluses
+        for meal_hour in MEAL_HOURS:
+            time = day_start + dt.timedelta(hours=meal_hour, minutes=rng.randint(-60, 60))
+            carbs = rng.randint(20, 90)
+            add_event("food", time, nutrition={"carbohydrate": {"net": carbs, "units": "grams"}})
+            add_event("bolus", time + dt.timedelta(seconds=30), subType="normal", normal=round(carbs / 10.0, 2))
+
+        # occasional travel
+        if rng.random() < 0.02:
+            time = day_start + dt.timedelta(hours=rng.randint(0, 23))
+            add_event("deviceEvent", time, subType="timeChange", **{
+                "from": {"timeZoneName": "US/Pacific"},
+                "to": {"timeZoneName": "US/Eastern"}
+            })
+
+    events.sort(key=lambda event: event["time"])
+
+    return events
+
+
+def make_synthetic_notes(num_days, start_date=DEFAULT_SYNTHETIC_START_DATE, seed=0, notes_per_day=1, user_id=None):
+    """
+    Make notes in the api format.
+
+    Args:
+        num_days (int): number of days of notes
+        start_date (dt.DateTime): start of notes
+        seed (int): random seed
+        notes_per_day (int): notes per day
+        user_id (str): Optional id of user who wrote the notes
+
+    Returns:
+        dict: notes json with a list of messages
+    """
+    rng = random.Random(seed)
+    messages = []
+    for day in range(num_days):
+        for i in range(notes_per_day):
+            time = start_date + dt.timedelta(days=day, minutes=rng.randint(0, 24 * 60 - 1),
+                                             milliseconds=rng.randint(0, 999))
+            messages.append({
+                "id": "note{:x}{}".format(seed, len(messages)),
+                "userid": user_id,
+                "groupid": user_id,
+                "timestamp": format_api_time(time),
+                "createdtime": format_api_time(time + dt.timedelta(minutes=rng.randint(0, 60))),
+                "messagetext": "#exercise note {}".format(len(messages))
+            })
+
+    messages.sort(key=lambda message: message["timestamp"])
+
+    return {"messages": messages}
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio client for the Tidepool API for bulk downloads with many requests in flight.
+
+Reference: https://developer.tidepool.org/tidepool-api/index/
+"""
+
+import base64
+import asyncio
+import functools
+import logging
+
+import aiohttp
+
+from data_science_tidepool_api_python.makedata import json_backend
+from data_science_tidepool_api_python.makedata.tidepool_api import (
+    TidepoolAPI, DEFAULT_API_BASE_URL, DEFAULT_TIMEOUT, DEFAULT_DEVICE_SOURCES, get_user_data_query_string
+)
+from data_science_tidepool_api_python.makedata.make_user import save_user_data, PHI_DATA_DIR
+from data_science_tidepool_api_python.makedata.make_cohort import MANIFEST_STATUS_COMPLETE, MANIFEST_STATUS_FAILED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+def get_basic_auth_headers(username, password):
+    """
+    Get the basic auth header for login and logout, encoded as requests and aiohttp encode it.
+
+    Args:
+        username (str): username
+        password (str): password
+
+    Returns:
+        dict: Authorization header
+    """
+    credentials = "{}:{}".format(username, password).encode("latin-1")
+    return {"Authorization": "Basic " + base64.b64encode(credentials).decode("ascii")}
+
+
+class AsyncTidepoolAPI(object):
+    """
+    Asyncio counterpart to TidepoolAPI. Methods are coroutines with the same names and
+    return values. A semaphore limits the number of requests in flight.
+
+    Example:
+        async with AsyncTidepoolAPI(username, password, max_concurrency=200) as tp_api:
+            await tp_api.login()
+            user_data = await tp_api.get_user_event_data(start_date, end_date, observed_user_id=user_id)
+            await tp_api.logout()
+    """
+
+    def __init__(self, username, password, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 api_base_url=DEFAULT_API_BASE_URL, session=None, token_cache=None):
+        """
+        Args:
+            username (str): username for login
+            password (str): password for login
+            max_concurrency (int): max requests in flight
+            timeout (float or tuple): (connect, read) timeout in seconds for each request
+            api_base_url (str): root url of the api
+            session (aiohttp.ClientSession): Optional session to share connections with other instances
+            token_cache (SessionTokenCache): Optional cache to reuse session tokens across logins
+        """
+
+        self.api_base_url = api_base_url
+        self.login_url = api_base_url + "/auth/login"
+
+        self.user_data_url = api_base_url + "/data/{user_id}"
+        self.logout_url = api_base_url + "/auth/logout"
+        self.users_sharing_to_url = api_base_url + "/metadata/users/{user_id}/users"
+        self.users_sharing_with_url = api_base_url + "/access/groups/{user_id}"
+        self.invitations_url = api_base_url + "/confirm/invitations/{user_id}"
+        self.accept_invitations_url = api_base_url + "/confirm/accept/invite/{observer_id}/{user_id}"
+        self.user_notes_url = api_base_url + "/message/notes/{user_id}"
+
+        self.username = username
+        self.password = password
+
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout, read_timeout = timeout, timeout
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._relogin_lock = None
+
+        self._owns_session = session is None
+        self.session = session
+
+        self.token_cache = token_cache
+
+        self._login_user_id = None
+        self._login_headers = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the http session if this instance created it. Shared sessions are left open.
+        """
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _check_login(func):
+        """
+        Decorator for enforcing login.
+        """
+        @functools.wraps(func)
+        async def is_logged_in(self, *args, **kwargs):
+            if self._login_headers is None or self._login_user_id is None:
+                raise Exception("Not logged in.")
+            return await func(self, *args, **kwargs)
+        return is_logged_in
+
+    def _check_http_error(func):
+        """
+        Decorator to batch handle failed http requests.
+        """
+        @functools.wraps(func)
+        async def response_is_ok(self, *args, **kwargs):
+            try:
+                return await func(self, *args, **kwargs)
+            except aiohttp.ClientResponseError as e:
+                logger.info("Failed request. HTTPError: {}".format(e))
+        return response_is_ok
+
+    async def _request(self, method, url, decode_json=True, **kwargs):
+        """
+        Make a request within the concurrency limit and decode the json response. Each request
+        uses the client timeout, also on a shared session.
+
+        Args:
+            method (str): http method
+            url (str): url
+            decode_json (bool): decode the body as json. Otherwise, e.g. for responses that are
+                not json, the body is not read.
+
+        Returns:
+            (object, multidict): json response, or None if not decoded or empty, and response headers
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        # A cached token may have expired on the server, so log in again and retry once
+        headers = kwargs.get("headers")
+        can_refresh_login = self.token_cache is not None and headers is not None \
+            and "x-tidepool-session-token" in headers
+
+        response_json, response_headers, is_unauthorized = await self._send(
+            method, url, decode_json, allow_unauthorized=can_refresh_login, **kwargs)
+        if is_unauthorized:
+            await self._refresh_login(headers["x-tidepool-session-token"])
+            kwargs["headers"] = dict(headers, **self._login_headers)
+            response_json, response_headers, _ = await self._send(method, url, decode_json, **kwargs)
+
+        return response_json, response_headers
+
+    async def _send(self, method, url, decode_json, allow_unauthorized=False, **kwargs):
+        """
+        Send one request while holding the concurrency semaphore.
+
+        Returns:
+            (object, multidict, bool): json response, response headers and whether a 401 was
+                returned instead of raised
+        """
+        async with self._semaphore:
+            async with self.session.request(method, url, **kwargs) as response:
+                if allow_unauthorized and response.status == 401:
+                    return None, response.headers, True
+
+                response.raise_for_status()
+
+                response_json = None
+                if decode_json:
+                    body = await response.read()
+                    if body.strip():
+                        response_json = json_backend.loads(body)
+
+                return response_json, response.headers, False
+
+    async def _refresh_login(self, rejected_token):
+        """
+        Replace a session token the server rejected with a new login.
+
+        Args:
+            rejected_token (str): token that got a 401
+        """
+        if self._relogin_lock is None:
+            self._relogin_lock = asyncio.Lock()
+
+        async with self._relogin_lock:
+            # Another task may have already refreshed
+            if self._login_headers is not None and self._login_headers["x-tidepool-session-token"] != rejected_token:
+                return
+            logger.info("Session token rejected. Logging in again.")
+            self.token_cache.invalidate(self.api_base_url, self.username)
+            await self.login()
+
+    async def login(self):
+        """
+        Login to Tidepool API. With a token cache, a valid cached token is used instead
+        of a new login.
+        """
+        cached_login = None
+        if self.token_cache is not None:
+            cached_login = self.token_cache.get(self.api_base_url, self.username)
+
+        if cached_login is not None:
+            xtoken, user_id_master = cached_login
+        else:
+            login_json, login_headers = await self._request(
+                "POST", self.login_url, headers=get_basic_auth_headers(self.username, self.password)
+            )
+            xtoken = login_headers["x-tidepool-session-token"]
+            user_id_master = login_json["userid"]
+
+            if self.token_cache is not None:
+                self.token_cache.set(self.api_base_url, self.username, xtoken, user_id_master)
+
+        self._login_user_id = user_id_master
+        self._login_headers = {
+            "x-tidepool-session-token": xtoken,
+            "Content-Type": "application/json"
+        }
+
+    @_check_http_error
+    @_check_login
+    async def logout(self):
+        """
+        Logout of Tidepool API. With a token cache, the session is kept open on the
+        server for reuse and only this instance is logged out.
+        """
+        if self.token_cache is not None:
+            self._login_user_id = None
+            self._login_headers = None
+            return
+
+        await self._request("POST", self.logout_url, decode_json=False,
+                            headers=get_basic_auth_headers(self.username, self.password))
+
+    @_check_login
+    async def get_pending_observer_invitations(self):
+        """
+        Get pending invitations that have been sent to an observer.
+
+        Returns:
+            list of invitation json objects
+        """
+        try:
+            invitations_url = self.invitations_url.format(**{"user_id": self._login_user_id})
+            pending_invitations_json, _ = await self._request("GET", invitations_url, headers=self._login_headers)
+        except aiohttp.ClientResponseError:
+            pending_invitations_json = []
+
+        return pending_invitations_json
+
+    @_check_login
+    async def accept_observer_invitations(self):
+        """
+        Get pending invitations sent to an observer and accept them concurrently.
+
+        Returns:
+            (list, list)
+            pending invitations and (error, invitation) tuples for failed acceptance
+        """
+        pending_invitations_json = await self.get_pending_observer_invitations()
+        logger.info("Num pending invitations {}".format(len(pending_invitations_json)))
+
+        async def accept(invitation):
+            accept_url = self.accept_invitations_url.format(**{
+                "observer_id": self._login_user_id,
+                "user_id": invitation["creatorId"]
+            })
+            try:
+                await self._request("PUT", accept_url, decode_json=False, headers=self._login_headers,
+                                    json={"key": invitation["key"]})
+            except aiohttp.ClientResponseError as e:
+                return e, invitation
+
+        results = await asyncio.gather(*[accept(invitation) for invitation in pending_invitations_json])
+        invitation_accept_failed = [result for result in results if result is not None]
+
+        logger.info("Accepted {}. Failed {}. Out of {}".format(
+            len(results) - len(invitation_accept_failed), len(invitation_accept_failed), len(results)))
+
+        return pending_invitations_json, invitation_accept_failed
+
+    @_check_http_error
+    @_check_login
+    async def get_user_event_data(self, start_date, end_date, observed_user_id=None, types=None,
+                                  device_sources=DEFAULT_DEVICE_SOURCES):
+        """
+        Get health event data for user.
+
+        Args:
+            start_date (dt.datetime): Start date of data, inclusive
+            end_date (dt.datetime): End date of data, inclusive of entire day
+            observed_user_id (str): Optional id of observed user if login id is clinician/study
+            types (list): Optional event types to request. None requests all types.
+            device_sources (list): device sources to request
+
+        Returns:
+            list: List of events as objects
+        """
+        user_id = self._login_user_id
+        if observed_user_id:
+            user_id = observed_user_id
+
+        start_date_str, end_date_str = TidepoolAPI.get_date_filter_string(start_date, end_date)
+
+        user_data_base_url = self.user_data_url.format(**{"user_id": user_id})
+        user_data_url = "{url_base}?{query_string}".format(**{
+            "url_base": user_data_base_url,
+            "query_string": get_user_data_query_string(start_date_str, end_date_str, types=types,
+                                                       device_sources=device_sources)
+        })
+
+        user_event_data, _ = await self._request("GET", user_data_url, headers=self._login_headers)
+
+        return user_event_data
+
+    @_check_http_error
+    @_check_login
+    async def get_users_sharing_to(self):
+        """
+        Get a list of users the login id is sharing data to.
+
+        Returns:
+            list: List of users as objects
+        """
+        user_metadata_url = self.users_sharing_to_url.format(**{"user_id": self._login_user_id})
+        users_sharing_to, _ = await self._request("GET", user_metadata_url, headers=self._login_headers)
+
+        return users_sharing_to
+
+    @_check_http_error
+    @_check_login
+    async def get_users_sharing_with(self):
+        """
+        Get a list of users the login id is observing.
+
+        Returns:
+            list: List of users as objects
+        """
+        users_sharing_with_url = self.users_sharing_with_url.format(**{"user_id": self._login_user_id})
+        users_sharing_with_json, _ = await self._request("GET", users_sharing_with_url, headers=self._login_headers)
+
+        return users_sharing_with_json
+
+    @_check_http_error
+    @_check_login
+    async def get_notes(self, start_date, end_date, observed_user_id=None):
+        """
+        Get notes for a user.
+        """
+        user_id = self._login_user_id
+        if observed_user_id:
+            user_id = observed_user_id
+
+        start_date_str, end_date_str = TidepoolAPI.get_date_filter_string(start_date, end_date)
+
+        base_notes_url = self.user_notes_url.format(**{"user_id": user_id})
+        notes_url = "{url_base}?startDate={start_date}&endDate={end_date}".format(
+            **{
+                "url_base": base_notes_url,
+                "end_date": end_date_str,
+                "start_date": start_date_str,
+            })
+        notes_data, _ = await self._request("GET", notes_url, headers=self._login_headers)
+
+        return notes_data
+
+    def get_login_user_id(self):
+        """
+        Get the id of the user logged in.
+        Returns:
+            str: user id
+        """
+        if self._login_user_id is None:
+            raise Exception("Not logged in.")
+        return self._login_user_id
+
+
+async def download_observed_users_data_async(username, password, start_date, end_date, user_ids=None,
+                                             max_concurrency=DEFAULT_MAX_CONCURRENCY, api_base_url=DEFAULT_API_BASE_URL,
+                                             types=None, device_sources=DEFAULT_DEVICE_SOURCES, compression=None,
+                                             write_columns=True, data_dir=PHI_DATA_DIR):
+    """
+    Download event data and notes for many users observed by one account concurrently. Each user
+    is written to disk as soon as their download finishes, so only users in flight are held in memory.
+
+    Args:
+        username (str): username for observer login, e.g. study
+        password (str): password for observer login
+        start_date (dt.DateTime): start date of data collection
+        end_date (dt.DateTime): end date of data collection
+        user_ids (list): Optional user ids to download, defaults to all users sharing with the account
+        max_concurrency (int): max requests in flight
+        api_base_url (str): root url of the api
+        types (list): Optional event types to request. None requests all types.
+        device_sources (list): device sources to request
+        compression (str): Optional codec for the event and notes files, e.g. "gzip" or "zstd"
+        write_columns (bool): Also save typed column tables per event type for fast loading
+        data_dir (str): PHI directory the user directories are created in
+
+    Returns:
+        dict: user id mapped to status entry with "status" and, for complete users, "save_dir" and "num_events"
+    """
+    loop = asyncio.get_running_loop()
+
+    async with AsyncTidepoolAPI(username, password, max_concurrency=max_concurrency,
+                                api_base_url=api_base_url) as tp_api:
+        await tp_api.login()
+
+        if user_ids is None:
+            users_sharing_with = await tp_api.get_users_sharing_with()
+            user_ids = list(users_sharing_with or {})
+
+        async def download_user(user_id):
+            user_event_json, notes_json = await asyncio.gather(
+                tp_api.get_user_event_data(start_date, end_date, observed_user_id=user_id, types=types,
+                                           device_sources=device_sources),
+                tp_api.get_notes(start_date, end_date, observed_user_id=user_id)
+            )
+            if user_event_json is None or notes_json is None:
+                return {"status": MANIFEST_STATUS_FAILED, "error": "Failed to download event data or notes."}
+
+            # Writing blocks, so it runs in a thread while other downloads continue
+            save_dir = await loop.run_in_executor(None, functools.partial(
+                save_user_data, user_id, user_event_json, notes_json, start_date, end_date, types=types,
+                device_sources=device_sources, compression=compression, write_columns=write_columns,
+                data_dir=data_dir))
+
+            return {"status": MANIFEST_STATUS_COMPLETE, "save_dir": save_dir, "num_events": len(user_event_json)}
+
+        user_results = await asyncio.gather(*[download_user(user_id) for user_id in user_ids],
+                                            return_exceptions=True)
+
+        await tp_api.logout()
+
+    user_entries = {}
+    for user_id, result in zip(user_ids, user_results):
+        if isinstance(result, Exception):
+            logger.error("Failed to download user {}. {}".format(user_id, repr(result)))
+            result = {"status": MANIFEST_STATUS_FAILED, "error": repr(result)}
+        user_entries[user_id] = result
+
+    return user_entries
+
+
+def download_observed_users_data(username, password, start_date, end_date, user_ids=None,
+                                 max_concurrency=DEFAULT_MAX_CONCURRENCY, api_base_url=DEFAULT_API_BASE_URL,
+                                 types=None, device_sources=DEFAULT_DEVICE_SOURCES, compression=None,
+                                 write_columns=True, data_dir=PHI_DATA_DIR):
+    """
+    Blocking wrapper around download_observed_users_data_async for use in scripts.
+
+    Returns:
+        dict: user id mapped to status entry, see download_observed_users_data_async
+    """
+    return asyncio.run(download_observed_users_data_async(username, password, start_date, end_date,
+                                                          user_ids=user_ids, max_concurrency=max_concurrency,
+                                                          api_base_url=api_base_url, types=types,
+                                                          device_sources=device_sources, compression=compression,
+                                                          write_columns=write_columns, data_dir=data_dir))
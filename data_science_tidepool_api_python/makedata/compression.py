@@ -0,0 +1,146 @@
+"""
+Compressed transfer and storage of user data files.
+
+gzip is always available. zstd is used on disk when the zstandard package is
+installed, and over http when urllib3 can decode it.
+"""
+
+import os
+import io
+import gzip
+import logging
+
+import urllib3.response
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+COMPRESSION_EXTENSIONS = {
+    None: "",
+    GZIP: ".gz",
+    ZSTD: ".zst",
+}
+
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
+
+
+def get_available_compressions():
+    """
+    Get codecs that can be used for files on disk.
+
+    Returns:
+        list: codec names, None meaning uncompressed
+    """
+    compressions = [None, GZIP]
+    if zstandard is not None:
+        compressions.append(ZSTD)
+    return compressions
+
+
+def get_accept_encoding():
+    """
+    Get the Accept-Encoding header value for the codecs the http client can decode.
+
+    Returns:
+        str: header value
+    """
+    encodings = ["gzip", "deflate"]
+    if getattr(urllib3.response, "HAS_ZSTD", False):
+        encodings.insert(0, "zstd")
+    return ", ".join(encodings)
+
+
+def get_compressed_path(path, compression):
+    """
+    Get the file path with the extension for a codec, e.g. event_data.json.gz
+
+    Args:
+        path (str): uncompressed file path
+        compression (str): codec name or None
+
+    Returns:
+        str: path
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise Exception("Unknown compression {}".format(compression))
+    return path + COMPRESSION_EXTENSIONS[compression]
+
+
+def detect_compression(path):
+    """
+    Get the codec of a file from its extension.
+
+    Args:
+        path (str): file path
+
+    Returns:
+        str: codec name or None if uncompressed
+    """
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if extension and path.endswith(extension):
+            return compression
+    return None
+
+
+def find_data_file(path):
+    """
+    Find an existing file that is the given path or a compressed version of it.
+
+    Args:
+        path (str): uncompressed file path, e.g. <user_dir>/event_data.json
+
+    Returns:
+        str: path of existing file or None if there is none
+    """
+    for compression in COMPRESSION_EXTENSIONS:
+        candidate_path = get_compressed_path(path, compression)
+        if os.path.isfile(candidate_path):
+            return candidate_path
+    return None
+
+
+def open_compressed(path, mode="rb", compression=None):
+    """
+    Open a file that may be compressed.
+
+    Args:
+        path (str): file path
+        mode (str): "rb", "wb", "r" or "w"
+        compression (str): codec name. Detected from the extension if None.
+
+    Returns:
+        file object
+    """
+    if compression is None:
+        compression = detect_compression(path)
+
+    is_text = "b" not in mode
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+
+    if compression is None:
+        file_obj = open(path, binary_mode)
+    elif compression == GZIP:
+        compresslevel = DEFAULT_GZIP_LEVEL
+        file_obj = gzip.open(path, binary_mode, compresslevel=compresslevel)
+    elif compression == ZSTD:
+        if zstandard is None:
+            raise Exception("Reading or writing zstd files requires the zstandard package.")
+        if "r" in binary_mode:
+            file_obj = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            zstd_compressor = zstandard.ZstdCompressor(level=DEFAULT_ZSTD_LEVEL)
+            file_obj = zstd_compressor.stream_writer(open(path, "wb"), closefd=True)
+    else:
+        raise Exception("Unknown compression {}".format(compression))
+
+    if is_text:
+        return io.TextIOWrapper(file_obj, encoding="utf-8")
+    return file_obj
@@ -0,0 +1,120 @@
+"""
+Json decoding with the fastest installed backend.
+
+orjson is used when installed, then simdjson, then the standard library. A backend
+can be forced with set_json_backend or the TIDEPOOL_JSON_BACKEND environment variable.
+"""
+
+import os
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+logger = logging.getLogger(__name__)
+
+ORJSON = "orjson"
+SIMDJSON = "simdjson"
+STDLIB = "json"
+
+JSON_BACKEND_ENV_VAR = "TIDEPOOL_JSON_BACKEND"
+
+# Fastest first
+JSON_BACKEND_PREFERENCE = [ORJSON, SIMDJSON, STDLIB]
+
+
+def get_available_json_backends():
+    """
+    Get backends that are installed.
+
+    Returns:
+        list: backend names, fastest first
+    """
+    installed = {
+        ORJSON: orjson is not None,
+        SIMDJSON: simdjson is not None,
+        STDLIB: True,
+    }
+    return [backend for backend in JSON_BACKEND_PREFERENCE if installed[backend]]
+
+
+def _get_loads(backend):
+
+    if backend == ORJSON:
+        return orjson.loads
+    elif backend == SIMDJSON:
+        return simdjson.loads
+    elif backend == STDLIB:
+        return json.loads
+
+    raise Exception("Unknown json backend {}".format(backend))
+
+
+_backend = None
+_loads = None
+
+
+def set_json_backend(backend=None):
+    """
+    Set the backend used by loads.
+
+    Args:
+        backend (str): "orjson", "simdjson" or "json". None picks the fastest installed.
+    """
+    global _backend, _loads
+
+    available_backends = get_available_json_backends()
+    if backend is None:
+        backend = available_backends[0]
+    elif backend not in available_backends:
+        raise Exception("Json backend {} is not installed. Available: {}".format(backend, available_backends))
+
+    _backend = backend
+    _loads = _get_loads(backend)
+    logger.debug("Using json backend {}".format(backend))
+
+
+def get_json_backend():
+    """
+    Returns:
+        str: name of the backend in use
+    """
+    return _backend
+
+
+def loads(data):
+    """
+    Decode json with the current backend.
+
+    Args:
+        data (bytes or str): json document
+
+    Returns:
+        object: decoded json
+    """
+    return _loads(data)
+
+
+def load(file_obj):
+    """
+    Decode a json file with the current backend. Reads the whole file, which is faster
+    than incremental reads for every backend.
+
+    Args:
+        file_obj: file object opened in binary or text mode
+
+    Returns:
+        object: decoded json
+    """
+    return _loads(file_obj.read())
+
+
+set_json_backend(os.environ.get(JSON_BACKEND_ENV_VAR) or None)
@@ -0,0 +1,94 @@
+"""
+Incremental decoding of large json arrays so api responses and files can be
+processed one element at a time without holding the full document in memory.
+"""
+
+import codecs
+import json
+
+from data_science_tidepool_api_python.makedata.compression import open_compressed
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_ELEMENT_DELIMITERS = _WHITESPACE + ",]"
+
+
+def iter_json_array(byte_chunks):
+    """
+    Decode a json array from an iterable of byte chunks, yielding one element at a time.
+
+    Args:
+        byte_chunks (iterable): chunks of utf-8 encoded bytes of a json array
+
+    Returns:
+        generator: decoded elements of the array in order
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunk_iter = iter(byte_chunks)
+
+    buffer = ""
+    pos = 0
+    is_eof = False
+    is_array_started = False
+
+    def read_more():
+        try:
+            return text_decoder.decode(next(chunk_iter)), False
+        except StopIteration:
+            return text_decoder.decode(b"", final=True), True
+
+    while True:
+
+        # Skip separators between elements
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or (is_array_started and buffer[pos] == ",")):
+            pos += 1
+
+        if pos < len(buffer):
+            if not is_array_started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected json array, got '{}'".format(buffer[pos]))
+                is_array_started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+                # A number may continue in the next chunk so require a delimiter after it
+                if is_eof or (end < len(buffer) and buffer[end] in _ELEMENT_DELIMITERS):
+                    yield element
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if is_eof:
+                    raise
+
+        if is_eof:
+            raise ValueError("Unexpected end of json array")
+
+        # Drop consumed text and read the next chunk
+        buffer = buffer[pos:]
+        pos = 0
+        text, is_eof = read_more()
+        buffer += text
+
+
+def iter_json_array_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Decode a json array stored in a file one element at a time, decompressing
+    based on the file extension.
+
+    Args:
+        path (str): path to json file
+        chunk_size (int): bytes per read
+
+    Returns:
+        generator: decoded elements of the array in order
+    """
+    with open_compressed(path, "rb") as file_to_read:
+        for element in iter_json_array(iter(lambda: file_to_read.read(chunk_size), b"")):
+            yield element
@@ -0,0 +1,231 @@
+"""
+Download data for every user sharing with an observer account (e.g. a study) into the
+PHI data directory. Progress is recorded per user in a manifest so an interrupted
+download resumes with the users that are not yet complete.
+"""
+
+import os
+import json
+import time
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import logging
+
+from data_science_tidepool_api_python.makedata.tidepool_api import (
+    TidepoolAPI, create_session, read_auth_csv, DEFAULT_API_BASE_URL
+)
+from data_science_tidepool_api_python.makedata.token_cache import SessionTokenCache
+from data_science_tidepool_api_python.makedata.make_user import download_user_data, save_json_atomic, PHI_DATA_DIR
+from data_science_tidepool_api_python.util import DATESTAMP_FORMAT
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_STATUS_COMPLETE = "complete"
+MANIFEST_STATUS_FAILED = "failed"
+MANIFEST_STATUS_PENDING = "pending"
+
+DEFAULT_COHORT_WORKERS = 8
+
+
+def get_dir_size(path):
+    """
+    Get the total size of the files in a directory tree.
+
+    Args:
+        path (str): directory
+
+    Returns:
+        int: bytes
+    """
+    num_bytes = 0
+    for dir_path, dir_names, file_names in os.walk(path):
+        for file_name in file_names:
+            num_bytes += os.path.getsize(os.path.join(dir_path, file_name))
+    return num_bytes
+
+
+def load_cohort_manifest(path_to_manifest, start_date, end_date):
+    """
+    Load the manifest of a cohort download or start a new one.
+
+    Args:
+        path_to_manifest (str): manifest file path
+        start_date (dt.DateTime): start date of data collection
+        end_date (dt.DateTime): end date of data collection
+
+    Returns:
+        dict: manifest
+    """
+    start_date_str = start_date.strftime(DATESTAMP_FORMAT)
+    end_date_str = end_date.strftime(DATESTAMP_FORMAT)
+
+    if not os.path.isfile(path_to_manifest):
+        return {
+            "data_start_date": start_date_str,
+            "data_end_date": end_date_str,
+            "users": {},
+        }
+
+    manifest = json.load(open(path_to_manifest))
+    if (manifest["data_start_date"], manifest["data_end_date"]) != (start_date_str, end_date_str):
+        raise Exception("Manifest {} is for data from {} to {}. Use a new manifest for a different date range.".format(
+            path_to_manifest, manifest["data_start_date"], manifest["data_end_date"]))
+
+    return manifest
+
+
+def _download_cohort_user(user_id, download_kwargs, token_cache_path=None):
+    """
+    Download one user and measure it. Runs in a worker process, so everything it needs is passed in.
+
+    Args:
+        user_id (str): observed user id
+        download_kwargs (dict): arguments for download_user_data
+        token_cache_path (str): Optional token cache file shared between worker processes
+
+    Returns:
+        dict: manifest entry for the user
+    """
+    if token_cache_path is not None:
+        download_kwargs = dict(download_kwargs, token_cache=SessionTokenCache(token_cache_path))
+
+    start_time = time.perf_counter()
+    save_dir = download_user_data(user_id=user_id, **download_kwargs)
+
+    return {
+        "status": MANIFEST_STATUS_COMPLETE,
+        "save_dir": save_dir,
+        "num_bytes": get_dir_size(save_dir),
+        "seconds": time.perf_counter() - start_time,
+        "date_completed": dt.datetime.now().isoformat(),
+    }
+
+
+def download_cohort_data(username, password, start_date, end_date, path_to_manifest, user_ids=None,
+                         max_workers=DEFAULT_COHORT_WORKERS, use_processes=False, token_cache=None,
+                         retry_failed=True, data_dir=PHI_DATA_DIR, api_base_url=DEFAULT_API_BASE_URL,
+                         **download_kwargs):
+    """
+    Download data for all users sharing with an observer account. Users already complete in the
+    manifest are skipped, so re-running after an interruption picks up where it left off.
+
+    Args:
+        username (str): observer account username
+        password (str): observer account password
+        start_date (dt.DateTime): start date of data collection
+        end_date (dt.DateTime): end date of data collection
+        path_to_manifest (str): manifest file recording the status of each user
+        user_ids (list): Optional user ids to download. Defaults to all users sharing with the account.
+        max_workers (int): number of users downloaded concurrently
+        use_processes (bool): download in worker processes instead of threads, e.g. when parsing
+            columns is the bottleneck. Tokens are only shared between processes if token_cache has a path.
+        token_cache (SessionTokenCache): Optional cache so the account logs in once. Defaults to an
+            in-memory cache for threads.
+        retry_failed (bool): download users that failed in a previous run
+        data_dir (str): PHI directory user directories are created in
+        api_base_url (str): root url of the api
+        **download_kwargs: passed to download_user_data, e.g. compression or types
+
+    Returns:
+        dict: aggregate counts, bytes and throughput of this run
+    """
+    if token_cache is None:
+        token_cache = SessionTokenCache()
+
+    manifest = load_cohort_manifest(path_to_manifest, start_date, end_date)
+
+    if user_ids is None:
+        tp_api = TidepoolAPI(username, password, token_cache=token_cache, api_base_url=api_base_url)
+        tp_api.login()
+        users_sharing_with = tp_api.get_users_sharing_with()
+        tp_api.logout()
+        tp_api.close()
+
+        if users_sharing_with is None:
+            raise Exception("Failed to get users sharing with {}.".format(username))
+        user_ids = list(users_sharing_with.keys())
+
+    skip_statuses = {MANIFEST_STATUS_COMPLETE}
+    if not retry_failed:
+        skip_statuses.add(MANIFEST_STATUS_FAILED)
+
+    user_ids_to_download = []
+    for user_id in user_ids:
+        entry = manifest["users"].setdefault(user_id, {"status": MANIFEST_STATUS_PENDING})
+        if entry["status"] not in skip_statuses:
+            user_ids_to_download.append(user_id)
+    save_json_atomic(manifest, path_to_manifest)
+
+    num_skipped = len(user_ids) - len(user_ids_to_download)
+    logger.info("Downloading {} users, skipping {} already in manifest".format(
+        len(user_ids_to_download), num_skipped))
+
+    download_kwargs = dict(download_kwargs, username=username, password=password, start_date=start_date,
+                           end_date=end_date, data_dir=data_dir, api_base_url=api_base_url)
+
+    session = None
+    token_cache_path = None
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        token_cache_path = token_cache.path
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        session = create_session(pool_maxsize=max_workers)
+        download_kwargs.update(session=session, token_cache=token_cache)
+
+    num_complete = 0
+    num_failed = 0
+    num_bytes = 0
+    start_time = time.perf_counter()
+
+    with executor:
+        future_to_user_id = {
+            executor.submit(_download_cohort_user, user_id, download_kwargs, token_cache_path): user_id
+            for user_id in user_ids_to_download
+        }
+
+        # The manifest is only written from here so workers never race on it
+        for future in as_completed(future_to_user_id):
+            user_id = future_to_user_id[future]
+            try:
+                entry = future.result()
+                num_complete += 1
+                num_bytes += entry["num_bytes"]
+            except Exception as e:
+                logger.info("Failed download for user {}. Error: {}".format(user_id, e))
+                entry = {"status": MANIFEST_STATUS_FAILED, "error": repr(e)}
+                num_failed += 1
+
+            manifest["users"][user_id] = entry
+            save_json_atomic(manifest, path_to_manifest)
+
+    if session is not None:
+        session.close()
+
+    elapsed_sec = time.perf_counter() - start_time
+    summary = {
+        "num_users": len(user_ids),
+        "num_skipped": num_skipped,
+        "num_complete": num_complete,
+        "num_failed": num_failed,
+        "num_bytes": num_bytes,
+        "seconds": elapsed_sec,
+        "users_per_sec": num_complete / elapsed_sec if elapsed_sec > 0 else 0.0,
+        "mb_per_sec": num_bytes / 1e6 / elapsed_sec if elapsed_sec > 0 else 0.0,
+    }
+    logger.info("Downloaded {num_complete} users ({num_failed} failed, {num_skipped} skipped) in {seconds:.1f}s, "
+                "{users_per_sec:.2f} users/s, {mb_per_sec:.2f} MB/s".format(**summary))
+
+    return summary
+
+
+if __name__ == "__main__":
+
+    username, password = read_auth_csv("../../data/PHI/tcs_auth.csv")
+
+    data_start_date = dt.datetime(year=2020, month=1, day=1)
+    data_end_date = dt.datetime(year=2020, month=3, day=31)
+
+    download_cohort_data(username, password, data_start_date, data_end_date,
+                         path_to_manifest="../../data/PHI/cohort_manifest.json")
@@ -2,10 +2,25 @@ __author__ = "Cameron Summers"
 
 import os
 import json
+import tempfile
 import datetime as dt
-
-from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI, read_auth_csv
+from collections import OrderedDict, defaultdict
+
+from data_science_tidepool_api_python.makedata.tidepool_api import (
+    TidepoolAPI, read_auth_csv, DEFAULT_DEVICE_SOURCES, DEFAULT_API_BASE_URL
+)
+from data_science_tidepool_api_python.makedata.compression import (
+    open_compressed, get_compressed_path, find_data_file, detect_compression
+)
 from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser
+from data_science_tidepool_api_python.models.event_columns import (
+    events_to_columns, save_event_columns, load_event_columns, EVENT_COLUMNS_DIRNAME
+)
+from data_science_tidepool_api_python.models.timeline_cache import (
+    save_timeline_cache, load_timeline_cache, TIMELINE_CACHE_DIRNAME
+)
+from data_science_tidepool_api_python.makedata.json_stream import iter_json_array_file
+from data_science_tidepool_api_python.makedata import json_backend
 from data_science_tidepool_api_python.util import DATESTAMP_FORMAT
 
 
@@ -13,8 +28,27 @@ NOTES_FILENAME = "notes.json"
 EVENT_DATA_FILENAME = "event_data.json"
 CREATION_META_FILENAME = "creation_metadata.json"
 
+PHI_DATA_DIR = "../../data/PHI/"
+
+PARTITIONS_DIRNAME = "partitions"
+STORE_EVENT_INDEX_FILENAME = "event_partitions.json"
+DEFAULT_PARTITION_PERIOD = "month"
+
+# Length of the api timestamp prefix that identifies a partition
+PARTITION_KEY_LENGTHS = {
+    "year": 4,
+    "month": 7,
+    "day": 10,
+}
+
+# Re-fetch this much data before the last sync to pick up late uploads and edited events
+DEFAULT_SYNC_OVERLAP_HOURS = 48
 
-def download_user_data(username, password, start_date, end_date, user_id=None):
+
+def download_user_data(username, password, start_date, end_date, user_id=None, session=None, window_days=None,
+                       stream=False, types=None, device_sources=DEFAULT_DEVICE_SOURCES, token_cache=None,
+                       compression=None, write_columns=True, data_dir=PHI_DATA_DIR,
+                       api_base_url=DEFAULT_API_BASE_URL):
     """
     Use Tidepool API to download Tidepool user data
 
@@ -25,83 +59,698 @@ def download_user_data(username, password, start_date, end_date, user_id=None):
         start_date (dt.DateTime): start date of data collection
         end_date dt.DateTime: end date of data collection
         user_id (str): Optional user id if the login credentials are an observer
+        session (requests.Session): Optional shared session to reuse connections across downloads
+        window_days (int): Optional number of days per concurrent event data request
+        stream (bool): Write the event data response straight to disk without decoding it
+        types (list): Optional event types to download, e.g. PARSED_EVENT_TYPES_V1. None downloads all types.
+        device_sources (list): device sources to download
+        token_cache (SessionTokenCache): Optional cache to log in once per account across downloads
+        compression (str): Optional codec for the event and notes files, e.g. "gzip" or "zstd"
+        write_columns (bool): Also save typed column tables per event type for fast loading
+        data_dir (str): PHI directory the user directory is created in
+        api_base_url (str): root url of the api
+
+    Returns:
+        str: directory where the user data was saved
     """
-    tp_api = TidepoolAPI(username, password)
+    tp_api = TidepoolAPI(username, password, session=session, token_cache=token_cache, api_base_url=api_base_url)
     tp_api.login()
 
     # Create directory based on user id whose data this is
     user_id_of_data = user_id
     if user_id_of_data is None:
         user_id_of_data = tp_api.get_login_user_id()
-    save_dir = create_user_dir(user_id_of_data, start_date, end_date)
+    save_dir = create_user_dir(user_id_of_data, start_date, end_date, data_dir=data_dir)
 
     # Download and save events
-    user_event_json = tp_api.get_user_event_data(start_date, end_date, observed_user_id=user_id)
-    json.dump(user_event_json, open(os.path.join(save_dir, EVENT_DATA_FILENAME), "w"))
+    event_data_path = get_compressed_path(os.path.join(save_dir, EVENT_DATA_FILENAME), compression)
+    if stream:
+        tp_api.download_user_event_data(start_date, end_date, event_data_path, observed_user_id=user_id,
+                                        types=types, device_sources=device_sources, compression=compression)
+        if write_columns:
+            save_event_columns(events_to_columns(iter_json_array_file(event_data_path), skip_unknown=True),
+                               os.path.join(save_dir, EVENT_COLUMNS_DIRNAME))
+    else:
+        user_event_json = tp_api.get_user_event_data(start_date, end_date, observed_user_id=user_id,
+                                                     window_days=window_days, types=types,
+                                                     device_sources=device_sources)
+        if user_event_json is None:
+            raise Exception("Failed to download event data.")
+        save_user_event_json(user_event_json, save_dir, compression=compression, write_columns=write_columns)
 
     # Download and save notes
     notes_json = tp_api.get_notes(start_date, end_date, observed_user_id=user_id)
-    json.dump(notes_json, open(os.path.join(save_dir, NOTES_FILENAME), "w"))
+    if notes_json is None:
+        raise Exception("Failed to download notes.")
+    save_user_notes_json(notes_json, save_dir, compression=compression)
 
     # TODO: add profile metadata
 
     tp_api.logout()
+    tp_api.close()
 
     # Document this operation and save
+    save_creation_metadata(save_dir, user_id_of_data, start_date, end_date, types=types,
+                           device_sources=device_sources, compression=compression)
+
+    return save_dir
+
+
+def save_user_event_json(user_event_json, save_dir, compression=None, write_columns=True):
+    """
+    Save event data in a user directory.
+
+    Args:
+        user_event_json (list): event data
+        save_dir (str): user directory
+        compression (str): Optional codec for the event file, e.g. "gzip" or "zstd"
+        write_columns (bool): Also save typed column tables per event type for fast loading
+    """
+    event_data_path = get_compressed_path(os.path.join(save_dir, EVENT_DATA_FILENAME), compression)
+    save_json_atomic(user_event_json, event_data_path, compression=compression)
+    if write_columns:
+        save_event_columns(events_to_columns(user_event_json, skip_unknown=True),
+                           os.path.join(save_dir, EVENT_COLUMNS_DIRNAME))
+
+
+def save_user_notes_json(notes_json, save_dir, compression=None):
+    """
+    Save notes in a user directory.
+
+    Args:
+        notes_json (dict): notes
+        save_dir (str): user directory
+        compression (str): Optional codec for the notes file, e.g. "gzip" or "zstd"
+    """
+    notes_path = get_compressed_path(os.path.join(save_dir, NOTES_FILENAME), compression)
+    save_json_atomic(notes_json, notes_path, compression=compression)
+
+
+def save_creation_metadata(save_dir, user_id, start_date, end_date, types=None,
+                           device_sources=DEFAULT_DEVICE_SOURCES, compression=None):
+    """
+    Document a download in its user directory. Written last, so the directory is only
+    described once its data is saved.
+
+    Args:
+        save_dir (str): user directory
+        user_id (str): user id of the data
+        start_date (dt.DateTime): start date of data collection
+        end_date (dt.DateTime): end date of data collection
+        types (list): event types downloaded, None for all
+        device_sources (list): device sources downloaded
+        compression (str): codec of the event and notes files
+    """
     creation_metadata = {
         "date_created": dt.datetime.now().isoformat(),
         "api_version": "v1",
+        "user_id": user_id,
+        "event_types": types,
+        "device_sources": device_sources,
+        "compression": compression,
         "data_start_date": start_date.strftime(DATESTAMP_FORMAT),
         "data_end_date": end_date.strftime(DATESTAMP_FORMAT)
     }
-    json.dump(creation_metadata, open(os.path.join(save_dir, CREATION_META_FILENAME), "w"))
+    save_json_atomic(creation_metadata, os.path.join(save_dir, CREATION_META_FILENAME))
+
+
+def save_user_data(user_id, user_event_json, notes_json, start_date, end_date, types=None,
+                   device_sources=DEFAULT_DEVICE_SOURCES, compression=None, write_columns=True, data_dir=PHI_DATA_DIR):
+    """
+    Save already downloaded user data in the directory layout of download_user_data.
+
+    Args:
+        user_id (str): user id of the data
+        user_event_json (list): event data
+        notes_json (dict): notes
+        start_date (dt.DateTime): start date of data collection
+        end_date (dt.DateTime): end date of data collection
+        types (list): event types downloaded, None for all
+        device_sources (list): device sources downloaded
+        compression (str): Optional codec for the event and notes files, e.g. "gzip" or "zstd"
+        write_columns (bool): Also save typed column tables per event type for fast loading
+        data_dir (str): PHI directory the user directory is created in
+
+    Returns:
+        str: directory where the user data was saved
+    """
+    save_dir = create_user_dir(user_id, start_date, end_date, data_dir=data_dir)
+
+    save_user_event_json(user_event_json, save_dir, compression=compression, write_columns=write_columns)
+    save_user_notes_json(notes_json, save_dir, compression=compression)
+    save_creation_metadata(save_dir, user_id, start_date, end_date, types=types, device_sources=device_sources,
+                           compression=compression)
+
+    return save_dir
+
+
+def sync_user_data(username, password, path_to_user_data_dir, end_date=None, user_id=None,
+                   overlap_hours=DEFAULT_SYNC_OVERLAP_HOURS, session=None, window_days=None, token_cache=None,
+                   api_base_url=DEFAULT_API_BASE_URL):
+    """
+    Bring a previously downloaded user directory up to date by fetching only data since
+    the last sync, with some overlap, and merging it into the stored data. If the event or
+    notes file is missing the whole date range is downloaded again. A directory named by
+    create_user_dir is renamed to the new date range.
+
+    Args:
+        username (str): username for login
+        password (str): password for login
+        path_to_user_data_dir (str): directory created by download_user_data
+        end_date (dt.DateTime): Optional end date of data collection, defaults to today
+        user_id (str): Optional user id if the login credentials are an observer. Defaults
+            to the user id in the metadata.
+        overlap_hours (float): hours before the last synced date to fetch again
+        session (requests.Session): Optional shared session to reuse connections across downloads
+        window_days (int): Optional number of days per concurrent event data request
+        token_cache (SessionTokenCache): Optional cache to log in once per account across syncs
+        api_base_url (str): root url of the api
+
+    Returns:
+        (str, int): user directory after the sync and number of events added or updated
+    """
+    creation_meta_path = os.path.join(path_to_user_data_dir, CREATION_META_FILENAME)
+    creation_metadata = json.load(open(creation_meta_path))
+
+    if end_date is None:
+        end_date = dt.datetime.now()
+
+    data_start_date = dt.datetime.strptime(creation_metadata["data_start_date"], DATESTAMP_FORMAT)
+    last_end_date = dt.datetime.strptime(creation_metadata["data_end_date"], DATESTAMP_FORMAT)
+    # The stored end date includes the entire day
+    sync_start_date = last_end_date + dt.timedelta(days=1) - dt.timedelta(hours=overlap_hours)
+
+    if user_id is None:
+        user_id = creation_metadata.get("user_id")
+
+    # Without the stored data there is nothing to merge into, so download the whole range
+    compression = creation_metadata.get("compression")
+    event_data_path = find_data_file(os.path.join(path_to_user_data_dir, EVENT_DATA_FILENAME))
+    notes_path = find_data_file(os.path.join(path_to_user_data_dir, NOTES_FILENAME))
+    is_full_download = event_data_path is None or notes_path is None
+    if is_full_download:
+        sync_start_date = data_start_date
+        event_data_path = get_compressed_path(os.path.join(path_to_user_data_dir, EVENT_DATA_FILENAME), compression)
+        notes_path = get_compressed_path(os.path.join(path_to_user_data_dir, NOTES_FILENAME), compression)
+
+    # Rename directories named for their date range, checking before downloading that the new name is free.
+    # Any end date in the name is matched so an interrupted rename is finished on the next sync.
+    path_to_user_data_dir = os.path.normpath(path_to_user_data_dir)
+    synced_user_dir = path_to_user_data_dir
+    user_dir_prefix = "{}_{}_".format(creation_metadata.get("user_id"), data_start_date.strftime(DATESTAMP_FORMAT))
+    if os.path.basename(path_to_user_data_dir).startswith(user_dir_prefix):
+        synced_user_dir = os.path.join(os.path.dirname(path_to_user_data_dir),
+                                       get_user_dir_name(creation_metadata.get("user_id"), data_start_date, end_date))
+        if synced_user_dir != path_to_user_data_dir and os.path.exists(synced_user_dir):
+            raise Exception("Cannot rename {} to existing {}".format(path_to_user_data_dir, synced_user_dir))
+
+    # Fetch the same kinds of data that were originally downloaded
+    types = creation_metadata.get("event_types")
+    device_sources = creation_metadata.get("device_sources", DEFAULT_DEVICE_SOURCES)
+
+    tp_api = TidepoolAPI(username, password, session=session, token_cache=token_cache, api_base_url=api_base_url)
+    tp_api.login()
+
+    new_event_json = tp_api.get_user_event_data(sync_start_date, end_date, observed_user_id=user_id,
+                                                window_days=window_days, types=types,
+                                                device_sources=device_sources)
+    new_notes_json = tp_api.get_notes(sync_start_date, end_date, observed_user_id=user_id)
+
+    tp_api.logout()
+    tp_api.close()
+
+    if new_event_json is None:
+        raise Exception("Failed to download event data for sync.")
+
+    # Merge events. Newly fetched versions replace stored ones since events can be edited.
+    stored_event_json = [] if is_full_download else load_json_file(event_data_path) or []
+    merged_event_json = merge_by_id(stored_event_json, new_event_json, time_key="time")
+    num_new_events = count_changed_items(stored_event_json, new_event_json, time_key="time")
+
+    save_json_atomic(merged_event_json, event_data_path, compression=detect_compression(event_data_path))
+
+    columns_dir = os.path.join(path_to_user_data_dir, EVENT_COLUMNS_DIRNAME)
+    if os.path.isdir(columns_dir):
+        save_event_columns(events_to_columns(merged_event_json, skip_unknown=True), columns_dir)
+
+    # Merge notes
+    if new_notes_json is not None:
+        stored_notes_json = {} if is_full_download else load_json_file(notes_path) or {}
+        merged_messages = merge_by_id(stored_notes_json.get("messages", []), new_notes_json.get("messages", []),
+                                      time_key="timestamp")
+        stored_notes_json["messages"] = merged_messages
+        save_json_atomic(stored_notes_json, notes_path, compression=detect_compression(notes_path))
+
+    # Metadata is written last so an interrupted sync is re-run from the previous state
+    creation_metadata["data_end_date"] = end_date.strftime(DATESTAMP_FORMAT)
+    creation_metadata["date_synced"] = dt.datetime.now().isoformat()
+    save_json_atomic(creation_metadata, creation_meta_path)
+
+    if synced_user_dir != path_to_user_data_dir:
+        os.rename(path_to_user_data_dir, synced_user_dir)
+
+    return synced_user_dir, num_new_events
+
+
+def get_partition_key(time_str, partition_period):
+    """
+    Get the partition an api timestamp belongs to. Keys sort in time order.
+
+    Args:
+        time_str (str): api timestamp, e.g. "2020-01-02T23:15:12.611Z"
+        partition_period (str): "year", "month", "week" or "day"
+
+    Returns:
+        str: partition key, e.g. "2020-01" for month
+    """
+    if partition_period == "week":
+        iso_year, iso_week, _ = dt.date(int(time_str[:4]), int(time_str[5:7]), int(time_str[8:10])).isocalendar()
+        return "{:04d}-W{:02d}".format(iso_year, iso_week)
+
+    if partition_period not in PARTITION_KEY_LENGTHS:
+        raise Exception("Unknown partition period {}".format(partition_period))
+
+    return time_str[:PARTITION_KEY_LENGTHS[partition_period]]
+
+
+def download_user_data_to_store(username, password, start_date, end_date, user_id=None, session=None,
+                                window_days=None, types=None, device_sources=DEFAULT_DEVICE_SOURCES,
+                                token_cache=None, compression=None, partition_period=DEFAULT_PARTITION_PERIOD,
+                                data_dir=PHI_DATA_DIR, api_base_url=DEFAULT_API_BASE_URL):
+    """
+    Download Tidepool user data into a store with one directory per user and event files
+    partitioned by time. Downloads of overlapping date ranges are merged on event id instead
+    of duplicated.
+
+    Args:
+        username (str): username for login
+        password (str): password for login
+        start_date (dt.DateTime): start date of data collection
+        end_date (dt.DateTime): end date of data collection
+        user_id (str): Optional user id if the login credentials are an observer
+        session (requests.Session): Optional shared session to reuse connections across downloads
+        window_days (int): Optional number of days per concurrent event data request
+        types (list): Optional event types to download. None downloads all types.
+        device_sources (list): device sources to download
+        token_cache (SessionTokenCache): Optional cache to log in once per account across downloads
+        compression (str): Optional codec for new partition files, e.g. "gzip" or "zstd"
+        partition_period (str): "year", "month", "week" or "day". Must match an existing store.
+        data_dir (str): PHI directory the user store is created in
+        api_base_url (str): root url of the api
+
+    Returns:
+        str: directory of the user store
+    """
+    tp_api = TidepoolAPI(username, password, session=session, token_cache=token_cache, api_base_url=api_base_url)
+    tp_api.login()
+
+    user_id_of_data = user_id
+    if user_id_of_data is None:
+        user_id_of_data = tp_api.get_login_user_id()
+
+    new_event_json = tp_api.get_user_event_data(start_date, end_date, observed_user_id=user_id,
+                                                window_days=window_days, types=types,
+                                                device_sources=device_sources)
+    new_notes_json = tp_api.get_notes(start_date, end_date, observed_user_id=user_id)
+
+    tp_api.logout()
+    tp_api.close()
+
+    if new_event_json is None or new_notes_json is None:
+        raise Exception("Failed to download user data for store.")
+
+    store_dir = create_user_store_dir(user_id_of_data, data_dir=data_dir)
+    store_meta_path = os.path.join(store_dir, CREATION_META_FILENAME)
+    if os.path.isfile(store_meta_path):
+        store_metadata = json.load(open(store_meta_path))
+        if store_metadata["partition_period"] != partition_period:
+            raise Exception("Store {} is partitioned by {}.".format(store_dir, store_metadata["partition_period"]))
+    else:
+        store_metadata = {
+            "date_created": dt.datetime.now().isoformat(),
+            "api_version": "v1",
+            "user_id": user_id_of_data,
+            "partition_period": partition_period,
+            "date_ranges": [],
+        }
+
+    merge_events_into_store(store_dir, new_event_json, partition_period, compression=compression)
+
+    notes_path = find_data_file(os.path.join(store_dir, NOTES_FILENAME))
+    if notes_path is None:
+        notes_path = get_compressed_path(os.path.join(store_dir, NOTES_FILENAME), compression)
+        stored_notes_json = new_notes_json
+    else:
+        stored_notes_json = load_json_file(notes_path)
+        stored_notes_json["messages"] = merge_by_id(stored_notes_json.get("messages", []),
+                                                    new_notes_json.get("messages", []), time_key="timestamp")
+    save_json_atomic(stored_notes_json, notes_path, compression=detect_compression(notes_path))
+
+    # Metadata is written last so it only lists ranges that were fully merged
+    store_metadata["date_ranges"].append([start_date.strftime(DATESTAMP_FORMAT), end_date.strftime(DATESTAMP_FORMAT)])
+    store_metadata["event_types"] = types
+    store_metadata["device_sources"] = device_sources
+    store_metadata["date_updated"] = dt.datetime.now().isoformat()
+    save_json_atomic(store_metadata, store_meta_path)
+
+    return store_dir
+
+
+def get_store_partition_paths(store_dir):
+    """
+    Args:
+        store_dir (str): user store directory
+
+    Returns:
+        dict: partition key mapped to partition file path
+    """
+    partitions_dir = os.path.join(store_dir, PARTITIONS_DIRNAME)
+    partition_paths = {}
+    for filename in os.listdir(partitions_dir):
+        if filename.startswith("."):
+            continue
+        partition_paths[filename.split(".")[0]] = os.path.join(partitions_dir, filename)
+
+    return partition_paths
+
+
+def load_store_event_index(store_dir):
+    """
+    Load the index of which partition holds each event id, rebuilding it from the partitions
+    if it is missing, e.g. after an interrupted merge.
+
+    Args:
+        store_dir (str): user store directory
+
+    Returns:
+        dict: event id mapped to partition key
+    """
+    index_path = os.path.join(store_dir, STORE_EVENT_INDEX_FILENAME)
+    if os.path.isfile(index_path):
+        return json.load(open(index_path))
+
+    event_index = {}
+    for partition_key, partition_path in get_store_partition_paths(store_dir).items():
+        for event in load_json_file(partition_path):
+            if "id" in event:
+                event_index[event["id"]] = partition_key
+
+    return event_index
+
+
+def merge_events_into_store(store_dir, new_event_json, partition_period, compression=None):
+    """
+    Merge events into the partition files of a user store. Only partitions with new events,
+    or holding a stored copy of one, are read and rewritten. An event whose time was edited
+    into another partition is removed from the partition it was in, so each id is kept once.
+
+    Args:
+        store_dir (str): user store directory
+        new_event_json (list): newly downloaded events
+        partition_period (str): partition period of the store
+        compression (str): Optional codec for new partition files
+    """
+    partitions_dir = os.path.join(store_dir, PARTITIONS_DIRNAME)
+    os.makedirs(partitions_dir, exist_ok=True)
+
+    event_index = load_store_event_index(store_dir)
+
+    partition_keys = {get_partition_key(event["time"], partition_period) for event in new_event_json}
+    partition_keys.update(event_index[event["id"]] for event in new_event_json if event.get("id") in event_index)
+
+    stored_event_json = []
+    partition_paths = {}
+    for partition_key in partition_keys:
+        partition_path = find_data_file(os.path.join(partitions_dir, partition_key + ".json"))
+        if partition_path is not None:
+            stored_event_json.extend(load_json_file(partition_path))
+        else:
+            partition_path = get_compressed_path(os.path.join(partitions_dir, partition_key + ".json"), compression)
+        partition_paths[partition_key] = partition_path
+
+    partition_events = defaultdict(list)
+    for event in merge_by_id(stored_event_json, new_event_json, time_key="time"):
+        partition_key = get_partition_key(event["time"], partition_period)
+        partition_events[partition_key].append(event)
+        if "id" in event:
+            event_index[event["id"]] = partition_key
+
+    # The index is removed while partitions are rewritten so an interrupted merge rebuilds it
+    index_path = os.path.join(store_dir, STORE_EVENT_INDEX_FILENAME)
+    if os.path.isfile(index_path):
+        os.remove(index_path)
+
+    for partition_key, partition_path in partition_paths.items():
+        save_json_atomic(partition_events[partition_key], partition_path,
+                         compression=detect_compression(partition_path))
+
+    save_json_atomic(event_index, index_path)
+
+
+def load_store_event_json(store_dir, start_date=None, end_date=None):
+    """
+    Load events from a user store, reading only the partitions that overlap a date range.
+
+    Args:
+        store_dir (str): user store directory
+        start_date (dt.DateTime): Optional start date, inclusive
+        end_date (dt.DateTime): Optional end date, inclusive of the entire day
+
+    Returns:
+        list: events in the date range sorted by time
+    """
+    store_metadata = json.load(open(os.path.join(store_dir, CREATION_META_FILENAME)))
+    partition_period = store_metadata["partition_period"]
+
+    # Open ends compare below and above every timestamp and partition key
+    start_str, end_str = "", "~"
+    start_key, end_key = "", "~"
+    if start_date is not None:
+        start_str = TidepoolAPI.get_date_filter_string(start_date, start_date)[0]
+        start_key = get_partition_key(start_str, partition_period)
+    if end_date is not None:
+        end_str = TidepoolAPI.get_date_filter_string(end_date, end_date)[1]
+        end_key = get_partition_key(end_str, partition_period)
+
+    partition_paths = get_store_partition_paths(store_dir)
+
+    event_json = []
+    for partition_key in sorted(partition_paths):
+        if start_key <= partition_key <= end_key:
+            event_json.extend(event for event in load_json_file(partition_paths[partition_key])
+                              if start_str <= event["time"] <= end_str)
+
+    return event_json
 
 
-def load_user_from_files(path_to_user_data_dir):
+def get_merge_key(item, time_key):
     """
-    Load user object from downloaded json.
+    Get the key objects are merged on: the id, or the type and time for objects without one.
+
+    Args:
+        item (dict): api object
+        time_key (str): key of timestamp
+
+    Returns:
+        str or tuple: merge key
+    """
+    return item.get("id", (item.get("type"), item.get(time_key)))
+
+
+def count_changed_items(stored_items, new_items, time_key):
+    """
+    Count new objects that are missing from the stored ones or differ from their stored version.
+
+    Args:
+        stored_items (list): previously saved objects
+        new_items (list): newly downloaded objects
+        time_key (str): key of timestamp
+
+    Returns:
+        int: number of objects added or updated
+    """
+    stored_items_by_key = {get_merge_key(item, time_key): item for item in stored_items}
+    changed_keys = {get_merge_key(item, time_key) for item in new_items
+                    if stored_items_by_key.get(get_merge_key(item, time_key)) != item}
+
+    return len(changed_keys)
+
+
+def merge_by_id(stored_items, new_items, time_key):
+    """
+    Merge two lists of api objects, keeping the new version of any object present in both.
+
+    Args:
+        stored_items (list): previously saved objects
+        new_items (list): newly downloaded objects
+        time_key (str): key of timestamp to sort on
+
+    Returns:
+        list: merged objects sorted by time
+    """
+    merged_items = OrderedDict()
+    for item in stored_items:
+        merged_items[get_merge_key(item, time_key)] = item
+
+    for item in new_items:
+        merged_items[get_merge_key(item, time_key)] = item
+
+    return sorted(merged_items.values(), key=lambda item: item.get(time_key, ""))
+
+
+def save_json_atomic(json_obj, path, compression=None):
+    """
+    Write json to a temporary file and rename it over the target so readers never
+    see a partially written file.
+
+    Args:
+        json_obj (object): json serializable object
+        path (str): file path to write
+        compression (str): Optional codec, e.g. "gzip" or "zstd"
+    """
+    save_dir = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=save_dir, prefix=".tmp_")
+    os.close(file_descriptor)
+    try:
+        with open_compressed(temp_path, "w", compression=compression) as file_to_write:
+            # One write is much faster than json.dump's many small writes
+            file_to_write.write(json.dumps(json_obj))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def load_json_file(path):
+    """
+    Load a json file, decompressing based on its extension and decoding with the json backend.
+
+    Args:
+        path (str): file path
+
+    Returns:
+        object: decoded json
+    """
+    with open_compressed(path, "rb") as file_to_read:
+        return json_backend.load(file_to_read)
+
+
+def load_user_from_files(path_to_user_data_dir, use_columns=True, use_cache=False, validate_cache_hash=False,
+                         start_date=None, end_date=None):
+    """
+    Load user object from downloaded json. Compressed event and notes files are
+    detected by extension.
 
     Args:
         path_to_user_data_dir:
-        api_version:
+        use_columns (bool): Load the typed column tables instead of event json when present
+        use_cache (bool): Load timelines from the memory-mapped timeline cache when it is valid
+            for the event data file, otherwise parse and write the cache. Directories without an
+            event data file, e.g. only event columns, are not cached.
+        validate_cache_hash (bool): When writing the cache, validate it later by a hash of the
+            event data file instead of its mtime
+        start_date (dt.DateTime): Optional start of the data to load. Only for user stores
+            from download_user_data_to_store, which read just the partitions in the range.
+        end_date (dt.DateTime): Optional end of the data to load, inclusive of the entire day
 
     Returns:
 
     """
-    event_data_json = json.load(open(os.path.join(path_to_user_data_dir, EVENT_DATA_FILENAME)))
-    notes_json = json.load(open(os.path.join(path_to_user_data_dir, NOTES_FILENAME)))
+    notes_json = load_json_file(find_data_file(os.path.join(path_to_user_data_dir, NOTES_FILENAME)))
     creation_meta_json = json.load(open(os.path.join(path_to_user_data_dir, CREATION_META_FILENAME)))
+    api_version = creation_meta_json["api_version"]
 
     notes_json = None  # FIXME: bypassing notes until date string format is fixed
 
-    user = TidepoolUser(event_data_json, notes_json, api_version=creation_meta_json["api_version"])
+    if "partition_period" in creation_meta_json:
+        event_data_json = load_store_event_json(path_to_user_data_dir, start_date=start_date, end_date=end_date)
+        return TidepoolUser(event_data_json, notes_json, api_version=api_version)
+
+    if start_date is not None or end_date is not None:
+        raise Exception("Date ranges can only be loaded from a partitioned user store.")
+
+    event_data_path = find_data_file(os.path.join(path_to_user_data_dir, EVENT_DATA_FILENAME))
+    cache_dir = os.path.join(path_to_user_data_dir, TIMELINE_CACHE_DIRNAME)
+
+    # The cache is validated against the event data file, so there is no cache without one
+    use_cache = use_cache and event_data_path is not None
+    if use_cache:
+        timeline_arrays = load_timeline_cache(cache_dir, event_data_path)
+        if timeline_arrays is not None:
+            return TidepoolUser.from_timeline_arrays(timeline_arrays, notes_json, api_version=api_version)
+
+    columns_dir = os.path.join(path_to_user_data_dir, EVENT_COLUMNS_DIRNAME)
+    if use_columns and os.path.isdir(columns_dir):
+        event_columns = load_event_columns(columns_dir)
+        user = TidepoolUser.from_event_columns(event_columns, notes_json, api_version=api_version)
+    else:
+        event_data_json = load_json_file(event_data_path)
+        user = TidepoolUser(event_data_json, notes_json, api_version=api_version)
+
+    if use_cache:
+        save_timeline_cache(user.get_timeline_arrays(), cache_dir, event_data_path, use_hash=validate_cache_hash)
 
     return user
 
 
-def create_user_dir(user_id, start_date, end_date):
+def get_user_dir_name(user_id, start_date, end_date):
+    """
+    Get the name of the directory for a user's data over a date range.
+
+    Args:
+        user_id (str): user id for user
+        start_date dt.DateTime: start date of data for user
+        end_date dt.DateTime: end date of data for user
+
+    Returns:
+        str: directory name
+    """
+    return "{}_{}_{}".format(user_id, start_date.strftime(DATESTAMP_FORMAT), end_date.strftime(DATESTAMP_FORMAT))
+
+
+def create_user_dir(user_id, start_date, end_date, data_dir=PHI_DATA_DIR):
     """
     Create
     Args:
         start_date dt.DateTime: start date of data for user
         end_date dt.DateTime: end date of data for user
         user_id (str): user id for user
+        data_dir (str): PHI directory to create the user directory in
 
     Returns:
         str: dir_path for saving data
     """
-    phi_data_location = "../../data/PHI/"
+    phi_data_location = data_dir
     if not os.path.isdir(phi_data_location):
         raise Exception("You are not saving to PHI folder. Check your path.")
 
-    dir_name = "{}_{}_{}".format(user_id, start_date.strftime(DATESTAMP_FORMAT), end_date.strftime(DATESTAMP_FORMAT))
-    user_dir = os.path.join(phi_data_location, dir_name)
+    user_dir = os.path.join(phi_data_location, get_user_dir_name(user_id, start_date, end_date))
     if not os.path.isdir(user_dir):
         os.makedirs(user_dir)
 
     return user_dir
 
 
+def create_user_store_dir(user_id, data_dir=PHI_DATA_DIR):
+    """
+    Create the store directory for a user, shared by all downloads of that user.
+
+    Args:
+        user_id (str): user id for user
+        data_dir (str): PHI directory to create the store in
+
+    Returns:
+        str: dir_path of the user store
+    """
+    if not os.path.isdir(data_dir):
+        raise Exception("You are not saving to PHI folder. Check your path.")
+
+    store_dir = os.path.join(data_dir, user_id)
+    os.makedirs(os.path.join(store_dir, PARTITIONS_DIRNAME), exist_ok=True)
+
+    return store_dir
+
+
 if __name__ == "__main__":
 
     # email = input("Input email:")
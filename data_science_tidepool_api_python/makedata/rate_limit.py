@@ -0,0 +1,86 @@
+"""
+Rate limiting and retry timing for requests to the Tidepool API.
+"""
+
+import time
+import random
+import threading
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Tokens refill continuously at a fixed rate up to
+    a capacity, and each request takes one token, blocking until one is available.
+    Share one bucket between threads or api instances to limit their combined rate.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): tokens added per second, i.e. sustained requests per second
+            capacity (float): max tokens held, i.e. allowed burst size. Defaults to rate.
+        """
+        if rate <= 0:
+            raise Exception("Rate must be positive.")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._last_refill_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill_time) * self.rate)
+        self._last_refill_time = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available without blocking.
+
+        Returns:
+            bool: True if tokens were taken
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens, blocking until they are available.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_sec = (tokens - self._tokens) / self.rate
+            time.sleep(wait_sec)
+
+
+def get_backoff_sec(attempt, base_sec=0.5, max_sec=60.0, retry_after=None):
+    """
+    Get the time to wait before retrying a request. Uses the server's Retry-After
+    header when given, otherwise exponential backoff with jitter.
+
+    Args:
+        attempt (int): number of the retry starting at 0
+        base_sec (float): wait before the first retry
+        max_sec (float): max wait
+        retry_after (str): Optional value of Retry-After header in seconds
+
+    Returns:
+        float: seconds to wait
+    """
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), max_sec)
+        except ValueError:
+            pass  # http-date form is not used by the api
+
+    backoff_sec = min(base_sec * 2 ** attempt, max_sec)
+    return backoff_sec * random.uniform(0.5, 1.0)
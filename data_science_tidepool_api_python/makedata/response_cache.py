@@ -0,0 +1,232 @@
+"""
+On-disk cache of Tidepool API response bodies for exploratory work that repeats the
+same requests. Entries expire after a per-endpoint ttl, except responses for date ranges
+old enough that they no longer change, which are kept until evicted. The total size on
+disk is capped by evicting the least recently used entries.
+
+Responses contain PHI, so the cache directory should live under the PHI data directory.
+"""
+
+import os
+import time
+import json
+import hashlib
+import tempfile
+import threading
+import datetime as dt
+from collections import OrderedDict
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+DEFAULT_RESPONSE_TTL_SEC = {
+    "users_sharing_with": 10 * 60,
+    "notes": 60 * 60,
+    "user_data": 60 * 60,
+}
+
+# Devices can upload weeks after the fact, so only ranges ending this long ago are final
+DEFAULT_HISTORICAL_AFTER_DAYS = 30
+
+CACHE_FILE_EXTENSION = ".cache"
+
+
+class ResponseCache(object):
+    """
+    Response bodies keyed by endpoint, account and request url, stored one file per entry.
+    Safe to share between threads. Processes can share a directory, but each keeps its own
+    view of the size for eviction.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_RESPONSE_CACHE_MAX_BYTES, ttl_sec=None,
+                 historical_after_days=DEFAULT_HISTORICAL_AFTER_DAYS):
+        """
+        Args:
+            path (str): cache directory, created if needed
+            max_bytes (int): size on disk above which least recently used entries are evicted
+            ttl_sec (dict): Optional endpoint mapped to seconds a response is reused. Overrides
+                DEFAULT_RESPONSE_TTL_SEC per endpoint.
+            historical_after_days (float): responses for date ranges ending more than this many
+                days ago never expire
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_sec = dict(DEFAULT_RESPONSE_TTL_SEC, **(ttl_sec or {}))
+        self.historical_after_days = historical_after_days
+
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+        self._lock = threading.Lock()
+        self._entry_sizes = OrderedDict()
+        self._num_bytes = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """
+        Build the lru order from file mtimes, which are touched on every hit.
+        """
+        entries = []
+        for dir_entry in os.scandir(self.path):
+            if dir_entry.name.endswith(CACHE_FILE_EXTENSION):
+                stat = dir_entry.stat()
+                entries.append((stat.st_mtime, dir_entry.name[:-len(CACHE_FILE_EXTENSION)], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entry_sizes[key] = size
+            self._num_bytes += size
+
+    @staticmethod
+    def get_key(endpoint, login_user_id, url):
+        """
+        Args:
+            endpoint (str): endpoint name, e.g. "user_data"
+            login_user_id (str): id of the logged in account, since accounts see different data
+            url (str): request url including the user and date range
+
+        Returns:
+            str: cache key
+        """
+        return hashlib.sha256("{}|{}|{}".format(endpoint, login_user_id, url).encode()).hexdigest()
+
+    def get_ttl_sec(self, endpoint, end_date=None):
+        """
+        Get how long to keep a response.
+
+        Args:
+            endpoint (str): endpoint name
+            end_date (dt.DateTime): Optional end date of the requested range, inclusive of the entire day
+
+        Returns:
+            float: seconds, or None to keep until evicted
+        """
+        if end_date is not None:
+            historical_cutoff = dt.datetime.now() - dt.timedelta(days=self.historical_after_days)
+            if end_date + dt.timedelta(days=1) <= historical_cutoff:
+                return None
+
+        return self.ttl_sec[endpoint]
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.path, key + CACHE_FILE_EXTENSION)
+
+    def get(self, key):
+        """
+        Get a cached response body.
+
+        Args:
+            key (str): cache key from get_key
+
+        Returns:
+            bytes: response body, or None if not cached or expired
+        """
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as file_to_read:
+                header = json.loads(file_to_read.readline())
+                body = file_to_read.read()
+        except (FileNotFoundError, ValueError):
+            body = None
+            header = None
+
+        if header is not None and header["expires_at"] is not None and header["expires_at"] < time.time():
+            self._remove(key)
+            body = None
+
+        with self._lock:
+            if body is None:
+                self.num_misses += 1
+                return None
+
+            self.num_hits += 1
+            if key in self._entry_sizes:
+                self._entry_sizes.move_to_end(key)
+
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+
+        return body
+
+    def set(self, key, body, ttl_sec=None):
+        """
+        Cache a response body and evict least recently used entries over the size cap.
+
+        Args:
+            key (str): cache key from get_key
+            body (bytes): response body
+            ttl_sec (float): seconds to keep the entry, None to keep until evicted
+        """
+        expires_at = None if ttl_sec is None else time.time() + ttl_sec
+        header = json.dumps({"expires_at": expires_at}).encode() + b"\n"
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp_")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file_to_write:
+                file_to_write.write(header)
+                file_to_write.write(body)
+            os.replace(temp_path, self._get_entry_path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        size = len(header) + len(body)
+        with self._lock:
+            self._num_bytes += size - self._entry_sizes.pop(key, 0)
+            self._entry_sizes[key] = size
+
+            keys_to_evict = []
+            while self._num_bytes > self.max_bytes and len(self._entry_sizes) > 1:
+                evict_key, evict_size = self._entry_sizes.popitem(last=False)
+                self._num_bytes -= evict_size
+                self.num_evictions += 1
+                keys_to_evict.append(evict_key)
+
+        for evict_key in keys_to_evict:
+            self._remove_file(evict_key)
+
+    def _remove(self, key):
+        with self._lock:
+            self._num_bytes -= self._entry_sizes.pop(key, 0)
+        self._remove_file(key)
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._get_entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            keys = list(self._entry_sizes)
+            self._entry_sizes.clear()
+            self._num_bytes = 0
+
+        for key in keys:
+            self._remove_file(key)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: hit, miss and eviction counts and the current size
+        """
+        with self._lock:
+            num_lookups = self.num_hits + self.num_misses
+            return {
+                "hits": self.num_hits,
+                "misses": self.num_misses,
+                "hit_rate": self.num_hits / num_lookups if num_lookups else 0.0,
+                "evictions": self.num_evictions,
+                "num_entries": len(self._entry_sizes),
+                "num_bytes": self._num_bytes,
+            }
@@ -8,15 +8,43 @@ Reference: https://developer.tidepool.org/tidepool-api/index/
 """
 
 import os
+import time
+import threading
 import datetime as dt
 import sys
+from concurrent.futures import ThreadPoolExecutor
 import requests
 
 import logging
 from data_science_tidepool_api_python.util import DATESTAMP_FORMAT
+from data_science_tidepool_api_python.makedata.json_stream import iter_json_array, DEFAULT_CHUNK_SIZE
+from data_science_tidepool_api_python.makedata.rate_limit import TokenBucket, get_backoff_sec
+from data_science_tidepool_api_python.makedata.compression import get_accept_encoding, open_compressed
+from data_science_tidepool_api_python.makedata import json_backend
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_API_BASE_URL = "https://api.tidepool.org"
+
+# (connect, read) timeouts in seconds passed to every request
+DEFAULT_TIMEOUT = (5, 120)
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+DEFAULT_WINDOW_RETRIES = 3
+WINDOW_RETRY_BACKOFF_SEC = 1.0
+
+DEFAULT_INVITATION_WORKERS = 8
+DEFAULT_INVITATION_REQUESTS_PER_SEC = 10.0
+DEFAULT_INVITATION_RETRIES = 4
+
+# Device sources requested from the data endpoint by default
+DEFAULT_DEVICE_SOURCES = ["dexcom", "medtronic", "carelink"]
+
+# Status codes that are worth retrying after waiting
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 def read_auth_csv(path_to_csv):
     """
@@ -35,6 +63,118 @@ def read_auth_csv(path_to_csv):
     return username, password
 
 
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, keep_alive=True,
+                   max_retries=0):
+    """
+    Create a pooled http session that can be shared between TidepoolAPI instances.
+
+    Args:
+        pool_connections (int): number of host connection pools to cache
+        pool_maxsize (int): max number of connections kept alive per host, should be >= number of threads
+        keep_alive (bool): reuse connections between requests
+        max_retries (int): number of retries on connection errors
+
+    Returns:
+        requests.Session: session with mounted connection pool
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=max_retries
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    # Ask for compressed responses in every codec the client can decode
+    session.headers["Accept-Encoding"] = get_accept_encoding()
+
+    return session
+
+
+def get_date_windows(start_date, end_date, window_days):
+    """
+    Split a date range into consecutive non-overlapping windows of whole days.
+
+    Args:
+        start_date (dt.DateTime): start date, inclusive
+        end_date (dt.DateTime): end date, inclusive of entire day
+        window_days (int): number of days in each window
+
+    Returns:
+        list: list of (start, end) date tuples, the last window may be shorter
+    """
+    if window_days < 1:
+        raise Exception("Window must be at least one day.")
+
+    windows = []
+    window_start = dt.datetime(start_date.year, start_date.month, start_date.day)
+    last_day = dt.datetime(end_date.year, end_date.month, end_date.day)
+    while window_start <= last_day:
+        window_end = min(window_start + dt.timedelta(days=window_days - 1), last_day)
+        windows.append((window_start, window_end))
+        window_start = window_end + dt.timedelta(days=1)
+
+    return windows
+
+
+def get_user_data_query_string(start_date_str, end_date_str, types=None, device_sources=DEFAULT_DEVICE_SOURCES):
+    """
+    Build the query string for the data endpoint.
+
+    Args:
+        start_date_str (str): start date filter string
+        end_date_str (str): end date filter string
+        types (list): Optional event types to request, e.g. ["cbg", "bolus"]. None requests all types.
+        device_sources (list): device sources to request, e.g. ["dexcom"]
+
+    Returns:
+        str: query string
+    """
+    query_string = "startDate={start_date}&endDate={end_date}".format(**{
+        "start_date": start_date_str,
+        "end_date": end_date_str
+    })
+
+    if types:
+        query_string += "&type={}".format(",".join(types))
+
+    for device_source in device_sources or []:
+        query_string += "&{}=true".format(device_source)
+
+    return query_string
+
+
+def merge_event_windows(window_event_lists):
+    """
+    Merge lists of events from multiple windows into a single list in time order,
+    dropping events that appear in more than one window.
+
+    Args:
+        window_event_lists (list): list of lists of events
+
+    Returns:
+        list: events sorted by time
+    """
+    merged_events = []
+    seen_keys = set()
+    for window_events in window_event_lists:
+        for event in window_events:
+            event_key = event.get("id", (event.get("type"), event.get("time")))
+            if event_key in seen_keys:
+                continue
+            seen_keys.add(event_key)
+            merged_events.append(event)
+
+    # Api timestamps share one format so string order is time order
+    merged_events.sort(key=lambda event: event.get("time", ""))
+
+    return merged_events
+
+
 class TidepoolAPI(object):
     """
     Class representing a user with a Tidepool account.
@@ -43,24 +183,158 @@ class TidepoolAPI(object):
     # TODO: Add helper functions for getting earlier/latest data
     """
 
-    def __init__(self, username, password):
+    def __init__(self, username, password, session=None, timeout=DEFAULT_TIMEOUT, api_base_url=DEFAULT_API_BASE_URL,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, token_cache=None, response_cache=None):
+        """
+        Args:
+            username (str): username for login
+            password (str): password for login
+            session (requests.Session): Optional session to share connections with other instances
+            timeout (float or tuple): (connect, read) timeout in seconds for each request
+            api_base_url (str): root url of the api
+            pool_maxsize (int): max kept-alive connections if creating a new session
+            token_cache (SessionTokenCache): Optional cache to reuse session tokens across logins
+            response_cache (ResponseCache): Optional on-disk cache of users sharing with, notes
+                and event data responses
+        """
 
-        self.login_url = "https://api.tidepool.org/auth/login"
+        self.api_base_url = api_base_url
+        self.login_url = api_base_url + "/auth/login"
 
-        self.user_data_url = "https://api.tidepool.org/data/{user_id}"
-        self.logout_url = "https://api.tidepool.org/auth/logout"
-        self.users_sharing_to_url = "https://api.tidepool.org/metadata/users/{user_id}/users"
-        self.users_sharing_with_url = "https://api.tidepool.org/access/groups/{user_id}"
-        self.invitations_url = "https://api.tidepool.org/confirm/invitations/{user_id}"
-        self.accept_invitations_url = "https://api.tidepool.org/confirm/accept/invite/{observer_id}/{user_id}"
-        self.user_notes_url = "https://api.tidepool.org/message/notes/{user_id}"
+        self.user_data_url = api_base_url + "/data/{user_id}"
+        self.logout_url = api_base_url + "/auth/logout"
+        self.users_sharing_to_url = api_base_url + "/metadata/users/{user_id}/users"
+        self.users_sharing_with_url = api_base_url + "/access/groups/{user_id}"
+        self.invitations_url = api_base_url + "/confirm/invitations/{user_id}"
+        self.accept_invitations_url = api_base_url + "/confirm/accept/invite/{observer_id}/{user_id}"
+        self.user_notes_url = api_base_url + "/message/notes/{user_id}"
 
         self.username = username
         self.password = password
 
+        self.timeout = timeout
+
+        self._owns_session = session is None
+        if session is None:
+            session = create_session(pool_maxsize=pool_maxsize)
+        self.session = session
+
+        self.token_cache = token_cache
+        self.response_cache = response_cache
+        self._relogin_lock = threading.Lock()
+
         self._login_user_id = None
         self._login_headers = None
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the http session if this instance created it. Shared sessions are left open.
+        """
+        if self._owns_session:
+            self.session.close()
+
+    def _request(self, method, url, **kwargs):
+        """
+        Make a request on the pooled session with the default timeout.
+
+        Returns:
+            requests.Response: response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        response = self.session.request(method, url, **kwargs)
+
+        # A cached token may have expired on the server, so log in again and retry once
+        headers = kwargs.get("headers")
+        if response.status_code == 401 and self.token_cache is not None and headers is not None \
+                and "x-tidepool-session-token" in headers:
+            self._refresh_login(headers["x-tidepool-session-token"])
+            kwargs["headers"] = dict(headers, **self._login_headers)
+            response.close()
+            response = self.session.request(method, url, **kwargs)
+
+        return response
+
+    def _refresh_login(self, rejected_token):
+        """
+        Replace a session token the server rejected with a new login.
+
+        Args:
+            rejected_token (str): token that got a 401
+        """
+        with self._relogin_lock:
+            # Another thread may have already refreshed
+            if self._login_headers is not None and self._login_headers["x-tidepool-session-token"] != rejected_token:
+                return
+            logger.info("Session token rejected. Logging in again.")
+            self.token_cache.invalidate(self.api_base_url, self.username)
+            self.login()
+
+    def _get_cached_json(self, endpoint, url):
+        """
+        Get a decoded response from the response cache.
+
+        Returns:
+            object: decoded json, or None if there is no cache or no valid entry
+        """
+        if self.response_cache is None:
+            return None
+
+        body = self.response_cache.get(self.response_cache.get_key(endpoint, self._login_user_id, url))
+        if body is None:
+            return None
+
+        return json_backend.loads(body)
+
+    def _set_cached_json(self, endpoint, url, response, end_date=None):
+        """
+        Save a successful response body to the response cache.
+
+        Args:
+            endpoint (str): endpoint name for the ttl
+            url (str): request url
+            response (requests.Response): response
+            end_date (dt.DateTime): Optional end date of the requested range
+        """
+        if self.response_cache is None:
+            return
+
+        key = self.response_cache.get_key(endpoint, self._login_user_id, url)
+        self.response_cache.set(key, response.content, ttl_sec=self.response_cache.get_ttl_sec(endpoint, end_date))
+
+    def _request_with_backoff(self, method, url, max_retries=0, rate_limiter=None, **kwargs):
+        """
+        Make a request, waiting on the rate limiter before each attempt and backing off
+        when the server responds with 429 or 5xx.
+
+        Args:
+            method (str): http method
+            url (str): url
+            max_retries (int): number of retries on retryable status codes
+            rate_limiter (TokenBucket): Optional limiter shared between threads
+
+        Returns:
+            requests.Response: last response
+        """
+        for attempt in range(max_retries + 1):
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+
+            response = self._request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                break
+
+            backoff_sec = get_backoff_sec(attempt, retry_after=response.headers.get("Retry-After"))
+            logger.debug("Status {} from {}. Retrying in {:.2f}s".format(response.status_code, url, backoff_sec))
+            time.sleep(backoff_sec)
+
+        return response
+
     def _check_login(func):
         """
         Decorator for enforcing login.
@@ -84,12 +358,23 @@ class TidepoolAPI(object):
 
     def login(self):
         """
-        Login to Tidepool API
+        Login to Tidepool API. With a token cache, a valid cached token is used instead
+        of a new login.
         """
-        login_response = requests.post(self.login_url, auth=(self.username, self.password))
+        cached_login = None
+        if self.token_cache is not None:
+            cached_login = self.token_cache.get(self.api_base_url, self.username)
+
+        if cached_login is not None:
+            xtoken, user_id_master = cached_login
+        else:
+            login_response = self._request("POST", self.login_url, auth=(self.username, self.password))
 
-        xtoken = login_response.headers["x-tidepool-session-token"]
-        user_id_master = login_response.json()["userid"]
+            xtoken = login_response.headers["x-tidepool-session-token"]
+            user_id_master = login_response.json()["userid"]
+
+            if self.token_cache is not None:
+                self.token_cache.set(self.api_base_url, self.username, xtoken, user_id_master)
 
         self._login_user_id = user_id_master
         self._login_headers = {
@@ -101,7 +386,8 @@ class TidepoolAPI(object):
     @_check_login
     def logout(self):
         """
-        Logout of Tidepool API
+        Logout of Tidepool API. With a token cache, the session is kept open on the
+        server for reuse and only this instance is logged out.
 
         Args:
             auth:
@@ -109,7 +395,12 @@ class TidepoolAPI(object):
         Returns:
 
         """
-        logout_response = requests.post(self.logout_url, auth=(self.username, self.password))
+        if self.token_cache is not None:
+            self._login_user_id = None
+            self._login_headers = None
+            return
+
+        logout_response = self._request("POST", self.logout_url, auth=(self.username, self.password))
         logout_response.raise_for_status()
 
     @_check_login
@@ -126,27 +417,29 @@ class TidepoolAPI(object):
         """
         try:
             invitations_url = self.invitations_url.format(**{"user_id": self._login_user_id})
-            invitations_response = requests.get(invitations_url, headers=self._login_headers)
+            invitations_response = self._request("GET", invitations_url, headers=self._login_headers)
             invitations_response.raise_for_status()
 
-            pending_invitations_json = invitations_response.json()
+            pending_invitations_json = json_backend.loads(invitations_response.content)
         except requests.HTTPError:
             pending_invitations_json = []
 
         return pending_invitations_json
 
     @_check_login
-    def accept_observer_invitations(self):
+    def accept_observer_invitations(self, max_workers=DEFAULT_INVITATION_WORKERS, rate_limiter=None,
+                                    max_retries=DEFAULT_INVITATION_RETRIES):
         """
         Get pending invitations sent to an observer and accept them.
 
         Args:
-            user_id_observer:
-            headers:
+            max_workers (int): number of invitations accepted concurrently
+            rate_limiter (TokenBucket): Optional limiter, share one to limit the rate across accounts
+            max_retries (int): retries per invitation on 429 and 5xx responses
 
         Returns:
             (list, list)
-            pending
+            pending invitations and (error, invitation) tuples for failed acceptance
         """
         pending_invitations_json = self.get_pending_observer_invitations()
 
@@ -154,29 +447,41 @@ class TidepoolAPI(object):
         logger.info("Num pending invitations {}".format(total_invitations))
 
         invitation_accept_failed = []
+        progress_lock = threading.Lock()
+        num_done = [0]
 
-        for i, invitation in enumerate(pending_invitations_json):
-
+        def accept_invitation(invitation):
             try:
                 share_key = invitation["key"]
                 user_id = invitation["creatorId"]
                 accept_url = self.accept_invitations_url.format(**{"observer_id": self._login_user_id, "user_id": user_id})
 
-                accept_response = requests.put(accept_url, headers=self._login_headers, json={"key": share_key})
+                accept_response = self._request_with_backoff("PUT", accept_url, max_retries=max_retries,
+                                                             rate_limiter=rate_limiter,
+                                                             headers=self._login_headers, json={"key": share_key})
                 accept_response.raise_for_status()
 
-            except requests.HTTPError as e:
-                invitation_accept_failed.append((e, invitation))
+            except (requests.HTTPError, requests.ConnectionError, requests.Timeout) as e:
+                with progress_lock:
+                    invitation_accept_failed.append((e, invitation))
+
+            with progress_lock:
+                num_done[0] += 1
+                if num_done[0] % 20 == 0:
+                    num_failed = len(invitation_accept_failed)
+                    logger.info("Accepted {}. Failed {}. Out of {}".format(num_done[0] - num_failed, num_failed,
+                                                                           total_invitations))
 
-            if i % 20 == 0:
-                num_failed = len(invitation_accept_failed)
-                logger.info("Accepted {}. Failed {}. Out of {}".format(i - num_failed, num_failed, total_invitations))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(accept_invitation, pending_invitations_json))
 
         return pending_invitations_json, invitation_accept_failed
 
     @_check_http_error
     @_check_login
-    def get_user_event_data(self, start_date, end_date, observed_user_id=None):
+    def get_user_event_data(self, start_date, end_date, observed_user_id=None, window_days=None, max_workers=4,
+                            window_retries=DEFAULT_WINDOW_RETRIES, stream=False, types=None,
+                            device_sources=DEFAULT_DEVICE_SOURCES):
         """
         Get health event data for user. TODO: Make more flexible
 
@@ -184,28 +489,188 @@ class TidepoolAPI(object):
             start_date (dt.datetime): Start date of data, inclusive
             end_date (dt.datetime): End date of data, inclusive of entire day
             observed_user_id (str): Optional id of observed user if login id is clinician/study
+            window_days (int): Optional number of days per request. The range is split into windows
+                that are fetched concurrently and merged in time order.
+            max_workers (int): max concurrent window requests
+            window_retries (int): number of times a failed window is retried before giving up
+            stream (bool): Decode the response incrementally and return a generator of events
+            types (list): Optional event types to request, e.g. PARSED_EVENT_TYPES_V1. None requests all types.
+            device_sources (list): device sources to request
+
+        Returns:
+            list: List of events as objects, or generator of events if streaming
+        """
+        if stream:
+            if window_days is not None:
+                raise Exception("Streaming does not support date windows.")
+            return self.iter_user_event_data(start_date, end_date, observed_user_id=observed_user_id, types=types,
+                                             device_sources=device_sources)
+
+        user_id = self._login_user_id
+        if observed_user_id:
+            user_id = observed_user_id
+
+        if window_days is None:
+            return self._get_user_event_data_window(start_date, end_date, user_id, types=types,
+                                                    device_sources=device_sources)
+
+        def get_window(window):
+            return self._get_user_event_data_window(window[0], window[1], user_id, num_retries=window_retries,
+                                                    types=types, device_sources=device_sources)
+
+        windows = get_date_windows(start_date, end_date, window_days)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            window_event_lists = list(executor.map(get_window, windows))
+
+        user_event_data = merge_event_windows(window_event_lists)
+
+        return user_event_data
+
+    def _get_user_event_data_window(self, start_date, end_date, user_id, num_retries=0, types=None,
+                                    device_sources=DEFAULT_DEVICE_SOURCES):
+        """
+        Get health event data for a single date range, retrying only this range on failure.
+
+        Args:
+            start_date (dt.datetime): Start date of data, inclusive
+            end_date (dt.datetime): End date of data, inclusive of entire day
+            user_id (str): id of user whose data to get
+            num_retries (int): number of retries on http or connection errors
+            types (list): Optional event types to request
+            device_sources (list): device sources to request
 
         Returns:
             list: List of events as objects
         """
+        user_data_url = self._get_user_data_url(start_date, end_date, user_id, types=types,
+                                                device_sources=device_sources)
+
+        cached_user_event_data = self._get_cached_json("user_data", user_data_url)
+        if cached_user_event_data is not None:
+            return cached_user_event_data
+
+        for attempt in range(num_retries + 1):
+            try:
+                data_response = self._request("GET", user_data_url, headers=self._login_headers)
+                data_response.raise_for_status()
+                break
+            except (requests.HTTPError, requests.ConnectionError, requests.Timeout) as e:
+                if attempt == num_retries:
+                    raise
+                logger.info("Retrying window {} to {}. Error: {}".format(start_date, end_date, e))
+                time.sleep(WINDOW_RETRY_BACKOFF_SEC * 2 ** attempt)
+
+        user_event_data = json_backend.loads(data_response.content)
+        self._set_cached_json("user_data", user_data_url, data_response, end_date=end_date)
+
+        return user_event_data
+
+    @_check_login
+    def iter_user_event_data(self, start_date, end_date, observed_user_id=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                             types=None, device_sources=DEFAULT_DEVICE_SOURCES):
+        """
+        Get health event data for user, decoding the response one event at a time so memory
+        stays flat regardless of the date range.
+
+        Args:
+            start_date (dt.datetime): Start date of data, inclusive
+            end_date (dt.datetime): End date of data, inclusive of entire day
+            observed_user_id (str): Optional id of observed user if login id is clinician/study
+            chunk_size (int): bytes read from the response at a time
+            types (list): Optional event types to request
+            device_sources (list): device sources to request
+
+        Returns:
+            generator: events as objects
+        """
+        data_response = self._stream_user_event_data(start_date, end_date, observed_user_id, types=types,
+                                                     device_sources=device_sources)
+
+        def iter_events():
+            with data_response:
+                for event in iter_json_array(data_response.iter_content(chunk_size=chunk_size)):
+                    yield event
+
+        return iter_events()
+
+    @_check_login
+    def download_user_event_data(self, start_date, end_date, path, observed_user_id=None,
+                                 chunk_size=DEFAULT_CHUNK_SIZE, types=None, device_sources=DEFAULT_DEVICE_SOURCES,
+                                 compression=None):
+        """
+        Write health event data for user straight to a json file without decoding it. If the
+        response is already compressed with the requested codec, the bytes are written as received.
+
+        Args:
+            start_date (dt.datetime): Start date of data, inclusive
+            end_date (dt.datetime): End date of data, inclusive of entire day
+            path (str): file path to write
+            observed_user_id (str): Optional id of observed user if login id is clinician/study
+            chunk_size (int): bytes read from the response at a time
+            types (list): Optional event types to request
+            device_sources (list): device sources to request
+            compression (str): Optional codec of the file, e.g. "gzip" or "zstd"
+
+        Returns:
+            int: size of the written file in bytes
+        """
+        data_response = self._stream_user_event_data(start_date, end_date, observed_user_id, types=types,
+                                                     device_sources=device_sources)
+        with data_response:
+            content_encoding = data_response.headers.get("Content-Encoding")
+            if compression is not None and content_encoding == compression:
+                chunks = data_response.raw.stream(chunk_size, decode_content=False)
+                file_to_write = open(path, "wb")
+            else:
+                chunks = data_response.iter_content(chunk_size=chunk_size)
+                file_to_write = open_compressed(path, "wb", compression=compression)
+
+            with file_to_write:
+                for chunk in chunks:
+                    file_to_write.write(chunk)
+
+        return os.path.getsize(path)
+
+    def _stream_user_event_data(self, start_date, end_date, observed_user_id=None, types=None,
+                                device_sources=DEFAULT_DEVICE_SOURCES):
+        """
+        Make the event data request without reading the body.
+
+        Returns:
+            requests.Response: response with unread body
+        """
         user_id = self._login_user_id
         if observed_user_id:
             user_id = observed_user_id
 
+        user_data_url = self._get_user_data_url(start_date, end_date, user_id, types=types,
+                                                device_sources=device_sources)
+        data_response = self._request("GET", user_data_url, headers=self._login_headers, stream=True)
+        try:
+            data_response.raise_for_status()
+        except requests.HTTPError:
+            data_response.close()
+            raise
+
+        return data_response
+
+    def _get_user_data_url(self, start_date, end_date, user_id, types=None, device_sources=DEFAULT_DEVICE_SOURCES):
+        """
+        Build the url for getting event data.
+
+        Returns:
+            str: url with date, type and device source filters
+        """
         start_date_str, end_date_str = self.get_date_filter_string(start_date, end_date)
 
         user_data_base_url = self.user_data_url.format(**{"user_id": user_id})
-        user_data_url = "{url_base}?startDate={start_date}&endDate={end_date}&dexcom=true&medtronic=true&carelink=true".format(**{
+        user_data_url = "{url_base}?{query_string}".format(**{
             "url_base": user_data_base_url,
-            "end_date": end_date_str,
-            "start_date": start_date_str,
+            "query_string": get_user_data_query_string(start_date_str, end_date_str, types=types,
+                                                       device_sources=device_sources)
         })
 
-        data_response = requests.get(user_data_url, headers=self._login_headers)
-        data_response.raise_for_status()
-        user_event_data = data_response.json()
-
-        return user_event_data
+        return user_data_url
 
     @_check_http_error
     @_check_login
@@ -222,9 +687,9 @@ class TidepoolAPI(object):
             "user_id": self._login_user_id
         })
 
-        metadata_response = requests.get(user_metadata_url, headers=self._login_headers)
+        metadata_response = self._request("GET", user_metadata_url, headers=self._login_headers)
         metadata_response.raise_for_status()
-        users_sharing_to = metadata_response.json()
+        users_sharing_to = json_backend.loads(metadata_response.content)
 
         return users_sharing_to
 
@@ -242,9 +707,15 @@ class TidepoolAPI(object):
         users_sharing_with_url = self.users_sharing_with_url.format(**{
             "user_id": self._login_user_id
         })
-        users_sharing_with_response = requests.get(users_sharing_with_url, headers=self._login_headers)
+
+        cached_users_sharing_with_json = self._get_cached_json("users_sharing_with", users_sharing_with_url)
+        if cached_users_sharing_with_json is not None:
+            return cached_users_sharing_with_json
+
+        users_sharing_with_response = self._request("GET", users_sharing_with_url, headers=self._login_headers)
         users_sharing_with_response.raise_for_status()
-        users_sharing_with_json = users_sharing_with_response.json()
+        users_sharing_with_json = json_backend.loads(users_sharing_with_response.content)
+        self._set_cached_json("users_sharing_with", users_sharing_with_url, users_sharing_with_response)
 
         return users_sharing_with_json
 
@@ -267,13 +738,20 @@ class TidepoolAPI(object):
                 "end_date": end_date_str,
                 "start_date": start_date_str,
             })
-        notes_response = requests.get(notes_url, headers=self._login_headers)
+
+        cached_notes_data = self._get_cached_json("notes", notes_url)
+        if cached_notes_data is not None:
+            return cached_notes_data
+
+        notes_response = self._request("GET", notes_url, headers=self._login_headers)
         notes_response.raise_for_status()
-        notes_data = notes_response.json()
+        notes_data = json_backend.loads(notes_response.content)
+        self._set_cached_json("notes", notes_url, notes_response, end_date=end_date)
 
         return notes_data
 
-    def get_date_filter_string(self, start_date, end_date):
+    @staticmethod
+    def get_date_filter_string(start_date, end_date):
         """
         Get string representations for date filters.
 
@@ -300,7 +778,8 @@ class TidepoolAPI(object):
         return self._login_user_id
 
 
-def accept_pending_share_invitations(account_username, account_password):
+def accept_pending_share_invitations(account_username, account_password, session=None,
+                                     max_workers=DEFAULT_INVITATION_WORKERS, rate_limiter=None, token_cache=None):
     """
     Accept all invitations for an observer account (e.g. study). This is a common operation
     so generalizing it here.
@@ -308,10 +787,23 @@ def accept_pending_share_invitations(account_username, account_password):
     Args:
         account_username (str):
         account_password (str):
+        session (requests.Session): Optional shared session to reuse connections across accounts
+        max_workers (int): number of invitations accepted concurrently
+        rate_limiter (TokenBucket): Optional limiter shared across accounts. Defaults to
+            DEFAULT_INVITATION_REQUESTS_PER_SEC for this account.
+        token_cache (SessionTokenCache): Optional cache to reuse the account's session token
+
+    Returns:
+        (list, list): pending invitations and (error, invitation) tuples for failed acceptance
     """
-    tp_api = TidepoolAPI(account_username, account_password)
+    if rate_limiter is None:
+        rate_limiter = TokenBucket(DEFAULT_INVITATION_REQUESTS_PER_SEC)
+
+    tp_api = TidepoolAPI(account_username, account_password, session=session, pool_maxsize=max_workers,
+                         token_cache=token_cache)
     tp_api.login()
-    invitations, failed_accept_invitations = tp_api.accept_observer_invitations()
+    invitations, failed_accept_invitations = tp_api.accept_observer_invitations(max_workers=max_workers,
+                                                                                rate_limiter=rate_limiter)
 
     if invitations is not None:
         logger.info(account_username)
@@ -321,3 +813,6 @@ def accept_pending_share_invitations(account_username, account_password):
         logger.info("No invitations for {}".format(account_username))
 
     tp_api.logout()
+    tp_api.close()
+
+    return invitations, failed_accept_invitations
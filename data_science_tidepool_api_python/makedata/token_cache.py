@@ -0,0 +1,160 @@
+"""
+Cache of Tidepool session tokens so batch jobs log in once per account instead
+of once per operation. Tokens can be shared between processes through a file
+readable only by the current user.
+"""
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".tidepool", "session_tokens.json")
+
+# Tokens are reused for less than the server session lifetime
+DEFAULT_TOKEN_TTL_SEC = 60 * 60
+
+TOKEN_CACHE_FILE_MODE = 0o600
+
+
+class SessionTokenCache(object):
+    """
+    Session tokens keyed by api url and account. Entries expire after a ttl and
+    can be invalidated when the server rejects a token.
+    """
+
+    def __init__(self, path=None, ttl_sec=DEFAULT_TOKEN_TTL_SEC):
+        """
+        Args:
+            path (str): Optional cache file shared between processes, e.g. DEFAULT_TOKEN_CACHE_PATH.
+                In memory only if None.
+            ttl_sec (float): seconds a token is reused after login
+        """
+        self.path = path
+        self.ttl_sec = ttl_sec
+
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_key(api_base_url, username):
+        # Hash so the file does not contain account emails
+        return hashlib.sha256("{}|{}".format(api_base_url, username).encode()).hexdigest()
+
+    def get(self, api_base_url, username):
+        """
+        Get a valid cached token for an account.
+
+        Args:
+            api_base_url (str): root url of the api
+            username (str): account username
+
+        Returns:
+            (str, str): session token and login user id, or None if there is no valid token
+        """
+        key = self._get_key(api_base_url, username)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if (entry is None or entry["expires_at"] <= time.time()) and self.path is not None:
+                entry = self._read_file().get(key)
+                if entry is not None:
+                    self._tokens[key] = entry
+
+        if entry is None or entry["expires_at"] <= time.time():
+            return None
+
+        return entry["token"], entry["user_id"]
+
+    def set(self, api_base_url, username, token, user_id):
+        """
+        Cache the token from a login.
+
+        Args:
+            api_base_url (str): root url of the api
+            username (str): account username
+            token (str): session token
+            user_id (str): login user id
+        """
+        entry = {
+            "token": token,
+            "user_id": user_id,
+            "expires_at": time.time() + self.ttl_sec
+        }
+        self._update(self._get_key(api_base_url, username), entry)
+
+    def invalidate(self, api_base_url, username):
+        """
+        Remove the token for an account, e.g. after the server rejects it.
+        """
+        self._update(self._get_key(api_base_url, username), None)
+
+    def _update(self, key, entry):
+        with self._lock:
+            if entry is None:
+                self._tokens.pop(key, None)
+            else:
+                self._tokens[key] = entry
+
+            if self.path is None:
+                return
+
+            with self._file_lock():
+                tokens = self._read_file()
+                if entry is None:
+                    tokens.pop(key, None)
+                else:
+                    tokens[key] = entry
+
+                # Drop expired entries
+                now = time.time()
+                tokens = {k: v for k, v in tokens.items() if v["expires_at"] > now}
+                self._write_file(tokens)
+
+    def _file_lock(self):
+        lock_path = self.path + ".lock"
+        os.makedirs(os.path.dirname(os.path.abspath(lock_path)), mode=0o700, exist_ok=True)
+        return _FileLock(lock_path)
+
+    def _read_file(self):
+        try:
+            with open(self.path, "r") as file_to_read:
+                return json.load(file_to_read)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_file(self, tokens):
+        save_dir = os.path.dirname(os.path.abspath(self.path))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=save_dir, prefix=".tmp_")
+        try:
+            os.chmod(temp_path, TOKEN_CACHE_FILE_MODE)
+            with os.fdopen(file_descriptor, "w") as file_to_write:
+                json.dump(tokens, file_to_write)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+class _FileLock(object):
+    """
+    Exclusive lock on a file held across processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file_descriptor = None
+
+    def __enter__(self):
+        self._file_descriptor = os.open(self.path, os.O_RDWR | os.O_CREAT, TOKEN_CACHE_FILE_MODE)
+        fcntl.flock(self._file_descriptor, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self._file_descriptor, fcntl.LOCK_UN)
+        os.close(self._file_descriptor)
@@ -0,0 +1,280 @@
+"""
+Columnar representation of Tidepool event data: one table per event type holding
+typed numpy arrays, so users can be stored and loaded without json.
+
+Tables and columns:
+    cbg, smbg:      time, value, units
+    food:           time, value, units
+    basal:          time, value, units, duration_hours
+    bolus:          time, value, units
+    deviceEvent:    time, from_tz, to_tz
+
+Times are int64 milliseconds since the unix epoch (UTC). Every table also has an
+event_index column with each event's position in the api response, so the original
+order across tables is kept.
+"""
+
+import os
+import shutil
+import tempfile
+import datetime as dt
+from collections import defaultdict
+
+import logging
+
+import numpy as np
+
+from data_science_tidepool_api_python.util import API_DATA_TIMESTAMP_FORMAT, PARSED_EVENT_TYPES_V1
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS_DIRNAME = "event_columns"
+
+EPOCH = dt.datetime(1970, 1, 1)
+
+# Length of an api timestamp, e.g. "2020-01-02T23:15:12.611Z"
+API_TIMESTAMP_LENGTH = 24
+
+# Events converted to arrays at a time, bounding the python lists built while reading a stream
+EVENT_COLUMNS_CHUNK_SIZE = 50000
+
+EVENT_COLUMN_DTYPES = {
+    "time": np.int64,
+    "event_index": np.int64,
+    "value": np.float64,
+    "duration_hours": np.float64,
+    "units": np.str_,
+    "from_tz": np.str_,
+    "to_tz": np.str_,
+}
+
+
+def datetime_to_epoch_ms(time):
+    """
+    Args:
+        time (dt.DateTime): naive utc datetime
+
+    Returns:
+        int: milliseconds since the epoch
+    """
+    return (time - EPOCH) // dt.timedelta(milliseconds=1)
+
+
+def epoch_ms_to_datetime(epoch_ms):
+    """
+    Args:
+        epoch_ms (int): milliseconds since the epoch
+
+    Returns:
+        dt.DateTime: naive utc datetime
+    """
+    return EPOCH + dt.timedelta(milliseconds=int(epoch_ms))
+
+
+def parse_api_timestamps(time_strs):
+    """
+    Parse api timestamps, e.g. "2020-01-02T23:15:12.611Z", to utc datetime64[ms] all at once.
+
+    Well-formed timestamps are parsed by numpy in one call. Anything else, e.g. missing
+    milliseconds or a utc offset, falls back to parsing that row on its own.
+
+    Args:
+        time_strs (list): api timestamps
+
+    Returns:
+        np.ndarray: datetime64[ms] times
+    """
+    times = np.empty(len(time_strs), dtype="datetime64[ms]")
+    if len(time_strs) == 0:
+        return times
+
+    try:
+        # One byte longer than the format so longer strings are not silently truncated
+        time_bytes = np.array(time_strs, dtype="S{}".format(API_TIMESTAMP_LENGTH + 1))
+    except (UnicodeEncodeError, TypeError):
+        time_bytes = None
+
+    is_well_formed = np.zeros(len(time_strs), dtype=bool)
+    if time_bytes is not None:
+        chars = time_bytes.view(np.uint8).reshape(len(time_strs), API_TIMESTAMP_LENGTH + 1)
+        is_well_formed = (chars[:, API_TIMESTAMP_LENGTH - 1] == ord("Z")) & (chars[:, API_TIMESTAMP_LENGTH] == 0) \
+            & (chars[:, 10] == ord("T")) & (chars[:, 19] == ord("."))
+        try:
+            # Dropping the Z leaves a naive iso timestamp numpy can parse
+            well_formed_bytes = np.ascontiguousarray(chars[is_well_formed, :API_TIMESTAMP_LENGTH - 1])
+            times[is_well_formed] = well_formed_bytes.view("S{}".format(API_TIMESTAMP_LENGTH - 1)).ravel() \
+                .astype("datetime64[ms]")
+        except ValueError:
+            is_well_formed[:] = False
+
+    malformed_indices = np.flatnonzero(~is_well_formed)
+    if len(malformed_indices):
+        logger.debug("Parsing {} malformed timestamps one at a time".format(len(malformed_indices)))
+    for index in malformed_indices:
+        times[index] = parse_api_timestamp(time_strs[index])
+
+    return times
+
+
+def parse_api_timestamp(time_str):
+    """
+    Parse one api timestamp in the api format or any other iso 8601 form.
+
+    Args:
+        time_str (str): timestamp
+
+    Returns:
+        np.datetime64: utc time in ms
+    """
+    try:
+        return np.datetime64(dt.datetime.strptime(time_str, API_DATA_TIMESTAMP_FORMAT), "ms")
+    except ValueError:
+        pass
+
+    time = dt.datetime.fromisoformat(time_str.replace("Z", "+00:00"))
+    if time.tzinfo is not None:
+        time = time.astimezone(dt.timezone.utc).replace(tzinfo=None)
+
+    return np.datetime64(time, "ms")
+
+
+def _rows_to_columns(rows):
+    """
+    Convert per event type lists of column values to typed arrays.
+
+    Args:
+        rows (dict): event type mapped to dict of column name to list
+
+    Returns:
+        dict: event type mapped to dict of column name to numpy array
+    """
+    event_columns = {}
+    for event_type, table in rows.items():
+        table["time"] = parse_api_timestamps(table["time"]).view(np.int64)
+        event_columns[event_type] = {
+            column_name: np.asarray(values, dtype=EVENT_COLUMN_DTYPES[column_name])
+            for column_name, values in table.items()
+        }
+
+    return event_columns
+
+
+def events_to_columns(data_json, skip_unknown=False, chunk_size=EVENT_COLUMNS_CHUNK_SIZE):
+    """
+    Split v1 api events into typed column arrays per event type. Events are converted to
+    arrays in chunks, so a streamed response is never held as python objects all at once.
+
+    Args:
+        data_json (iterable): events as objects, e.g. list or streaming generator
+        skip_unknown (bool): drop event types the model does not use instead of raising
+        chunk_size (int): events read before converting them to arrays
+
+    Returns:
+        dict: event type mapped to dict of column name to numpy array
+    """
+    column_chunks = defaultdict(lambda: defaultdict(list))
+    rows = defaultdict(lambda: defaultdict(list))
+    num_rows = 0
+    num_skipped = 0
+
+    for event_index, event in enumerate(data_json):
+
+        event_type = event["type"]
+        if event_type not in PARSED_EVENT_TYPES_V1:
+            if skip_unknown:
+                num_skipped += 1
+                continue
+            raise Exception("Unknown event type")
+
+        table = rows[event_type]
+
+        if event_type in ("smbg", "cbg"):
+            table["value"].append(event["value"])
+            table["units"].append(event["units"])
+
+        elif event_type == "food":
+            table["value"].append(event["nutrition"]["carbohydrate"]["net"])
+            table["units"].append(event["nutrition"]["carbohydrate"]["units"])
+
+        elif event_type == "basal":
+            table["value"].append(event["rate"])
+            table["units"].append("U/hr")
+            table["duration_hours"].append(event["duration"] / 1000.0 / 3600)
+
+        elif event_type == "bolus":
+            table["value"].append(event["normal"])
+            table["units"].append("Units")
+
+        elif event_type == "deviceEvent":
+            table["from_tz"].append(event["from"]["timeZoneName"])
+            table["to_tz"].append(event["to"]["timeZoneName"])
+
+        table["time"].append(event["time"])
+        table["event_index"].append(event_index)
+
+        num_rows += 1
+        if num_rows == chunk_size:
+            for chunk_event_type, chunk_table in _rows_to_columns(rows).items():
+                for column_name, column in chunk_table.items():
+                    column_chunks[chunk_event_type][column_name].append(column)
+            rows = defaultdict(lambda: defaultdict(list))
+            num_rows = 0
+
+    for chunk_event_type, chunk_table in _rows_to_columns(rows).items():
+        for column_name, column in chunk_table.items():
+            column_chunks[chunk_event_type][column_name].append(column)
+
+    if num_skipped:
+        logger.info("Skipped {} events of unknown type".format(num_skipped))
+
+    return {
+        event_type: {column_name: np.concatenate(chunks) for column_name, chunks in table_chunks.items()}
+        for event_type, table_chunks in column_chunks.items()
+    }
+
+
+def save_event_columns(event_columns, path_to_columns_dir):
+    """
+    Save each event type table as an uncompressed .npz file in a directory. The directory
+    is written next to the target and swapped in so readers never see a partial set of tables.
+
+    Args:
+        event_columns (dict): event type mapped to dict of column arrays
+        path_to_columns_dir (str): directory to write
+    """
+    path_to_columns_dir = os.path.abspath(path_to_columns_dir)
+    parent_dir = os.path.dirname(path_to_columns_dir)
+    temp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp_")
+
+    for event_type, table in event_columns.items():
+        np.savez(os.path.join(temp_dir, "{}.npz".format(event_type)), **table)
+
+    old_dir = None
+    if os.path.isdir(path_to_columns_dir):
+        old_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".old_")
+        os.rename(path_to_columns_dir, os.path.join(old_dir, "columns"))
+    os.rename(temp_dir, path_to_columns_dir)
+
+    if old_dir is not None:
+        shutil.rmtree(old_dir)
+
+
+def load_event_columns(path_to_columns_dir):
+    """
+    Load event type tables saved with save_event_columns.
+
+    Args:
+        path_to_columns_dir (str): directory of .npz tables
+
+    Returns:
+        dict: event type mapped to dict of column arrays
+    """
+    event_columns = {}
+    for filename in sorted(os.listdir(path_to_columns_dir)):
+        if not filename.endswith(".npz"):
+            continue
+        event_type = filename[:-len(".npz")]
+        with np.load(os.path.join(path_to_columns_dir, filename), allow_pickle=False) as table:
+            event_columns[event_type] = {column_name: table[column_name] for column_name in table.files}
+
+    return event_columns
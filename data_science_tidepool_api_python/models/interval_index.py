@@ -0,0 +1,89 @@
+"""
+Index over intervals delivered at a constant rate, e.g. basal segments, that gives the
+amount delivered in any window with a few binary searches. Intervals that cross a window
+edge are prorated by the time inside the window.
+"""
+
+import numpy as np
+
+
+def _prefix_sum(values):
+    return np.concatenate(([0.0], np.cumsum(values)))
+
+
+class IntervalIndex(object):
+    """
+    Intervals sorted both by start and by end with prefix sums of rate, rate * start and amount
+    in each order. The amount delivered before time t is the amount of intervals ended by t
+    plus rate * (t - start) summed over the intervals in progress, which are the ones started
+    minus the ones ended. Intervals may overlap.
+    """
+
+    def __init__(self, start_times, durations_hours, rates):
+        """
+        Args:
+            start_times (np.ndarray): interval start times as datetime64
+            durations_hours (np.ndarray): interval durations in hours
+            rates (np.ndarray): amount per hour, e.g. U/hr
+        """
+        start_times = np.asarray(start_times, dtype="datetime64[us]")
+        durations_hours = np.asarray(durations_hours, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64)
+
+        # Hours are relative to the first start to keep the products in the sums small
+        self.origin = start_times.min() if len(start_times) > 0 else np.datetime64(0, "us")
+        starts = (start_times - self.origin) / np.timedelta64(1, "h")
+        ends = starts + durations_hours
+
+        order_by_start = np.argsort(starts, kind="stable")
+        order_by_end = np.argsort(ends, kind="stable")
+
+        self.starts = starts[order_by_start]
+        self.ends = ends[order_by_end]
+
+        self._rate_by_start = _prefix_sum(rates[order_by_start])
+        self._rate_start_by_start = _prefix_sum((rates * starts)[order_by_start])
+        self._rate_by_end = _prefix_sum(rates[order_by_end])
+        self._rate_start_by_end = _prefix_sum((rates * starts)[order_by_end])
+        self._amount_by_end = _prefix_sum((rates * durations_hours)[order_by_end])
+
+    def _to_hours(self, times):
+        return (np.asarray(times, dtype="datetime64[us]") - self.origin) / np.timedelta64(1, "h")
+
+    def get_amount_before(self, times):
+        """
+        Get the amount delivered from the start of the intervals up to each time.
+
+        Args:
+            times (dt.DateTime or array): times
+
+        Returns:
+            np.ndarray: amount per time, a scalar for a single time
+        """
+        hours = self._to_hours(times)
+        num_started = np.searchsorted(self.starts, hours, side="right")
+        num_ended = np.searchsorted(self.ends, hours, side="right")
+
+        in_progress_rate = self._rate_by_start[num_started] - self._rate_by_end[num_ended]
+        in_progress_rate_start = self._rate_start_by_start[num_started] - self._rate_start_by_end[num_ended]
+
+        return self._amount_by_end[num_ended] + in_progress_rate * hours - in_progress_rate_start
+
+    def get_totals(self, start_times, end_times):
+        """
+        Get the amount delivered in windows, prorating intervals at the window edges.
+
+        Args:
+            start_times (dt.DateTime or array): window start times
+            end_times (dt.DateTime or array): window end times
+
+        Returns:
+            (np.ndarray, np.ndarray): amounts and number of intervals overlapping each window,
+                scalars for a single window
+        """
+        amounts = self.get_amount_before(end_times) - self.get_amount_before(start_times)
+
+        num_started = np.searchsorted(self.starts, self._to_hours(end_times), side="right")
+        num_ended = np.searchsorted(self.ends, self._to_hours(start_times), side="right")
+
+        return amounts, num_started - num_ended
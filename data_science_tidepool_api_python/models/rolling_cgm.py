@@ -0,0 +1,276 @@
+"""
+Rolling CGM metrics over a sliding time window: time in ranges, mean, CV, GMI, min, max
+and hypo/hyper episode counts. Each sample updates running sums, monotonic deques and
+episode trackers in amortized O(1), so a whole series costs one pass whether samples
+arrive one at a time (streaming) or as arrays (batch).
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+MS_PER_HOUR = 3600 * 1000
+
+DEFAULT_WINDOW_HOURS = 24
+
+# Consensus CGM ranges in mg/dL
+DEFAULT_VERY_LOW_MGDL = 54
+DEFAULT_LOW_MGDL = 70
+DEFAULT_HIGH_MGDL = 180
+DEFAULT_VERY_HIGH_MGDL = 250
+
+DEFAULT_MIN_EPISODE_MINUTES = 15
+
+# Glucose management indicator (%) from mean glucose in mg/dL
+GMI_INTERCEPT = 3.31
+GMI_SLOPE = 0.02392
+
+RANGE_NAMES = ["very_low", "low", "in_range", "high", "very_high"]
+
+METRIC_NAMES = [
+    "num_samples", "mean", "std", "cv", "gmi", "min", "max",
+    "time_very_low", "time_below_range", "time_in_range", "time_above_range", "time_very_high",
+    "num_hypo_episodes", "num_hyper_episodes",
+]
+
+
+def get_window_metrics(num_samples, shifted_sum, shifted_sum_sq, shift, range_counts, min_value, max_value,
+                       num_hypo_episodes, num_hyper_episodes):
+    """
+    Compute window metrics from running totals. Works on scalars for one window or arrays for many,
+    each with at least one sample.
+
+    Args:
+        num_samples (int or np.ndarray): samples in the window
+        shifted_sum (float or np.ndarray): sum of values minus shift
+        shifted_sum_sq (float or np.ndarray): sum of squared values minus shift
+        shift (float): constant subtracted from values to keep the sums small
+        range_counts (list): sample counts per range in RANGE_NAMES order
+        min_value (float or np.ndarray): window minimum
+        max_value (float or np.ndarray): window maximum
+        num_hypo_episodes (int or np.ndarray): hypo episodes started in the window
+        num_hyper_episodes (int or np.ndarray): hyper episodes started in the window
+
+    Returns:
+        dict: metric name mapped to value, fractions of samples for time in ranges and std with ddof=0
+    """
+    # Windows always hold the latest sample, so num_samples is never zero
+    shifted_mean = shifted_sum / num_samples
+    mean = shift + shifted_mean
+    std = np.sqrt(np.maximum(shifted_sum_sq / num_samples - shifted_mean ** 2, 0.0))
+
+    very_low, low, in_range, high, very_high = [count / num_samples for count in range_counts]
+
+    return {
+        "num_samples": num_samples,
+        "mean": mean,
+        "std": std,
+        "cv": std / mean,
+        "gmi": GMI_INTERCEPT + GMI_SLOPE * mean,
+        "min": min_value,
+        "max": max_value,
+        "time_very_low": very_low,
+        "time_below_range": very_low + low,
+        "time_in_range": in_range,
+        "time_above_range": high + very_high,
+        "time_very_high": very_high,
+        "num_hypo_episodes": num_hypo_episodes,
+        "num_hyper_episodes": num_hyper_episodes,
+    }
+
+
+class EpisodeTracker(object):
+    """
+    Counts episodes of consecutive samples meeting a condition for at least a minimum
+    duration, keeping the start times of episodes still in the window.
+    """
+
+    __slots__ = ("min_duration_ms", "run_start_ms", "is_run_counted", "episode_starts_ms")
+
+    def __init__(self, min_duration_ms):
+        self.min_duration_ms = min_duration_ms
+        self.run_start_ms = None
+        self.is_run_counted = False
+        self.episode_starts_ms = deque()
+
+    def update(self, time_ms, is_in_episode, window_start_ms):
+        """
+        Args:
+            time_ms (int): sample time
+            is_in_episode (bool): the sample meets the episode condition
+            window_start_ms (int): episodes starting at or before this are dropped
+        """
+        if is_in_episode:
+            if self.run_start_ms is None:
+                self.run_start_ms = time_ms
+                self.is_run_counted = False
+            if not self.is_run_counted and time_ms - self.run_start_ms >= self.min_duration_ms:
+                self.episode_starts_ms.append(self.run_start_ms)
+                self.is_run_counted = True
+        else:
+            self.run_start_ms = None
+
+        while self.episode_starts_ms and self.episode_starts_ms[0] <= window_start_ms:
+            self.episode_starts_ms.popleft()
+
+    def get_count(self):
+        return len(self.episode_starts_ms)
+
+
+class RollingCGMMetrics(object):
+    """
+    Metrics of the CGM samples in the window (time - window, time] ending at the latest sample.
+    Samples must arrive in time order. Episodes are runs of samples below low (hypo) or above
+    high (hyper) lasting at least min_episode_minutes, counted while their start is in the window.
+    """
+
+    def __init__(self, window_hours=DEFAULT_WINDOW_HOURS, very_low=DEFAULT_VERY_LOW_MGDL, low=DEFAULT_LOW_MGDL,
+                 high=DEFAULT_HIGH_MGDL, very_high=DEFAULT_VERY_HIGH_MGDL,
+                 min_episode_minutes=DEFAULT_MIN_EPISODE_MINUTES):
+        """
+        Args:
+            window_hours (float): window length
+            very_low (float): values below this are very low, mg/dL
+            low (float): values below this are below range, mg/dL
+            high (float): values above this are above range, mg/dL
+            very_high (float): values above this are very high, mg/dL
+            min_episode_minutes (float): minimum duration of a hypo or hyper episode
+        """
+        if window_hours <= 0:
+            raise Exception("Window must be positive, got {} hours.".format(window_hours))
+
+        self.window_ms = int(window_hours * MS_PER_HOUR)
+        self.very_low = very_low
+        self.low = low
+        self.high = high
+        self.very_high = very_high
+
+        # (time ms, value, range index) in the window, and the ones that can still be the min or max
+        self._samples = deque()
+        self._min_samples = deque()
+        self._max_samples = deque()
+
+        self._shift = None
+        self._shifted_sum = 0.0
+        self._shifted_sum_sq = 0.0
+        self._range_counts = [0] * len(RANGE_NAMES)
+        self._last_time_ms = None
+
+        min_episode_ms = min_episode_minutes * 60 * 1000
+        self._hypo_episodes = EpisodeTracker(min_episode_ms)
+        self._hyper_episodes = EpisodeTracker(min_episode_ms)
+
+    def _get_range_index(self, value):
+        if value < self.low:
+            return 0 if value < self.very_low else 1
+        if value > self.high:
+            return 4 if value > self.very_high else 3
+        return 2
+
+    def _update(self, time_ms, value):
+        """
+        Add a sample and drop the ones that left the window.
+
+        Args:
+            time_ms (int): sample time in ms since the epoch
+            value (float): glucose in mg/dL
+        """
+        if self._last_time_ms is not None and time_ms < self._last_time_ms:
+            raise Exception("CGM samples must be in time order.")
+        self._last_time_ms = time_ms
+
+        if self._shift is None:
+            self._shift = value
+
+        range_index = self._get_range_index(value)
+        sample = (time_ms, value, range_index)
+
+        self._samples.append(sample)
+        shifted_value = value - self._shift
+        self._shifted_sum += shifted_value
+        self._shifted_sum_sq += shifted_value * shifted_value
+        self._range_counts[range_index] += 1
+
+        while self._min_samples and self._min_samples[-1][1] >= value:
+            self._min_samples.pop()
+        self._min_samples.append(sample)
+        while self._max_samples and self._max_samples[-1][1] <= value:
+            self._max_samples.pop()
+        self._max_samples.append(sample)
+
+        window_start_ms = time_ms - self.window_ms
+        while self._samples[0][0] <= window_start_ms:
+            old_time_ms, old_value, old_range_index = self._samples.popleft()
+            shifted_value = old_value - self._shift
+            self._shifted_sum -= shifted_value
+            self._shifted_sum_sq -= shifted_value * shifted_value
+            self._range_counts[old_range_index] -= 1
+        while self._min_samples[0][0] <= window_start_ms:
+            self._min_samples.popleft()
+        while self._max_samples[0][0] <= window_start_ms:
+            self._max_samples.popleft()
+
+        self._hypo_episodes.update(time_ms, value < self.low, window_start_ms)
+        self._hyper_episodes.update(time_ms, value > self.high, window_start_ms)
+
+    def update(self, time, value):
+        """
+        Add a sample, e.g. as it arrives from a device, and get the metrics of the window ending at it.
+
+        Args:
+            time (dt.DateTime or np.datetime64): sample time
+            value (float): glucose in mg/dL
+
+        Returns:
+            dict: metric name mapped to value
+        """
+        self._update(int(np.datetime64(time, "ms").astype(np.int64)), float(value))
+        return self.get_metrics()
+
+    def get_metrics(self):
+        """
+        Returns:
+            dict: metric name mapped to value for the current window
+        """
+        if not self._samples:
+            return {metric_name: math.nan for metric_name in METRIC_NAMES}
+
+        metrics = get_window_metrics(len(self._samples), self._shifted_sum, self._shifted_sum_sq, self._shift,
+                                     self._range_counts, self._min_samples[0][1], self._max_samples[0][1],
+                                     self._hypo_episodes.get_count(), self._hyper_episodes.get_count())
+
+        return {metric_name: value.item() if isinstance(value, np.generic) else value
+                for metric_name, value in metrics.items()}
+
+    def compute(self, times, values):
+        """
+        Add a series of samples and get the metrics of the window ending at each one. Continues
+        from any samples already added, so batches and single updates can be mixed.
+
+        Args:
+            times (np.ndarray): sample times as datetime64
+            values (np.ndarray): glucose in mg/dL
+
+        Returns:
+            dict: metric name mapped to array with a value per sample
+        """
+        times_ms = np.asarray(times, dtype="datetime64[ms]").astype(np.int64).tolist()
+        values = np.asarray(values, dtype=np.float64).tolist()
+
+        rows = []
+        for time_ms, value in zip(times_ms, values):
+            self._update(time_ms, value)
+            rows.append((len(self._samples), self._shifted_sum, self._shifted_sum_sq, *self._range_counts,
+                         self._min_samples[0][1], self._max_samples[0][1],
+                         self._hypo_episodes.get_count(), self._hyper_episodes.get_count()))
+
+        columns = np.array(rows, dtype=np.float64).reshape(len(rows), 3 + len(RANGE_NAMES) + 4).T
+        num_samples, shifted_sum, shifted_sum_sq = columns[:3]
+        range_counts = columns[3:3 + len(RANGE_NAMES)]
+        min_value, max_value, num_hypo_episodes, num_hyper_episodes = columns[3 + len(RANGE_NAMES):]
+
+        shift = self._shift if self._shift is not None else 0.0
+        return get_window_metrics(num_samples.astype(np.int64), shifted_sum, shifted_sum_sq, shift,
+                                  list(range_counts), min_value, max_value,
+                                  num_hypo_episodes.astype(np.int64), num_hyper_episodes.astype(np.int64))
@@ -0,0 +1,293 @@
+"""
+Timeline of events sorted by time and stored as numpy arrays. Range queries are
+binary searches over the times, and a read-only mapping view keeps the
+time -> event object interface of the OrderedDict timelines it replaces.
+"""
+
+import numpy as np
+
+from data_science_tidepool_api_python.models.interval_index import IntervalIndex
+
+
+def to_datetime64(time, round_up=False):
+    """
+    Convert datetimes to millisecond datetime64, the resolution of timeline times.
+
+    Args:
+        time (dt.DateTime or np.datetime64, or an array of them): time
+        round_up (bool): round sub-millisecond times up instead of down
+
+    Returns:
+        np.datetime64 or np.ndarray: time in ms, an array if an array was given
+    """
+    time_us = np.asarray(time, dtype="datetime64[us]")
+    time_ms = time_us.astype("datetime64[ms]")
+    if round_up:
+        time_ms = np.where(time_ms < time_us, time_ms + np.timedelta64(1, "ms"), time_ms)
+    return time_ms[()]
+
+
+class TidepoolTimeline(object):
+    """
+    Events sorted by time with one event per time. Each column holds one attribute per event
+    and event objects are only built when the mapping view is used.
+    """
+
+    def __init__(self, times, columns, event_factory, presorted=False):
+        """
+        Args:
+            times (np.ndarray): event times as datetime64[ms] or int64 ms since the epoch
+            columns (dict): column name mapped to array of the same length as times, in the
+                order of event_factory arguments
+            event_factory (callable): makes the event object for a row from its column values
+            presorted (bool): times are already strictly increasing, e.g. from another timeline.
+                Otherwise events are sorted and for duplicate times the last one is kept, as
+                assigning to a dict would.
+        """
+        times = np.asarray(times)
+        if times.dtype == np.int64:
+            times = times.view("datetime64[ms]")
+        elif times.dtype != np.dtype("datetime64[ms]"):
+            times = times.astype("datetime64[ms]")
+
+        columns = {column_name: np.asarray(column) for column_name, column in columns.items()}
+
+        if not presorted and len(times) > 0:
+            order = np.argsort(times, kind="stable")
+            sorted_times = times[order]
+            is_last_of_time = np.append(sorted_times[1:] != sorted_times[:-1], True)
+            keep_indices = order[is_last_of_time]
+            times = sorted_times[is_last_of_time]
+            columns = {column_name: column[keep_indices] for column_name, column in columns.items()}
+
+        self.times = times
+        self.columns = columns
+        self.event_factory = event_factory
+
+        self._events = None
+        self._prefix_sums = {}
+        self._interval_indexes = {}
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Make a timeline from (time, event) pairs, e.g. an OrderedDict timeline.
+
+        Args:
+            items (iterable): (dt.DateTime, event object) pairs
+
+        Returns:
+            TidepoolTimeline: timeline holding the given objects
+        """
+        items = list(items)
+        times = np.array([time for time, _ in items], dtype="datetime64[ms]")
+        events = np.empty(len(items), dtype=object)
+        events[:] = [event for _, event in items]
+
+        columns = {"event": events}
+        if all(hasattr(event, "get_value") for event in events):
+            columns["value"] = np.array([event.get_value() for event in events], dtype=np.float64)
+        if all(hasattr(event, "get_duration_hours") for event in events):
+            columns["duration_hours"] = np.array([event.get_duration_hours() for event in events], dtype=np.float64)
+
+        return cls(times, columns, lambda event, *_: event)
+
+    def get_index_range(self, start_time=None, end_time=None):
+        """
+        Get the slice of events between two times, inclusive.
+
+        Args:
+            start_time (dt.DateTime): Optional start time
+            end_time (dt.DateTime): Optional end time
+
+        Returns:
+            (int, int): start and stop indices
+        """
+        start_index = 0
+        end_index = len(self.times)
+        if start_time is not None:
+            start_index = int(np.searchsorted(self.times, to_datetime64(start_time, round_up=True), side="left"))
+        if end_time is not None:
+            end_index = int(np.searchsorted(self.times, to_datetime64(end_time), side="right"))
+
+        return start_index, max(start_index, end_index)
+
+    def get_index_ranges(self, start_times, end_times):
+        """
+        Get the slices of events in many windows at once, see get_index_range.
+
+        Args:
+            start_times (np.ndarray or list): window start times, inclusive
+            end_times (np.ndarray or list): window end times, inclusive
+
+        Returns:
+            (np.ndarray, np.ndarray): start and stop indices per window
+        """
+        start_indices = np.searchsorted(self.times, to_datetime64(start_times, round_up=True), side="left")
+        end_indices = np.searchsorted(self.times, to_datetime64(end_times), side="right")
+
+        return start_indices, np.maximum(start_indices, end_indices)
+
+    def get_prefix_sum(self, *column_names):
+        """
+        Get the cumulative sum of a column, or of the product of several columns, e.g. rate and
+        duration. Computed on first use and kept, since timeline columns do not change.
+
+        Args:
+            *column_names (str): columns multiplied per event
+
+        Returns:
+            np.ndarray: float64 sums of the first i events for i in 0..len(self)
+        """
+        if column_names not in self._prefix_sums:
+            values = np.ones(len(self.times))
+            for column_name in column_names:
+                values = values * self.columns[column_name]
+            self._prefix_sums[column_names] = np.concatenate(([0.0], np.cumsum(values)))
+
+        return self._prefix_sums[column_names]
+
+    def get_totals(self, column_names, start_times, end_times):
+        """
+        Sum a column in windows with two binary searches per window.
+
+        Args:
+            column_names (tuple): columns multiplied per event, see get_prefix_sum
+            start_times (dt.DateTime or array): window start times, inclusive
+            end_times (dt.DateTime or array): window end times, inclusive
+
+        Returns:
+            (np.ndarray, np.ndarray): totals and number of events per window, scalars for a single window
+        """
+        start_indices, end_indices = self.get_index_ranges(start_times, end_times)
+        prefix_sum = self.get_prefix_sum(*column_names)
+
+        return prefix_sum[end_indices] - prefix_sum[start_indices], end_indices - start_indices
+
+    def get_interval_index(self, rate_column_name="value", duration_column_name="duration_hours"):
+        """
+        Get an index of the events as intervals delivered at a rate, e.g. basal segments.
+        Built on first use and kept, since timeline columns do not change.
+
+        Args:
+            rate_column_name (str): column of amount per hour
+            duration_column_name (str): column of durations in hours
+
+        Returns:
+            IntervalIndex: index answering prorated window totals
+        """
+        key = (rate_column_name, duration_column_name)
+        if key not in self._interval_indexes:
+            self._interval_indexes[key] = IntervalIndex(self.times, self.columns[duration_column_name],
+                                                        self.columns[rate_column_name])
+
+        return self._interval_indexes[key]
+
+    def get_day_bins(self, start_time, num_days):
+        """
+        Assign events to consecutive days, e.g. to reduce them per day with np.bincount.
+
+        Args:
+            start_time (dt.DateTime): start of the first day
+            num_days (int): number of days
+
+        Returns:
+            (np.ndarray, slice): day index of each event within the days, and the slice of
+                those events in the timeline
+        """
+        start_time = to_datetime64(start_time)
+        end_time = start_time + np.timedelta64(num_days, "D")
+
+        start_index = int(np.searchsorted(self.times, start_time, side="left"))
+        end_index = max(start_index, int(np.searchsorted(self.times, end_time, side="left")))
+        day_indices = (self.times[start_index:end_index] - start_time) // np.timedelta64(1, "D")
+
+        return day_indices.astype(np.intp), slice(start_index, end_index)
+
+    def get_times(self, start_time=None, end_time=None):
+        """
+        Args:
+            start_time (dt.DateTime): Optional start time, inclusive
+            end_time (dt.DateTime): Optional end time, inclusive
+
+        Returns:
+            np.ndarray: datetime64[ms] times in the range
+        """
+        start_index, end_index = self.get_index_range(start_time, end_time)
+        return self.times[start_index:end_index]
+
+    def get_column(self, column_name, start_time=None, end_time=None):
+        """
+        Args:
+            column_name (str): e.g. "value"
+            start_time (dt.DateTime): Optional start time, inclusive
+            end_time (dt.DateTime): Optional end time, inclusive
+
+        Returns:
+            np.ndarray: column values in the range
+        """
+        start_index, end_index = self.get_index_range(start_time, end_time)
+        return self.columns[column_name][start_index:end_index]
+
+    def get_values(self, start_time=None, end_time=None):
+        """
+        Args:
+            start_time (dt.DateTime): Optional start time, inclusive
+            end_time (dt.DateTime): Optional end time, inclusive
+
+        Returns:
+            np.ndarray: event values in the range
+        """
+        return self.get_column("value", start_time, end_time)
+
+    def _get_events(self):
+        """
+        Build the event objects once for the mapping view.
+        """
+        if self._events is None:
+            column_lists = [column.tolist() for column in self.columns.values()]
+            self._events = [self.event_factory(*row) for row in zip(*column_lists)]
+        return self._events
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        return iter(self.times.tolist())
+
+    def __contains__(self, time):
+        index = int(np.searchsorted(self.times, to_datetime64(time)))
+        return index < len(self.times) and self.times[index] == np.datetime64(time, "us")
+
+    def __getitem__(self, time):
+        index = int(np.searchsorted(self.times, to_datetime64(time)))
+        if index == len(self.times) or self.times[index] != np.datetime64(time, "us"):
+            raise KeyError(time)
+        return self._get_events()[index]
+
+    def get(self, time, default=None):
+        try:
+            return self[time]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """
+        Returns:
+            list: event times as dt.DateTime in time order
+        """
+        return self.times.tolist()
+
+    def values(self):
+        """
+        Returns:
+            list: event objects in time order
+        """
+        return list(self._get_events())
+
+    def items(self):
+        """
+        Returns:
+            list: (dt.DateTime, event object) pairs in time order
+        """
+        return list(zip(self.times.tolist(), self._get_events()))
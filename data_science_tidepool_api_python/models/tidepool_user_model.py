@@ -1,27 +1,49 @@
+import sys
 from collections import OrderedDict, defaultdict
 import datetime as dt
 import json
-from operator import itemgetter
+import functools
 
 import numpy as np
 from scipy.stats import gmean, gstd
 
 import logging
 
-from data_science_tidepool_api_python.util import API_DATA_TIMESTAMP_FORMAT, API_NOTE_TIMESTAMP_FORMAT
+from data_science_tidepool_api_python.util import API_NOTE_TIMESTAMP_FORMAT
+from data_science_tidepool_api_python.models.event_columns import EVENT_COLUMN_DTYPES, parse_api_timestamps
+from data_science_tidepool_api_python.models.tidepool_timeline import TidepoolTimeline, to_datetime64
+from data_science_tidepool_api_python.models.rolling_cgm import RollingCGMMetrics, DEFAULT_WINDOW_HOURS
 from data_science_tidepool_api_python.visualization.visualize_user_data import (
     plot_raw_data, plot_daily_stats
 )
 
 logger = logging.getLogger(__name__)
 
+MGDL_PER_MMOLL = 18.0182
+
+
+def intern_str(value):
+    """
+    Intern a string so repeated values share one object. Other values, e.g. None for
+    missing units, are returned as they are.
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
 
 class TidepoolMeasurement(object):
+    """
+    A value with units. Measurements are slotted and units are interned since a user has
+    hundreds of thousands of them, so every subclass declares its own __slots__.
+    """
+
+    __slots__ = ("value", "units")
 
     def __init__(self, value, units):
 
         self.value = value
-        self.units = units
+        self.units = intern_str(units)
 
     def get_value(self):
         return self.value
@@ -32,17 +54,20 @@ class TidepoolMeasurement(object):
 
 class TidepoolGlucoseMeasurement(TidepoolMeasurement):
 
+    __slots__ = ()
+
     def __init__(self, value, units):
         super().__init__(value, units)
 
-        self.value = value
         if units == "mmol/L":
-            self.value *= 18.0182
+            self.value *= MGDL_PER_MMOLL
             self.units = "mg/dL"
 
 
 class TidepoolManualGlucoseMeasurement(TidepoolGlucoseMeasurement):
 
+    __slots__ = ()
+
     def __init__(self, value, units):
 
         super().__init__(value, units)
@@ -50,6 +75,8 @@ class TidepoolManualGlucoseMeasurement(TidepoolGlucoseMeasurement):
 
 class TidepoolCGMGlucoseMeasurement(TidepoolGlucoseMeasurement):
 
+    __slots__ = ()
+
     def __init__(self, value, units):
 
         super().__init__(value, units)
@@ -57,20 +84,19 @@ class TidepoolCGMGlucoseMeasurement(TidepoolGlucoseMeasurement):
 
 class TidepoolFood(TidepoolMeasurement):
 
+    __slots__ = ()
+
     def __init__(self, value, units):
         super().__init__(value, units)
 
-        self.value = value
-        self.units = units
-
 
 class TidepoolBasal(TidepoolMeasurement):
 
+    __slots__ = ("duration_hours",)
+
     def __init__(self, value, units, duration_hours):
         super().__init__(value, units)
 
-        self.value = value
-        self.units = units
         self.duration_hours = duration_hours
 
     def get_duration_hours(self):
@@ -79,22 +105,25 @@ class TidepoolBasal(TidepoolMeasurement):
 
 class TidepoolBolus(TidepoolMeasurement):
 
+    __slots__ = ()
+
     def __init__(self, value, units):
         super().__init__(value, units)
 
-        self.value = value
-        self.units = units
 
+class TidepoolTimeChange(object):
 
-class TidepoolTimeChange():
+    __slots__ = ("from_tz", "to_tz")
 
     def __init__(self, from_tz, to_tz):
 
-        self.from_tz = from_tz
-        self.to_tz = to_tz
+        self.from_tz = intern_str(from_tz)
+        self.to_tz = intern_str(to_tz)
+
 
+class TidepoolNote(object):
 
-class TidepoolNote():
+    __slots__ = ("note_time", "created_time", "message")
 
     def __init__(self, note_time, created_time, message):
 
@@ -109,11 +138,114 @@ class TidepoolNote():
         raise NotImplementedError
 
 
+# Timeline each v1 event type is parsed into
+EVENT_TYPE_TIMELINES_V1 = {
+    "smbg": "glucose_timeline",
+    "cbg": "glucose_timeline",
+    "food": "food_timeline",
+    "basal": "basal_timeline",
+    "bolus": "bolus_timeline",
+    "deviceEvent": "time_change_timeline",
+}
+
+
+def make_glucose_measurement(value, units, is_cgm):
+    """
+    Event factory for the glucose timeline.
+    """
+    if is_cgm:
+        return TidepoolCGMGlucoseMeasurement(value, units)
+    return TidepoolManualGlucoseMeasurement(value, units)
+
+
+# Columns of each timeline in the order its event factory takes them, and the factory
+TIMELINE_COLUMNS = {
+    "glucose_timeline": (["value", "units", "is_cgm"], make_glucose_measurement),
+    "food_timeline": (["value", "units"], TidepoolFood),
+    "basal_timeline": (["value", "units", "duration_hours"], TidepoolBasal),
+    "bolus_timeline": (["value", "units"], TidepoolBolus),
+    "time_change_timeline": (["from_tz", "to_tz"], TidepoolTimeChange),
+}
+
+TIMELINE_COLUMN_DTYPES = dict(EVENT_COLUMN_DTYPES, is_cgm=np.bool_)
+
+
+def make_timeline(timeline_name, times, columns, presorted=False):
+    """
+    Make one of the user timelines from column data.
+
+    Args:
+        timeline_name (str): e.g. "glucose_timeline"
+        times (np.ndarray or list): event times as datetime64[ms], int64 ms or datetimes
+        columns (dict): column name mapped to values
+        presorted (bool): times are strictly increasing
+
+    Returns:
+        TidepoolTimeline: timeline
+    """
+    column_names, event_factory = TIMELINE_COLUMNS[timeline_name]
+    columns = {
+        column_name: np.asarray(columns[column_name], dtype=TIMELINE_COLUMN_DTYPES[column_name])
+        for column_name in column_names
+    }
+    times = np.asarray(times, dtype="datetime64[ms]") if isinstance(times, list) else times
+
+    return TidepoolTimeline(times, columns, event_factory, presorted=presorted)
+
+
+def make_glucose_timeline(times, values, units, is_cgm):
+    """
+    Make the glucose timeline, converting mmol/L values to mg/dL like TidepoolGlucoseMeasurement.
+
+    Returns:
+        TidepoolTimeline: glucose timeline
+    """
+    values = np.array(values, dtype=np.float64)
+    units = np.array(units, dtype=np.str_)
+    is_mmol = units == "mmol/L"
+    values[is_mmol] *= MGDL_PER_MMOLL
+    units[is_mmol] = "mg/dL"
+
+    return make_timeline("glucose_timeline", times, {"value": values, "units": units, "is_cgm": is_cgm})
+
+
+def lazy_timeline(timeline_name):
+    """
+    Property for a timeline that is parsed on first access. Assigned mappings of time to
+    event object, e.g. OrderedDict, are converted to a TidepoolTimeline.
+
+    Args:
+        timeline_name (str): name of the timeline
+
+    Returns:
+        property: timeline property
+    """
+    def get_timeline(self):
+        return self.get_timeline(timeline_name)
+
+    def set_timeline(self, timeline):
+        if not isinstance(timeline, TidepoolTimeline):
+            timeline = TidepoolTimeline.from_items(timeline.items())
+        self._timelines[timeline_name] = timeline
+
+    return property(get_timeline, set_timeline)
+
+
 class TidepoolUser(object):
     """
     Class representing a Tidepool user from their data.
+
+    Events are split by timeline when the user is created, but each timeline is only
+    parsed the first time it is used. Timelines are TidepoolTimeline arrays sorted by
+    time that also behave like read-only dicts of time to event object.
     """
 
+    glucose_timeline = lazy_timeline("glucose_timeline")
+    food_timeline = lazy_timeline("food_timeline")
+    basal_timeline = lazy_timeline("basal_timeline")
+    bolus_timeline = lazy_timeline("bolus_timeline")
+    time_change_timeline = lazy_timeline("time_change_timeline")
+
     def __init__(self, data_json, notes_json=None, api_version="v1"):
         """
         Args:
@@ -132,12 +264,13 @@ class TidepoolUser(object):
             "v1": self.parse_notes_json_v1
         }
 
-        self.basal_timeline = OrderedDict()
-        self.bolus_timeline = OrderedDict()
-        self.food_timeline = OrderedDict()
-        self.glucose_timeline = OrderedDict()
+        # Parsed timelines and functions that parse the ones not yet used
+        self._timelines = {}
+        self._timeline_parsers = {}
 
-        self.time_change_timeline = OrderedDict()
+        # detect_circadian_hr results and the food timeline they were computed from
+        self._circadian_hr_cache = {}
+        self._circadian_hr_food_timeline = None
 
         self.data_parser_map[api_version]()
 
@@ -145,53 +278,233 @@ class TidepoolUser(object):
         if notes_json is not None:
             self.notes_parser_map[api_version]()
 
+    def get_timeline(self, timeline_name):
+        """
+        Get a timeline, parsing it if this is the first use.
+
+        Args:
+            timeline_name (str): e.g. "glucose_timeline"
+
+        Returns:
+            TidepoolTimeline: timeline
+        """
+        timeline = self._timelines.get(timeline_name)
+        if timeline is None:
+            timeline_parser = self._timeline_parsers.pop(timeline_name, None)
+            if timeline_parser is None:
+                column_names, _ = TIMELINE_COLUMNS[timeline_name]
+                timeline = make_timeline(timeline_name, [], {column_name: [] for column_name in column_names})
+            else:
+                timeline = timeline_parser()
+            self._timelines[timeline_name] = timeline
+
+        return timeline
+
+    def is_timeline_parsed(self, timeline_name):
+        """
+        Args:
+            timeline_name (str): e.g. "glucose_timeline"
+
+        Returns:
+            bool: True if the timeline has been parsed
+        """
+        return timeline_name in self._timelines
+
     def parse_data_json_v1(self):
         """
-        Parse the json list into different event types
+        Split the json list by timeline in one pass. Each timeline is parsed on first use.
+        """
+        timeline_events = defaultdict(list)
+        for event in self.data_json:
+            timeline_name = EVENT_TYPE_TIMELINES_V1.get(event["type"])
+            if timeline_name is None:
+                raise Exception("Unknown event type")
+            timeline_events[timeline_name].append(event)
+
+        timeline_event_parsers = {
+            "glucose_timeline": self.parse_glucose_events_v1,
+            "food_timeline": self.parse_food_events_v1,
+            "basal_timeline": self.parse_basal_events_v1,
+            "bolus_timeline": self.parse_bolus_events_v1,
+            "time_change_timeline": self.parse_time_change_events_v1,
+        }
+        for timeline_name, events in timeline_events.items():
+            self._timeline_parsers[timeline_name] = functools.partial(timeline_event_parsers[timeline_name], events)
+
+    @staticmethod
+    def parse_event_times_v1(events):
+        """
+        Args:
+            events (list): api events
+
+        Returns:
+            np.ndarray: event times as datetime64[ms]
         """
         # time example: "2020-01-02T23:15:12.611Z"
+        return parse_api_timestamps([event["time"] for event in events])
 
-        for event in self.data_json:
+    @staticmethod
+    def parse_glucose_events_v1(events):
+        """
+        Args:
+            events (list): smbg and cbg events in api order
 
-            time_str = event["time"]
-            time = dt.datetime.strptime(time_str, API_DATA_TIMESTAMP_FORMAT)
+        Returns:
+            TidepoolTimeline: glucose timeline
+        """
+        return make_glucose_timeline(TidepoolUser.parse_event_times_v1(events),
+                                     values=[event["value"] for event in events],
+                                     units=[event["units"] for event in events],
+                                     is_cgm=[event["type"] == "cbg" for event in events])
+
+    @staticmethod
+    def parse_food_events_v1(events):
+        """
+        Args:
+            events (list): food events
+
+        Returns:
+            TidepoolTimeline: food timeline
+        """
+        return make_timeline("food_timeline", TidepoolUser.parse_event_times_v1(events), {
+            "value": [event["nutrition"]["carbohydrate"]["net"] for event in events],
+            "units": [event["nutrition"]["carbohydrate"]["units"] for event in events],
+        })
+
+    @staticmethod
+    def parse_basal_events_v1(events):
+        """
+        Args:
+            events (list): basal events
+
+        Returns:
+            TidepoolTimeline: basal timeline
+        """
+        return make_timeline("basal_timeline", TidepoolUser.parse_event_times_v1(events), {
+            "value": [event["rate"] for event in events],
+            "units": ["U/hr"] * len(events),
+            "duration_hours": [event["duration"] / 1000.0 / 3600 for event in events],
+        })
+
+    @staticmethod
+    def parse_bolus_events_v1(events):
+        """
+        Args:
+            events (list): bolus events
 
-            if event["type"] == "smbg":
+        Returns:
+            TidepoolTimeline: bolus timeline
+        """
+        return make_timeline("bolus_timeline", TidepoolUser.parse_event_times_v1(events), {
+            "value": [event["normal"] for event in events],
+            "units": ["Units"] * len(events),
+        })
+
+    @staticmethod
+    def parse_time_change_events_v1(events):
+        """
+        Args:
+            events (list): deviceEvent events
 
-                smbg = TidepoolManualGlucoseMeasurement(event["value"], event["units"])
-                self.glucose_timeline[time] = smbg
+        Returns:
+            TidepoolTimeline: time change timeline
+        """
+        return make_timeline("time_change_timeline", TidepoolUser.parse_event_times_v1(events), {
+            "from_tz": [event["from"]["timeZoneName"] for event in events],
+            "to_tz": [event["to"]["timeZoneName"] for event in events],
+        })
 
-            elif event["type"] == "cbg":
+    @classmethod
+    def from_event_columns(cls, event_columns, notes_json=None, api_version="v1"):
+        """
+        Create a user from columnar event tables instead of event json.
 
-                cbg = TidepoolCGMGlucoseMeasurement(event["value"], event["units"])
-                self.glucose_timeline[time] = cbg
+        Args:
+            event_columns (dict): event type mapped to dict of column arrays, see event_columns.py
+            notes_json (dict): Optional notes in Tidepool API format
+            api_version (str): parser version to user
 
-            elif event["type"] == "food":
+        Returns:
+            TidepoolUser: user
+        """
+        user = cls([], notes_json=notes_json, api_version=api_version)
+        user.parse_event_columns_v1(event_columns)
+        return user
 
-                value = event["nutrition"]["carbohydrate"]["net"]
-                units = event["nutrition"]["carbohydrate"]["units"]
-                food = TidepoolFood(value, units)
-                self.food_timeline[time] = food
+    def parse_event_columns_v1(self, event_columns):
+        """
+        Set up parsing of columnar event tables into the different event timelines on first use.
 
-            elif event["type"] == "basal":
+        Args:
+            event_columns (dict): event type mapped to dict of column arrays
+        """
+        glucose_tables = [(event_columns[event_type], event_type == "cbg") for event_type in ["smbg", "cbg"]
+                          if event_type in event_columns]
+        if glucose_tables:
+            self._timeline_parsers["glucose_timeline"] = functools.partial(self.parse_glucose_columns_v1,
+                                                                           glucose_tables)
+
+        for timeline_name, event_type in [("food_timeline", "food"), ("basal_timeline", "basal"),
+                                          ("bolus_timeline", "bolus"), ("time_change_timeline", "deviceEvent")]:
+            if event_type in event_columns:
+                self._timeline_parsers[timeline_name] = functools.partial(
+                    make_timeline, timeline_name, event_columns[event_type]["time"], event_columns[event_type])
+
+    @staticmethod
+    def parse_glucose_columns_v1(glucose_tables):
+        """
+        Args:
+            glucose_tables (list): (column table, is cgm) pairs for the smbg and cbg tables
 
-                duration_ms = event["duration"]
-                duration_hours = duration_ms / 1000.0 / 3600
-                basal = TidepoolBasal(event["rate"], "U/hr", duration_hours)
-                self.basal_timeline[time] = basal
+        Returns:
+            TidepoolTimeline: glucose timeline
+        """
+        times = np.concatenate([table["time"] for table, _ in glucose_tables])
+        values = np.concatenate([table["value"] for table, _ in glucose_tables])
+        units = np.concatenate([table["units"] for table, _ in glucose_tables])
+        is_cgm = np.concatenate([np.full(len(table["time"]), is_cgm) for table, is_cgm in glucose_tables])
 
-            elif event["type"] == "bolus":
+        # Back in api order, smbg and cbg sharing a timestamp keep the last one as parsing json does.
+        # Tables saved without event_index keep the cbg.
+        if all("event_index" in table for table, _ in glucose_tables):
+            order = np.argsort(np.concatenate([table["event_index"] for table, _ in glucose_tables]), kind="stable")
+            times, values, units, is_cgm = times[order], values[order], units[order], is_cgm[order]
 
-                bolus = TidepoolBolus(event["normal"], "Units")
-                self.bolus_timeline[time] = bolus
+        return make_glucose_timeline(times, values=values, units=units, is_cgm=is_cgm)
 
-            elif event["type"] == "deviceEvent":
+    def get_timeline_arrays(self):
+        """
+        Get the event timelines as column arrays, e.g. for caching. Parses any timelines not yet used.
 
-                time_change = TidepoolTimeChange(event["from"]["timeZoneName"], event["to"]["timeZoneName"])
-                self.time_change_timeline[time] = time_change
+        Returns:
+            dict: timeline name mapped to dict of column name to numpy array, with times as int64 ms
+        """
+        timeline_arrays = {}
+        for timeline_name in TIMELINE_COLUMNS:
+            timeline = self.get_timeline(timeline_name)
+            timeline_arrays[timeline_name] = dict(time=timeline.times.view(np.int64), **timeline.columns)
 
-            else:
-                raise Exception("Unknown event type")
+        return timeline_arrays
+
+    @classmethod
+    def from_timeline_arrays(cls, timeline_arrays, notes_json=None, api_version="v1"):
+        """
+        Create a user from timeline column arrays made by get_timeline_arrays. The arrays are
+        used as they are, so memory-mapped arrays are not read until used.
+
+        Args:
+            timeline_arrays (dict): timeline name mapped to dict of column arrays
+            notes_json (dict): Optional notes in Tidepool API format
+            api_version (str): parser version to user
+
+        Returns:
+            TidepoolUser: user
+        """
+        user = cls([], notes_json=notes_json, api_version=api_version)
+        for timeline_name, table in timeline_arrays.items():
+            user._timelines[timeline_name] = make_timeline(timeline_name, table["time"], table, presorted=True)
+
+        return user
 
     def parse_notes_json_v1(self):
         """
@@ -207,32 +520,36 @@ class TidepoolUser(object):
 
     def get_total_insulin(self, start_date, end_date):
         """
-        Get the sum of insulin with the two datetimes, inclusive.
+        Get the sum of insulin with the two datetimes, inclusive. Basal is the amount delivered
+        in the window, so segments crossing its edges are prorated.
 
         Args:
             start_date (dt.DateTime): start date
             end_date (dt.DateTime): end date
 
         Returns:
-            (float, int, float, int): sum and counts of bolus and basal
+            (float, int, float, int): sum and counts of bolus and basal, counting basal segments
+                that overlap the window
         """
+        total_bolus, num_bolus_events, total_basal, num_basal_events = self.get_total_insulin_batch(start_date,
+                                                                                                    end_date)
+
+        return float(total_bolus), int(num_bolus_events), float(total_basal), int(num_basal_events)
 
-        total_bolus = 0.0
-        num_bolus_events = 0
-        total_basal = 0.0
-        num_basal_events = 0
+    def get_total_insulin_batch(self, start_dates, end_dates):
+        """
+        Get the sum of insulin in many windows. Bolus uses two binary searches into prefix sums
+        and basal an interval index of the segments, prorated at the window edges.
 
-        for time, bolus in self.bolus_timeline.items():
-            if start_date <= time <= end_date:
-                total_bolus += bolus.get_value()
-                num_bolus_events += 1
+        Args:
+            start_dates (list or np.ndarray): window start datetimes, inclusive
+            end_dates (list or np.ndarray): window end datetimes, inclusive
 
-        for time, basal in self.basal_timeline.items():
-            if start_date <= time <= end_date:
-                rate = basal.get_value()
-                amount_delivered = rate * basal.get_duration_hours()
-                total_basal += amount_delivered
-                num_basal_events += 1
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, np.ndarray): sums and counts of bolus and basal per window
+        """
+        total_bolus, num_bolus_events = self.bolus_timeline.get_totals(("value",), start_dates, end_dates)
+        total_basal, num_basal_events = self.basal_timeline.get_interval_index().get_totals(start_dates, end_dates)
 
         return total_bolus, num_bolus_events, total_basal, num_basal_events
 
@@ -246,15 +563,22 @@ class TidepoolUser(object):
         Returns:
             (float, int): total carbs and number of carb events
         """
+        total_carbs, num_carb_events = self.get_total_carbs_batch(start_date, end_date)
+
+        return float(total_carbs), int(num_carb_events)
+
+    def get_total_carbs_batch(self, start_dates, end_dates):
+        """
+        Get the sum of carbs in many windows, each with two binary searches into a prefix sum.
 
-        total_carbs = 0.0
-        num_carb_events = 0
-        for time, food in self.food_timeline.items():
-            if start_date <= time <= end_date:
-                total_carbs += food.get_value()
-                num_carb_events += 1
+        Args:
+            start_dates (list or np.ndarray): window start datetimes, inclusive
+            end_dates (list or np.ndarray): window end datetimes, inclusive
 
-        return total_carbs, num_carb_events
+        Returns:
+            (np.ndarray, np.ndarray): total carbs and number of carb events per window
+        """
+        return self.food_timeline.get_totals(("value",), start_dates, end_dates)
 
     def get_cgm_stats(self, start_date, end_date):
         """
@@ -268,18 +592,44 @@ class TidepoolUser(object):
             (float, float): geo mean and std
         """
 
-        cgm_values = []
-        for time, cgm_event in self.glucose_timeline.items():
-            if start_date <= time <= end_date:
-                cgm_value = cgm_event.get_value()
-                cgm_values.append(cgm_value)
+        cgm_values = self.glucose_timeline.get_values(start_date, end_date)
 
         return gmean(cgm_values), gstd(cgm_values)
 
+    def get_rolling_cgm_metrics(self, window_hours=DEFAULT_WINDOW_HOURS, start_date=None, end_date=None,
+                                **range_kwargs):
+        """
+        Compute cgm metrics over a sliding window ending at each cgm sample, in one pass.
+
+        Args:
+            window_hours (float): window length
+            start_date (dt.DateTime): Optional start date, inclusive
+            end_date (dt.DateTime): Optional end date, inclusive
+            **range_kwargs: glucose ranges and episode duration passed to RollingCGMMetrics
+
+        Returns:
+            dict: "time" and each metric mapped to an array with a value per cgm sample
+        """
+        start_index, end_index = self.glucose_timeline.get_index_range(start_date, end_date)
+        if "is_cgm" in self.glucose_timeline.columns:
+            is_cgm = self.glucose_timeline.columns["is_cgm"][start_index:end_index]
+        else:
+            # Timelines assigned as event objects only have the classes to tell cgm apart
+            events = self.glucose_timeline.values()[start_index:end_index]
+            is_cgm = np.array([isinstance(event, TidepoolCGMGlucoseMeasurement) for event in events], dtype=bool)
+        times = self.glucose_timeline.times[start_index:end_index][is_cgm]
+        values = self.glucose_timeline.columns["value"][start_index:end_index][is_cgm]
+
+        metrics = RollingCGMMetrics(window_hours, **range_kwargs).compute(times, values)
+        metrics["time"] = times
+
+        return metrics
+
     def detect_circadian_hr(self, start_time=dt.datetime.min, end_time=dt.datetime.max, win_radius=3):
         """
         Count carb intake per hour and use the minimum as a likely cutoff for daily circadian
-        boundary. Useful for daily analysis.
+        boundary. Useful for daily analysis. Results are kept per arguments until the food
+        timeline is replaced.
 
         Args:
             start_time: datetime
@@ -288,25 +638,52 @@ class TidepoolUser(object):
             end_time: datetime
                 The end date of projects to use for detection
 
+            win_radius: int
+                Hours on each side of an intake that it also counts toward
+
         Returns:
-            int: hour of least carbs
+            int: hour of least carbs among the hours near an intake, the first reached on ties
+                and 0 if there are no carbs
         """
+        food_timeline = self.food_timeline
+        if food_timeline is not self._circadian_hr_food_timeline:
+            self._circadian_hr_cache = {}
+            self._circadian_hr_food_timeline = food_timeline
+
+        cache_key = (start_time, end_time, win_radius)
+        if cache_key not in self._circadian_hr_cache:
+
+            carb_times = food_timeline.get_times(start_time, end_time)
+            carb_hours = carb_times.astype("datetime64[h]").astype(np.int64) % 24
+            hour_counts = np.bincount(carb_hours, minlength=24)
+
+            # Circular convolution of the hourly counts with the window, which may wrap the day
+            window = np.bincount(np.arange(-win_radius, win_radius + 1) % 24, minlength=24)
+            hours = np.arange(24)
+            window_counts = hour_counts[(hours[:, None] - hours[None, :]) % 24] @ window
+
+            # Candidates are the hours within the window of an intake, in the order intakes reach
+            # them, so ties go to the hour reached first. Later intakes at a seen hour reach no new hours.
+            distinct_hours, first_indices = np.unique(carb_hours, return_index=True)
+            reached_hours = (distinct_hours[np.argsort(first_indices)][:, None]
+                             + np.arange(-win_radius, win_radius + 1)[None, :]) % 24
+            candidate_hours, first_reached = np.unique(reached_hours.ravel(), return_index=True)
+            candidate_hours = candidate_hours[np.argsort(first_reached)]
+
+            if len(candidate_hours) == 0:
+                logger.debug("No carbs to detect circadian hour, using midnight.")
+                min_hr = 0
+            else:
+                min_hr = int(candidate_hours[np.argmin(window_counts[candidate_hours])])
 
-        hour_ctr = defaultdict(int)
-        for dt, carb in self.food_timeline.items():
-            if start_time <= dt <= end_time:
-
-                for radius in range(-win_radius, win_radius + 1):
-                    associated_hour = (dt.hour + radius) % 24
-                    hour_ctr[associated_hour] += 1
-
-        min_hr, min_count = min(hour_ctr.items(), key=itemgetter(1))
+            self._circadian_hr_cache[cache_key] = min_hr
 
-        return min_hr
+        return self._circadian_hr_cache[cache_key]
 
     def compute_daily_stats(self, start_date, end_date, use_circadian=True):
         """
-        Compute daily stats for a user.
+        Compute daily stats for a user. Each day runs from its start up to the start of the
+        next day, so every event is counted in one day.
 
         Args:
             start_date (dt.DateTime): start date
@@ -314,7 +691,7 @@ class TidepoolUser(object):
             use_circadian (bool): Use circadian hour instead of timestamp midnight for day boundary
 
         Returns:
-            pd.DataFrame: rows are days, columns are stats
+            list: dict of stats per day
         """
         #TODO: tie in to settings
 
@@ -326,37 +703,53 @@ class TidepoolUser(object):
 
         num_days = int((end_date - start_date).total_seconds() / 3600 / 24)
 
-        dates = []
-
         start_datetime_withoffset = dt.datetime(year=start_date.year, month=start_date.month, day=start_date.day,
                                                 hour=circadian_hour)
 
-        daily_stats = []
-        for i in range(num_days):
-            daily_start_datetime = start_datetime_withoffset + dt.timedelta(days=i)
-            daily_end_datetime = daily_start_datetime + dt.timedelta(days=1)
-
-            dates.append(daily_start_datetime.date())
+        # Each timeline is binned into days once and reduced per day
+        bolus_days, bolus_slice = self.bolus_timeline.get_day_bins(start_datetime_withoffset, num_days)
+        total_bolus = np.bincount(bolus_days, weights=self.bolus_timeline.columns["value"][bolus_slice],
+                                  minlength=num_days)
+
+        # Basal is prorated at the day boundaries
+        day_edges = to_datetime64(start_datetime_withoffset) + np.arange(num_days + 1).astype("timedelta64[D]")
+        basal_before_edges = self.basal_timeline.get_interval_index().get_amount_before(day_edges)
+        total_basal = np.diff(basal_before_edges)
+
+        total_insulin = total_bolus + total_basal
+
+        carb_days, carb_slice = self.food_timeline.get_day_bins(start_datetime_withoffset, num_days)
+        total_carbs = np.bincount(carb_days, weights=self.food_timeline.columns["value"][carb_slice],
+                                  minlength=num_days)
+
+        # Geometric mean and std with ddof=1 as in gmean and gstd, from the per day mean and
+        # squared deviations of log values
+        cgm_days, cgm_slice = self.glucose_timeline.get_day_bins(start_datetime_withoffset, num_days)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cgm_log_values = np.log(self.glucose_timeline.columns["value"][cgm_slice])
+            num_cgm_values = np.bincount(cgm_days, minlength=num_days)
+            cgm_log_mean = np.bincount(cgm_days, weights=cgm_log_values, minlength=num_days) / num_cgm_values
+            cgm_log_sq_dev = np.bincount(cgm_days, weights=(cgm_log_values - cgm_log_mean[cgm_days]) ** 2,
+                                         minlength=num_days)
+            cgm_geo_mean = np.exp(cgm_log_mean)
+            cgm_log_var = np.where(num_cgm_values > 1, cgm_log_sq_dev / (num_cgm_values - 1), np.nan)
+            cgm_geo_std = np.exp(np.sqrt(cgm_log_var))
 
-            total_bolus, num_bolus_events, total_basal, num_basal_events = self.get_total_insulin(daily_start_datetime,
-                                                                                                  daily_end_datetime)
-            total_insulin = total_bolus + total_basal
-            total_carbs, num_carb_events = self.get_total_carbs(daily_start_datetime, daily_end_datetime)
-            cgm_geo_mean, cgm_geo_std = self.get_cgm_stats(daily_start_datetime, daily_end_datetime)
             residual_cgm = cgm_geo_mean - target_bg
+            carb_insulin_ratio = total_carbs / (total_insulin * 0.5)
 
-            day_stats = {
-                "date": daily_start_datetime,
-                "total_insulin": total_insulin,
-                "total_basal": total_basal,
-                "total_bolus": total_bolus,
-                "total_carbs": total_carbs,
-                "cgm_geo_mean": cgm_geo_mean,
-                "cgm_geo_std": cgm_geo_std,
-                "carb_insulin_ratio": total_carbs / (total_insulin * 0.5),
-                "residual_cgm": residual_cgm
-            }
-
-            daily_stats.append(day_stats)
+        daily_stats = []
+        for i in range(num_days):
+            daily_stats.append({
+                "date": start_datetime_withoffset + dt.timedelta(days=i),
+                "total_insulin": float(total_insulin[i]),
+                "total_basal": float(total_basal[i]),
+                "total_bolus": float(total_bolus[i]),
+                "total_carbs": float(total_carbs[i]),
+                "cgm_geo_mean": float(cgm_geo_mean[i]),
+                "cgm_geo_std": float(cgm_geo_std[i]),
+                "carb_insulin_ratio": float(carb_insulin_ratio[i]),
+                "residual_cgm": float(residual_cgm[i])
+            })
 
         return daily_stats
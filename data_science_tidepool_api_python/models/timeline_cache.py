@@ -0,0 +1,169 @@
+"""
+Cache of parsed user timelines as .npy arrays that are memory-mapped on load.
+
+The cache lives in a directory next to the raw event data and records a signature
+of the file it was built from (size and mtime, optionally a sha256 of the contents).
+A cache whose signature no longer matches its source is treated as missing.
+
+Loading maps the files read-only, so the cost does not grow with the amount of data
+and the pages are shared between processes loading the same user.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_CACHE_DIRNAME = "timeline_cache"
+TIMELINE_CACHE_META_FILENAME = "cache_meta.json"
+
+# Bump when the array layout changes so old caches are rebuilt
+TIMELINE_CACHE_VERSION = 1
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def get_file_signature(path, use_hash=False):
+    """
+    Get a signature of a file to detect changes to it.
+
+    Args:
+        path (str): file path
+        use_hash (bool): include a sha256 of the contents instead of trusting the mtime
+
+    Returns:
+        dict: signature
+    """
+    stat = os.stat(path)
+    signature = {
+        "path": os.path.basename(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+    if use_hash:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file_to_hash:
+            for chunk in iter(lambda: file_to_hash.read(HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        signature["sha256"] = sha256.hexdigest()
+        del signature["mtime_ns"]
+
+    return signature
+
+
+def save_timeline_cache(timeline_arrays, path_to_cache_dir, source_path, use_hash=False):
+    """
+    Save timeline arrays as .npy files with the signature of the file they were parsed from.
+    The directory is written next to the target and swapped in so readers never see a
+    partial cache.
+
+    Args:
+        timeline_arrays (dict): timeline name mapped to dict of column arrays
+        path_to_cache_dir (str): directory to write
+        source_path (str): file the timelines were parsed from
+        use_hash (bool): validate the cache by content hash instead of mtime
+    """
+    path_to_cache_dir = os.path.abspath(path_to_cache_dir)
+    parent_dir = os.path.dirname(path_to_cache_dir)
+    temp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp_")
+
+    for timeline_name, table in timeline_arrays.items():
+        for column_name, column in table.items():
+            np.save(os.path.join(temp_dir, "{}.{}.npy".format(timeline_name, column_name)), column)
+
+    cache_meta = {
+        "version": TIMELINE_CACHE_VERSION,
+        "timelines": {timeline_name: list(table) for timeline_name, table in timeline_arrays.items()},
+        "source": get_file_signature(source_path, use_hash=use_hash),
+    }
+    with open(os.path.join(temp_dir, TIMELINE_CACHE_META_FILENAME), "w") as file_to_write:
+        json.dump(cache_meta, file_to_write)
+
+    old_dir = None
+    if os.path.isdir(path_to_cache_dir):
+        old_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".old_")
+        os.rename(path_to_cache_dir, os.path.join(old_dir, "cache"))
+    os.rename(temp_dir, path_to_cache_dir)
+
+    if old_dir is not None:
+        shutil.rmtree(old_dir)
+
+
+def is_timeline_cache_valid(path_to_cache_dir, source_path):
+    """
+    Check that a cache exists, has the current layout and was built from the source file as it is now.
+
+    Args:
+        path_to_cache_dir (str): cache directory
+        source_path (str): file the timelines were parsed from
+
+    Returns:
+        bool: True if the cache can be used
+    """
+    meta_path = os.path.join(path_to_cache_dir, TIMELINE_CACHE_META_FILENAME)
+    if not os.path.isfile(meta_path) or source_path is None or not os.path.isfile(source_path):
+        return False
+
+    with open(meta_path) as file_to_read:
+        cache_meta = json.load(file_to_read)
+
+    if cache_meta.get("version") != TIMELINE_CACHE_VERSION:
+        return False
+
+    cached_signature = cache_meta["source"]
+    signature = get_file_signature(source_path, use_hash="sha256" in cached_signature)
+
+    return signature == cached_signature
+
+
+def load_timeline_cache(path_to_cache_dir, source_path):
+    """
+    Memory-map cached timeline arrays if the cache is valid for the source file.
+
+    Args:
+        path_to_cache_dir (str): cache directory
+        source_path (str): file the timelines were parsed from
+
+    Returns:
+        dict: timeline name mapped to dict of read-only column arrays, or None if the cache
+            is missing or stale
+    """
+    if not is_timeline_cache_valid(path_to_cache_dir, source_path):
+        return None
+
+    with open(os.path.join(path_to_cache_dir, TIMELINE_CACHE_META_FILENAME)) as file_to_read:
+        cache_meta = json.load(file_to_read)
+
+    timeline_arrays = {}
+    for timeline_name, column_names in cache_meta["timelines"].items():
+        timeline_arrays[timeline_name] = {
+            column_name: load_array(os.path.join(path_to_cache_dir, "{}.{}.npy".format(timeline_name, column_name)))
+            for column_name in column_names
+        }
+
+    return timeline_arrays
+
+
+def load_array(path):
+    """
+    Memory-map a .npy file read-only.
+
+    Args:
+        path (str): file path
+
+    Returns:
+        np.ndarray: array backed by the file
+    """
+    try:
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    except ValueError:
+        # Older numpy cannot map zero length arrays
+        return np.load(path, allow_pickle=False)
@@ -9,9 +9,15 @@ want to support.
 
 import datetime as dt
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
-from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI, accept_pending_share_invitations
+from data_science_tidepool_api_python.makedata.tidepool_api import (
+    TidepoolAPI, accept_pending_share_invitations, create_session,
+    DEFAULT_INVITATION_WORKERS, DEFAULT_INVITATION_REQUESTS_PER_SEC
+)
+from data_science_tidepool_api_python.makedata.rate_limit import TokenBucket
+from data_science_tidepool_api_python.makedata.token_cache import SessionTokenCache, DEFAULT_TOKEN_CACHE_PATH
 from data_science_tidepool_api_python.projects.tbddp.tbddp import get_tbddp_auth
 from data_science_tidepool_api_python.util import USER_IDS_QA
 
@@ -38,21 +44,40 @@ DONOR_INSTITUTION_KEYS = [
 # TODO: Add README on how to symlink auth and run this code
 
 
-def accept_all_pending_share_invitations(tbddp_auth):
+def accept_all_pending_share_invitations(tbddp_auth, max_workers_per_institution=DEFAULT_INVITATION_WORKERS,
+                                         requests_per_sec=DEFAULT_INVITATION_REQUESTS_PER_SEC, token_cache=None):
     """
     Accept pending invitations for partnering institutions in Tidepool Big Data Donation Project.
+    Institutions are processed concurrently and share one rate limit.
 
     Args:
         tbddp_auth:
+        max_workers_per_institution (int): invitations accepted concurrently per institution
+        requests_per_sec (float): combined accept rate across all institutions
+        token_cache (SessionTokenCache): Optional cache to reuse institution session tokens
+
+    Returns:
+        dict: institution id mapped to (invitations, failed acceptances)
     """
-    for institution_id  in DONOR_INSTITUTION_KEYS:
+    rate_limiter = TokenBucket(requests_per_sec)
+    session = create_session(pool_maxsize=max_workers_per_institution * len(DONOR_INSTITUTION_KEYS))
 
+    def accept_institution_invitations(institution_id):
         institution_auth = tbddp_auth[institution_id]
         username, password = (institution_auth["email"], institution_auth["password"])
-        accept_pending_share_invitations(username, password)
+        return accept_pending_share_invitations(username, password, session=session,
+                                                max_workers=max_workers_per_institution,
+                                                rate_limiter=rate_limiter, token_cache=token_cache)
+
+    with ThreadPoolExecutor(max_workers=len(DONOR_INSTITUTION_KEYS)) as executor:
+        results = list(executor.map(accept_institution_invitations, DONOR_INSTITUTION_KEYS))
+
+    session.close()
 
+    return dict(zip(DONOR_INSTITUTION_KEYS, results))
 
-def determine_donation_payout_percentages(tbddp_auth):
+
+def determine_donation_payout_percentages(tbddp_auth, token_cache=None):
     """
     Collect user preferences for institutions whom they shared with
     and determine the payout percentage for each institution.
@@ -64,14 +89,17 @@ def determine_donation_payout_percentages(tbddp_auth):
 
     Args:
         tbddp_auth:
+        token_cache (SessionTokenCache): Optional cache to reuse institution session tokens
     """
     # Get a map of users to their list of institutions
     user_institution_map = defaultdict(list)
+    session = create_session()
     for institution_id in DONOR_INSTITUTION_KEYS:
 
         institution_auth = tbddp_auth[institution_id]
 
-        tp_api = TidepoolAPI(institution_auth["email"], institution_auth["password"])
+        tp_api = TidepoolAPI(institution_auth["email"], institution_auth["password"], session=session,
+                             token_cache=token_cache)
 
         tp_api.login()
         users_sharing_with_json = tp_api.get_users_sharing_with()
@@ -80,6 +108,8 @@ def determine_donation_payout_percentages(tbddp_auth):
         for user_id, user_data in users_sharing_with_json.items():
             user_institution_map[user_id].append(institution_id)
 
+    session.close()
+
     # Remove test users that Tidepool uses for QA
     for fake_user in USER_IDS_QA:
         if fake_user in user_institution_map:
@@ -103,9 +133,10 @@ def determine_donation_payout_percentages(tbddp_auth):
 if __name__ == "__main__":
 
     tbddp_auth = get_tbddp_auth()
+    token_cache = SessionTokenCache(path=DEFAULT_TOKEN_CACHE_PATH)
 
     # Accept invitations to get projects up to date
-    accept_all_pending_share_invitations(tbddp_auth)
+    accept_all_pending_share_invitations(tbddp_auth, token_cache=token_cache)
 
     # Get percentages
-    # determine_donation_payout_percentages(tbddp_auth)
+    # determine_donation_payout_percentages(tbddp_auth, token_cache=token_cache)
@@ -12,14 +12,18 @@ from data_science_tidepool_api_python.projects.tbddp.tbddp import get_tbddp_auth
 logger = logging.getLogger(__name__)
 
 
-def describe_tbddp_users(tbddp_auth):
+def describe_tbddp_users(tbddp_auth, token_cache=None):
     """
     Answer some basic questions about the users involved in the project.
+
+    Args:
+        tbddp_auth:
+        token_cache (SessionTokenCache): Optional cache to reuse the project session token
     """
     username = tbddp_auth[TBDDP_PROJECT_ID]["email"]
     password = tbddp_auth[TBDDP_PROJECT_ID]["password"]
 
-    tp_api = TidepoolAPI(username, password)
+    tp_api = TidepoolAPI(username, password, token_cache=token_cache)
 
     tp_api.login()
 
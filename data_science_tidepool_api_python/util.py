@@ -5,6 +5,10 @@ API_DATA_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
 API_NOTE_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+# Event types consumed by TidepoolUser.parse_data_json_v1. Pass as the types filter
+# when downloading so the api does not send data the parser does not use.
+PARSED_EVENT_TYPES_V1 = ["smbg", "cbg", "food", "basal", "bolus", "deviceEvent"]
+
 
 USER_IDS_QA = [
     'f597f21dcd', '0ef51a0121', '38c3795fcb', '69c99b51f6', '84c2cdd947',
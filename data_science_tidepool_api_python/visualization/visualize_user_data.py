@@ -16,37 +16,22 @@ def plot_raw_data(user, start_date, end_date):
     """
     fig, ax = plt.subplots(3, 1, figsize=(12, 15))
 
-    event_times = []
-    cgm_values = []
-
-    for dt, cgm_event in user.glucose_timeline.items():
-        if start_date <= dt <= end_date:
-            event_times.append(dt)
-            cgm_values.append(cgm_event.get_value())
+    event_times = user.glucose_timeline.get_times(start_date, end_date)
+    cgm_values = user.glucose_timeline.get_values(start_date, end_date)
 
     ax[0].plot(event_times, cgm_values)
     ax[0].set_title("CGM")
     ax[0].set_ylabel("mg/dL")
 
-    event_times = []
-    bolus_values = []
-
-    for dt, bolus_event in user.bolus_timeline.items():
-        if start_date <= dt <= end_date:
-            event_times.append(dt)
-            bolus_values.append(bolus_event.get_value())
+    event_times = user.bolus_timeline.get_times(start_date, end_date)
+    bolus_values = user.bolus_timeline.get_values(start_date, end_date)
 
     ax[1].set_title("Bolus")
     ax[1].stem(event_times, bolus_values)
     ax[1].set_ylabel("Units")
 
-    event_times = []
-    carb_values = []
-
-    for dt, carb_event in user.food_timeline.items():
-        if start_date <= dt <= end_date:
-            event_times.append(dt)
-            carb_values.append(carb_event.get_value())
+    event_times = user.food_timeline.get_times(start_date, end_date)
+    carb_values = user.food_timeline.get_values(start_date, end_date)
 
     ax[2].stem(event_times, carb_values)
     ax[2].set_title("Carbs")
@@ -15,5 +15,5 @@ setup(
     package_dir={package_name: 'src'},
     license='BSD 2-Clause',
     long_description=open('README.md').read(),
-    python_requires='>=3.6',
+    python_requires='>=3.8',
 )
@@ -0,0 +1,92 @@
+"""
+Tests for the asyncio client against the local mock server.
+"""
+
+import os
+import json
+import asyncio
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.async_tidepool_api import (
+    AsyncTidepoolAPI, download_observed_users_data
+)
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI
+from data_science_tidepool_api_python.makedata.token_cache import SessionTokenCache
+from data_science_tidepool_api_python.makedata.make_user import load_user_from_files, CREATION_META_FILENAME
+from data_science_tidepool_api_python.makedata.make_cohort import MANIFEST_STATUS_COMPLETE, MANIFEST_STATUS_FAILED
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockTidepoolServer(num_users=3, num_days=5, num_invitations=2) as mock_server:
+        yield mock_server
+
+
+def test_rejected_cached_token_logs_in_again(server):
+    token_cache = SessionTokenCache()
+    token_cache.set(server.base_url, "user", "stale-token", "mockobserver")
+
+    async def download():
+        async with AsyncTidepoolAPI("user", "pass", api_base_url=server.base_url, token_cache=token_cache) as tp_api:
+            await tp_api.login()
+            return await asyncio.gather(*[
+                tp_api.get_user_event_data(server.start_date, server.end_date, observed_user_id=user_id)
+                for user_id in server.user_ids
+            ])
+
+    user_events = asyncio.run(download())
+
+    assert all(events is not None and len(events) > 0 for events in user_events)
+    assert token_cache.get(server.base_url, "user")[0] != "stale-token"
+
+
+def test_download_observed_users_data_saves_each_user(server, tmp_path):
+    user_entries = download_observed_users_data("user", "pass", server.start_date, server.end_date,
+                                                api_base_url=server.base_url, device_sources=["dexcom"],
+                                                data_dir=str(tmp_path))
+
+    assert sorted(user_entries) == sorted(server.user_ids)
+
+    tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url)
+    tp_api.login()
+    for user_id, user_entry in user_entries.items():
+        assert user_entry["status"] == MANIFEST_STATUS_COMPLETE
+        expected_events = tp_api.get_user_event_data(server.start_date, server.end_date, observed_user_id=user_id)
+        assert user_entry["num_events"] == len(expected_events)
+
+        creation_metadata = json.load(open(os.path.join(user_entry["save_dir"], CREATION_META_FILENAME)))
+        assert creation_metadata["user_id"] == user_id
+        assert creation_metadata["device_sources"] == ["dexcom"]
+
+        user = load_user_from_files(user_entry["save_dir"], use_cache=False)
+        assert len(user.glucose_timeline) > 0
+    tp_api.logout()
+    tp_api.close()
+
+
+def test_download_observed_users_data_records_failed_users(tmp_path):
+    with MockTidepoolServer(num_users=6, num_days=2, error_rate=0.5) as error_server:
+        user_entries = download_observed_users_data("user", "pass", error_server.start_date, error_server.end_date,
+                                                    user_ids=error_server.user_ids, api_base_url=error_server.base_url,
+                                                    data_dir=str(tmp_path))
+
+    assert sorted(user_entries) == sorted(error_server.user_ids)
+    for user_entry in user_entries.values():
+        assert user_entry["status"] in (MANIFEST_STATUS_COMPLETE, MANIFEST_STATUS_FAILED)
+        if user_entry["status"] == MANIFEST_STATUS_COMPLETE:
+            assert os.path.isfile(os.path.join(user_entry["save_dir"], CREATION_META_FILENAME))
+
+
+def test_accept_observer_invitations(server):
+
+    async def accept():
+        async with AsyncTidepoolAPI("user", "pass", api_base_url=server.base_url) as tp_api:
+            await tp_api.login()
+            return await tp_api.accept_observer_invitations()
+
+    pending_invitations, failed_invitations = asyncio.run(accept())
+
+    assert len(pending_invitations) == 2
+    assert failed_invitations == []
@@ -0,0 +1,68 @@
+"""
+Tests that users parsed from columnar event tables match users parsed from event json.
+"""
+
+import numpy as np
+import pytest
+
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser, TIMELINE_COLUMNS
+from data_science_tidepool_api_python.models.event_columns import (
+    events_to_columns, save_event_columns, load_event_columns
+)
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+
+def assert_users_equal(user, expected_user):
+    for timeline_name, (column_names, _) in TIMELINE_COLUMNS.items():
+        timeline = user.get_timeline(timeline_name)
+        expected_timeline = expected_user.get_timeline(timeline_name)
+
+        np.testing.assert_array_equal(timeline.times, expected_timeline.times)
+        for column_name in column_names:
+            np.testing.assert_array_equal(timeline.columns[column_name], expected_timeline.columns[column_name])
+
+
+@pytest.mark.parametrize("mmol_fraction", [0.0, 0.3])
+def test_columns_user_matches_json_user(mmol_fraction):
+    events = make_synthetic_user_events(20, mmol_fraction=mmol_fraction)
+
+    columns_user = TidepoolUser.from_event_columns(events_to_columns(events, skip_unknown=True))
+
+    assert_users_equal(columns_user, TidepoolUser(events))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_events_to_columns_chunks_match(chunk_size):
+    events = make_synthetic_user_events(3)
+
+    event_columns = events_to_columns(events, skip_unknown=True, chunk_size=chunk_size)
+    expected_event_columns = events_to_columns(events, skip_unknown=True)
+
+    assert event_columns.keys() == expected_event_columns.keys()
+    for event_type, table in expected_event_columns.items():
+        assert event_columns[event_type].keys() == table.keys()
+        for column_name, column in table.items():
+            np.testing.assert_array_equal(event_columns[event_type][column_name], column)
+
+
+def test_saved_columns_user_matches_json_user(tmp_path):
+    events = make_synthetic_user_events(5)
+    save_event_columns(events_to_columns(events, skip_unknown=True), str(tmp_path))
+
+    columns_user = TidepoolUser.from_event_columns(load_event_columns(str(tmp_path)))
+
+    assert_users_equal(columns_user, TidepoolUser(events))
+
+
+@pytest.mark.parametrize("glucose_types", [["smbg", "cbg"], ["cbg", "smbg"]])
+def test_glucose_timestamp_ties_keep_last_in_api_order(glucose_types):
+    time = "2020-01-01T00:05:00.000Z"
+    events = [{"id": "g{}".format(i), "type": event_type, "time": time, "value": 100 + i, "units": "mg/dL"}
+              for i, event_type in enumerate(glucose_types)]
+
+    columns_user = TidepoolUser.from_event_columns(events_to_columns(events))
+    json_user = TidepoolUser(events)
+
+    assert_users_equal(columns_user, json_user)
+    assert json_user.glucose_timeline.columns["value"].tolist() == [101]
+    assert json_user.glucose_timeline.columns["is_cgm"].tolist() == [glucose_types[-1] == "cbg"]
@@ -0,0 +1,68 @@
+"""
+Tests for IntervalIndex window totals against a per-interval overlap sum.
+"""
+
+import numpy as np
+import pytest
+
+from data_science_tidepool_api_python.models.interval_index import IntervalIndex
+
+ORIGIN = np.datetime64("2020-01-01T00:00:00", "us")
+
+
+def hours_to_times(hours):
+    return ORIGIN + np.round(np.asarray(hours) * 3600e6).astype("timedelta64[us]")
+
+
+def get_totals_brute_force(starts, durations, rates, window_starts, window_ends):
+    amounts = []
+    counts = []
+    for window_start, window_end in zip(window_starts, window_ends):
+        amount = 0.0
+        count = 0
+        for start, duration, rate in zip(starts, durations, rates):
+            overlap = min(start + duration, window_end) - max(start, window_start)
+            amount += rate * max(overlap, 0.0)
+            count += start <= window_end and start + duration > window_start
+        amounts.append(amount)
+        counts.append(count)
+    return np.array(amounts), np.array(counts)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_get_totals_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    num_intervals = rng.integers(1, 50)
+    # Whole seconds so window edges can land exactly on interval edges
+    starts = rng.integers(0, 100 * 3600, num_intervals) / 3600
+    durations = rng.integers(0, 5 * 3600, num_intervals) / 3600
+    rates = rng.uniform(0, 3, num_intervals)
+
+    window_starts = rng.integers(-5 * 3600, 105 * 3600, 200) / 3600
+    window_starts[:num_intervals] = starts
+    window_ends = window_starts + rng.integers(0, 30 * 3600, 200) / 3600
+
+    interval_index = IntervalIndex(hours_to_times(starts), durations, rates)
+    amounts, counts = interval_index.get_totals(hours_to_times(window_starts), hours_to_times(window_ends))
+    expected_amounts, expected_counts = get_totals_brute_force(starts, durations, rates, window_starts, window_ends)
+
+    np.testing.assert_allclose(amounts, expected_amounts, atol=1e-9)
+    np.testing.assert_array_equal(counts, expected_counts)
+
+
+def test_get_totals_single_window():
+    interval_index = IntervalIndex(hours_to_times([0, 1]), [1, 2], [1.0, 2.0])
+
+    amount, count = interval_index.get_totals(hours_to_times(0.5), hours_to_times(2))
+
+    assert amount == pytest.approx(0.5 + 2.0)
+    assert count == 2
+
+
+def test_get_totals_without_intervals():
+    interval_index = IntervalIndex(np.array([], dtype="datetime64[us]"), [], [])
+
+    amounts, counts = interval_index.get_totals(hours_to_times([0, 1]), hours_to_times([2, 3]))
+
+    np.testing.assert_array_equal(amounts, [0, 0])
+    np.testing.assert_array_equal(counts, [0, 0])
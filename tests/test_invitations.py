@@ -0,0 +1,87 @@
+"""
+Tests for accepting observer invitations with retries against the local mock server.
+"""
+
+from collections import Counter
+
+import pytest
+import requests
+
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI
+from data_science_tidepool_api_python.makedata.rate_limit import TokenBucket, get_backoff_sec
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+NUM_INVITATIONS = 5
+
+
+def rate_limit_accepts(server, num_rejections):
+    """
+    Answer the first num_rejections accepts per user with 429 and Retry-After: 0.
+    """
+    accept_invitation = server.httpd.accept_invitation
+    attempts = Counter()
+
+    def rate_limited_accept_invitation(observer_id, user_id, query):
+        attempts[user_id] += 1
+        if attempts[user_id] <= num_rejections:
+            return 429, b"{}", {"Retry-After": "0"}
+        return accept_invitation(observer_id, user_id, query)
+
+    server.httpd.accept_invitation = rate_limited_accept_invitation
+    return attempts
+
+
+def accept_invitations(server, **kwargs):
+    tp_api = TidepoolAPI("observer", "pass", api_base_url=server.base_url)
+    tp_api.login()
+    try:
+        return tp_api.accept_observer_invitations(**kwargs)
+    finally:
+        tp_api.logout()
+        tp_api.close()
+
+
+def test_get_backoff_sec_uses_retry_after():
+    assert get_backoff_sec(0, retry_after="2") == 2
+    assert get_backoff_sec(3, retry_after="120", max_sec=60) == 60
+    assert 0.25 <= get_backoff_sec(0, retry_after="Wed, 21 Oct 2015 07:28:00 GMT") <= 0.5
+    assert 1.0 <= get_backoff_sec(2) <= 2.0
+
+
+def test_accept_returns_invitations_and_no_failures():
+    with MockTidepoolServer(num_users=1, num_days=1, num_invitations=NUM_INVITATIONS) as server:
+        invitations, failed = accept_invitations(server)
+        assert server.httpd.pending_invitations == {}
+
+    assert len(invitations) == NUM_INVITATIONS
+    assert len({invitation["key"] for invitation in invitations}) == NUM_INVITATIONS
+    assert failed == []
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_accept_retries_after_rate_limit(max_workers):
+    with MockTidepoolServer(num_users=1, num_days=1, num_invitations=NUM_INVITATIONS) as server:
+        attempts = rate_limit_accepts(server, num_rejections=2)
+        invitations, failed = accept_invitations(server, max_workers=max_workers, max_retries=2,
+                                                 rate_limiter=TokenBucket(1000.0))
+        assert server.httpd.pending_invitations == {}
+
+    assert len(invitations) == NUM_INVITATIONS
+    assert failed == []
+    assert sorted(attempts.values()) == [3] * NUM_INVITATIONS
+
+
+def test_accept_reports_failures_after_max_retries():
+    with MockTidepoolServer(num_users=1, num_days=1, num_invitations=NUM_INVITATIONS) as server:
+        attempts = rate_limit_accepts(server, num_rejections=3)
+        invitations, failed = accept_invitations(server, max_retries=2)
+        assert len(server.httpd.pending_invitations) == NUM_INVITATIONS
+
+    assert len(invitations) == NUM_INVITATIONS
+    assert sorted(attempts.values()) == [3] * NUM_INVITATIONS
+    failed_keys = sorted(invitation["key"] for _, invitation in failed)
+    assert failed_keys == sorted(invitation["key"] for invitation in invitations)
+    for error, _ in failed:
+        assert isinstance(error, requests.HTTPError)
+        assert error.response.status_code == 429
@@ -0,0 +1,97 @@
+"""
+Tests for json backend selection and that every backend decodes the same.
+"""
+
+import io
+import json
+import importlib
+
+import pytest
+
+from data_science_tidepool_api_python.makedata import json_backend
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events, make_synthetic_notes
+
+
+ALL_JSON_BACKENDS = [json_backend.ORJSON, json_backend.SIMDJSON, json_backend.STDLIB]
+
+DOCUMENTS = [
+    make_synthetic_user_events(2),
+    make_synthetic_notes(2),
+    {"unicode": "µg/dL ☃ \U0001f600", "escaped": "quote \" slash \\ tab \t", "empty": [{}, []]},
+    [0, -1, 2 ** 53, 1.5, -0.25e-3, 1e300, True, False, None],
+]
+
+
+@pytest.fixture(autouse=True)
+def restore_json_backend():
+    backend = json_backend.get_json_backend()
+    yield
+    json_backend.set_json_backend(backend)
+
+
+def require_backend(backend):
+    if backend not in json_backend.get_available_json_backends():
+        pytest.skip("{} is not installed".format(backend))
+
+
+@pytest.mark.parametrize("backend", ALL_JSON_BACKENDS)
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_backends_decode_like_stdlib(backend, document):
+    require_backend(backend)
+    json_backend.set_json_backend(backend)
+    data = json.dumps(document, ensure_ascii=False)
+
+    assert json_backend.get_json_backend() == backend
+    assert json_backend.loads(data.encode("utf-8")) == json.loads(data)
+    assert json_backend.loads(data) == json.loads(data)
+    assert json_backend.load(io.BytesIO(data.encode("utf-8"))) == json.loads(data)
+    assert json_backend.load(io.StringIO(data)) == json.loads(data)
+
+
+@pytest.mark.parametrize("backend", ALL_JSON_BACKENDS)
+def test_backends_reject_invalid_json(backend):
+    require_backend(backend)
+    json_backend.set_json_backend(backend)
+
+    with pytest.raises(ValueError):
+        json_backend.loads(b"[1, 2")
+
+
+@pytest.mark.parametrize("installed, expected_backend", [
+    ((True, True), json_backend.ORJSON),
+    ((False, True), json_backend.SIMDJSON),
+    ((True, False), json_backend.ORJSON),
+    ((False, False), json_backend.STDLIB),
+])
+def test_fastest_installed_backend_is_default(monkeypatch, installed, expected_backend):
+    has_orjson, has_simdjson = installed
+    monkeypatch.setattr(json_backend, "orjson", object() if has_orjson else None)
+    monkeypatch.setattr(json_backend, "simdjson", object() if has_simdjson else None)
+
+    assert json_backend.get_available_json_backends()[0] == expected_backend
+    assert json_backend.get_available_json_backends()[-1] == json_backend.STDLIB
+
+
+def test_default_backend_is_first_available():
+    json_backend.set_json_backend()
+
+    assert json_backend.get_json_backend() == json_backend.get_available_json_backends()[0]
+
+
+def test_missing_or_unknown_backend_raises(monkeypatch):
+    monkeypatch.setattr(json_backend, "simdjson", None)
+
+    with pytest.raises(Exception):
+        json_backend.set_json_backend(json_backend.SIMDJSON)
+    with pytest.raises(Exception):
+        json_backend.set_json_backend("yaml")
+
+
+def test_env_var_forces_backend(monkeypatch):
+    monkeypatch.setenv(json_backend.JSON_BACKEND_ENV_VAR, json_backend.STDLIB)
+    try:
+        importlib.reload(json_backend)
+        assert json_backend.get_json_backend() == json_backend.STDLIB
+    finally:
+        monkeypatch.delenv(json_backend.JSON_BACKEND_ENV_VAR)
+        importlib.reload(json_backend)
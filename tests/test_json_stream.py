@@ -0,0 +1,67 @@
+"""
+Tests for incremental json array decoding.
+"""
+
+import os
+import json
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.json_stream import iter_json_array, iter_json_array_file
+from data_science_tidepool_api_python.makedata.compression import (
+    open_compressed, get_compressed_path, get_available_compressions
+)
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+
+def split_bytes(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+ELEMENTS = [
+    {"id": "a", "value": 1.5, "nested": {"list": [1, 2, {"x": None}]}},
+    12345678,
+    -0.25e-3,
+    "text with \"quotes\", commas] and brackets [",
+    "unicode µg/dL ☃ \U0001f600",
+    [],
+    {},
+    True,
+    False,
+    None,
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_iter_json_array_matches_json_loads(chunk_size):
+    data = json.dumps(ELEMENTS, ensure_ascii=False, indent=1).encode("utf-8")
+
+    assert list(iter_json_array(split_bytes(data, chunk_size))) == json.loads(data)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_iter_json_array_number_split_across_chunks(chunk_size):
+    data = b"[123456789, 0.000125,-42]"
+
+    assert list(iter_json_array(split_bytes(data, chunk_size))) == [123456789, 0.000125, -42]
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ ]  ", b"\n[\n]\n"])
+def test_iter_json_array_empty(data):
+    assert list(iter_json_array([data])) == []
+
+
+@pytest.mark.parametrize("data", [b"{\"a\": 1}", b"[1, 2", b"[1, {\"a\": ]", b""])
+def test_iter_json_array_invalid(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array(split_bytes(data, 3)))
+
+
+@pytest.mark.parametrize("compression", get_available_compressions())
+def test_iter_json_array_file(tmp_path, compression):
+    events = make_synthetic_user_events(3)
+    path = get_compressed_path(os.path.join(str(tmp_path), "event_data.json"), compression)
+    with open_compressed(path, "w") as file_to_write:
+        file_to_write.write(json.dumps(events))
+
+    assert list(iter_json_array_file(path, chunk_size=100)) == events
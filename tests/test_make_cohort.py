@@ -0,0 +1,116 @@
+"""
+Tests for cohort downloads with a resumable manifest against the local mock server.
+"""
+
+import os
+import json
+import datetime as dt
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.make_cohort import (
+    download_cohort_data, get_dir_size, MANIFEST_STATUS_COMPLETE, MANIFEST_STATUS_FAILED
+)
+from data_science_tidepool_api_python.makedata.make_user import load_user_from_files
+from data_science_tidepool_api_python.makedata.token_cache import SessionTokenCache
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockTidepoolServer(num_users=5, num_days=3) as mock_server:
+        yield mock_server
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return os.path.join(str(tmp_path), "cohort_manifest.json")
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    data_dir = tmp_path / "PHI"
+    data_dir.mkdir()
+    return str(data_dir)
+
+
+def download_cohort(server, manifest_path, data_dir, **kwargs):
+    return download_cohort_data("user", "pass", server.start_date, server.end_date, manifest_path,
+                                data_dir=data_dir, api_base_url=server.base_url, **kwargs)
+
+
+def load_manifest(manifest_path):
+    return json.load(open(manifest_path))
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_download_writes_manifest_and_summary(server, manifest_path, data_dir, tmp_path, use_processes):
+    token_cache = SessionTokenCache(path=os.path.join(str(tmp_path), "session_tokens.json"))
+    summary = download_cohort(server, manifest_path, data_dir, max_workers=3, use_processes=use_processes,
+                              token_cache=token_cache)
+
+    manifest = load_manifest(manifest_path)
+    assert sorted(manifest["users"]) == sorted(server.user_ids)
+
+    total_bytes = 0
+    for user_id, entry in manifest["users"].items():
+        assert entry["status"] == MANIFEST_STATUS_COMPLETE
+        assert os.path.basename(entry["save_dir"]).startswith(user_id)
+        assert entry["num_bytes"] == get_dir_size(entry["save_dir"]) > 0
+        assert entry["seconds"] > 0
+        assert len(load_user_from_files(entry["save_dir"]).glucose_timeline) > 0
+        total_bytes += entry["num_bytes"]
+
+    num_users = len(server.user_ids)
+    assert summary["num_users"] == summary["num_complete"] == num_users
+    assert summary["num_skipped"] == summary["num_failed"] == 0
+    assert summary["num_bytes"] == total_bytes
+    assert summary["users_per_sec"] == pytest.approx(num_users / summary["seconds"])
+    assert summary["mb_per_sec"] == pytest.approx(total_bytes / 1e6 / summary["seconds"])
+
+
+def test_resume_skips_completed_users(server, manifest_path, data_dir):
+    first_user_ids = server.user_ids[:2]
+    download_cohort(server, manifest_path, data_dir, user_ids=first_user_ids)
+    first_entries = load_manifest(manifest_path)["users"]
+
+    summary = download_cohort(server, manifest_path, data_dir)
+
+    manifest = load_manifest(manifest_path)
+    assert summary["num_skipped"] == len(first_user_ids)
+    assert summary["num_complete"] == len(server.user_ids) - len(first_user_ids)
+    assert all(entry["status"] == MANIFEST_STATUS_COMPLETE for entry in manifest["users"].values())
+    for user_id in first_user_ids:
+        assert manifest["users"][user_id] == first_entries[user_id]
+
+
+@pytest.mark.parametrize("retry_failed", [False, True])
+def test_resume_after_failures(server, manifest_path, data_dir, retry_failed):
+    with MockTidepoolServer(num_users=2, num_days=3, error_rate=1.0) as error_server:
+        summary = download_cohort_data("user", "pass", server.start_date, server.end_date, manifest_path,
+                                       user_ids=server.user_ids, data_dir=data_dir,
+                                       api_base_url=error_server.base_url)
+
+    assert summary["num_failed"] == len(server.user_ids)
+    assert summary["users_per_sec"] == summary["mb_per_sec"] == 0
+    manifest = load_manifest(manifest_path)
+    assert all(entry["status"] == MANIFEST_STATUS_FAILED and "error" in entry
+               for entry in manifest["users"].values())
+
+    summary = download_cohort(server, manifest_path, data_dir, retry_failed=retry_failed)
+
+    manifest = load_manifest(manifest_path)
+    if retry_failed:
+        assert summary["num_complete"] == len(server.user_ids)
+        assert all(entry["status"] == MANIFEST_STATUS_COMPLETE for entry in manifest["users"].values())
+    else:
+        assert summary["num_skipped"] == len(server.user_ids)
+        assert all(entry["status"] == MANIFEST_STATUS_FAILED for entry in manifest["users"].values())
+
+
+def test_manifest_for_other_dates_raises(server, manifest_path, data_dir):
+    download_cohort(server, manifest_path, data_dir, user_ids=server.user_ids[:1])
+
+    with pytest.raises(Exception):
+        download_cohort_data("user", "pass", server.start_date, server.end_date + dt.timedelta(days=1),
+                             manifest_path, data_dir=data_dir, api_base_url=server.base_url)
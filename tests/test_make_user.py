@@ -0,0 +1,230 @@
+"""
+Tests for merging downloads into user directories and partitioned user stores.
+"""
+
+import os
+import json
+import datetime as dt
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.make_user import (
+    merge_by_id, count_changed_items, merge_events_into_store, load_store_event_index, load_store_event_json,
+    get_store_partition_paths, get_partition_key, download_user_data, download_user_data_to_store, sync_user_data,
+    load_json_file, load_user_from_files, get_user_dir_name, STORE_EVENT_INDEX_FILENAME, EVENT_DATA_FILENAME,
+    NOTES_FILENAME, CREATION_META_FILENAME
+)
+from data_science_tidepool_api_python.makedata.compression import (
+    find_data_file, detect_compression, get_available_compressions
+)
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+from data_science_tidepool_api_python.util import DATESTAMP_FORMAT
+
+
+def make_data_dir(tmp_path, name):
+    data_dir = tmp_path / name
+    data_dir.mkdir()
+    return str(data_dir)
+
+
+def make_event(event_id, time, value=1):
+    return {"id": event_id, "type": "bolus", "time": time, "normal": value}
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockTidepoolServer(num_users=1, num_days=10) as mock_server:
+        yield mock_server
+
+
+def load_event_json(save_dir):
+    return load_json_file(find_data_file(os.path.join(save_dir, EVENT_DATA_FILENAME)))
+
+
+def download_full_event_ids(server, data_dir):
+    full_save_dir = download_user_data("user", "pass", server.start_date, server.end_date, user_id=server.user_ids[0],
+                                       data_dir=data_dir, api_base_url=server.base_url)
+    return sorted(event["id"] for event in load_event_json(full_save_dir))
+
+
+def download_partial(server, data_dir):
+    middle_date = server.start_date + dt.timedelta(days=4)
+    return download_user_data("user", "pass", server.start_date, middle_date, user_id=server.user_ids[0],
+                              data_dir=data_dir, api_base_url=server.base_url)
+
+
+def test_merge_by_id_keeps_new_versions_sorted():
+    stored = [make_event("a", "2020-01-01T00:00:00.000Z"), make_event("b", "2020-01-03T00:00:00.000Z")]
+    new = [make_event("b", "2020-01-02T00:00:00.000Z", value=2), make_event("c", "2020-01-04T00:00:00.000Z")]
+
+    merged = merge_by_id(stored, new, time_key="time")
+
+    assert [event["id"] for event in merged] == ["a", "b", "c"]
+    assert merged[1] == new[0]
+
+
+def test_merge_by_id_without_ids_uses_type_and_time():
+    stored = [{"type": "note", "timestamp": "2020-01-01", "text": "old"}]
+    new = [{"type": "note", "timestamp": "2020-01-01", "text": "new"},
+           {"type": "note", "timestamp": "2020-01-02", "text": "other"}]
+
+    assert merge_by_id(stored, new, time_key="timestamp") == new
+
+
+def test_count_changed_items():
+    stored = [make_event("a", "2020-01-01T00:00:00.000Z"), make_event("b", "2020-01-02T00:00:00.000Z")]
+    new = [make_event("a", "2020-01-01T00:00:00.000Z"), make_event("b", "2020-01-02T00:00:00.000Z", value=2),
+           make_event("c", "2020-01-03T00:00:00.000Z")]
+
+    assert count_changed_items(stored, new, time_key="time") == 2
+    assert count_changed_items(stored, stored, time_key="time") == 0
+
+
+def load_all_store_events(store_dir):
+    return [event for partition_path in get_store_partition_paths(store_dir).values()
+            for event in load_json_file(partition_path)]
+
+
+@pytest.mark.parametrize("partition_period", ["year", "month", "week", "day"])
+def test_merge_events_into_store_partitions_by_time(tmp_path, partition_period):
+    store_dir = str(tmp_path)
+    events = [make_event("e{}-{}".format(month, day), "2020-{:02d}-{:02d}T12:00:00.000Z".format(month, day))
+              for month in [1, 2] for day in [1, 15, 28]]
+    merge_events_into_store(store_dir, events, partition_period)
+
+    for partition_key, partition_path in get_store_partition_paths(store_dir).items():
+        for event in load_json_file(partition_path):
+            assert get_partition_key(event["time"], partition_period) == partition_key
+    assert sorted(load_all_store_events(store_dir), key=lambda event: event["time"]) == events
+
+
+def test_merge_events_into_store_moves_edited_event(tmp_path):
+    store_dir = str(tmp_path)
+    merge_events_into_store(store_dir, [make_event("a", "2020-01-31T23:00:00.000Z"),
+                                        make_event("b", "2020-01-15T00:00:00.000Z")], "month")
+    moved_event = make_event("a", "2020-02-01T01:00:00.000Z", value=2)
+    merge_events_into_store(store_dir, [moved_event], "month")
+
+    stored_events = load_all_store_events(store_dir)
+    assert sorted(event["id"] for event in stored_events) == ["a", "b"]
+    assert moved_event in stored_events
+    assert load_store_event_index(store_dir) == {"a": "2020-02", "b": "2020-01"}
+
+
+def test_load_store_event_index_rebuilds_missing_index(tmp_path):
+    store_dir = str(tmp_path)
+    merge_events_into_store(store_dir, [make_event("a", "2020-01-01T00:00:00.000Z"),
+                                        make_event("b", "2020-03-01T00:00:00.000Z")], "month")
+    event_index = load_store_event_index(store_dir)
+    os.remove(os.path.join(store_dir, STORE_EVENT_INDEX_FILENAME))
+
+    assert load_store_event_index(store_dir) == event_index
+
+
+def test_store_download_matches_full_download(server, tmp_path):
+    user_id = server.user_ids[0]
+    download_kwargs = dict(user_id=user_id, partition_period="week", data_dir=str(tmp_path),
+                           api_base_url=server.base_url)
+
+    # Overlapping ranges are merged into one copy of each event
+    middle_date = server.start_date + dt.timedelta(days=6)
+    download_user_data_to_store("user", "pass", server.start_date, middle_date, **download_kwargs)
+    store_dir = download_user_data_to_store("user", "pass", middle_date - dt.timedelta(days=2), server.end_date,
+                                            **download_kwargs)
+
+    full_save_dir = download_user_data("user", "pass", server.start_date, server.end_date, user_id=user_id,
+                                       data_dir=str(tmp_path), api_base_url=server.base_url)
+
+    def sort_events(events):
+        return sorted(events, key=lambda event: (event["time"], event["id"]))
+
+    assert sort_events(load_store_event_json(store_dir)) == sort_events(load_event_json(full_save_dir))
+
+    range_start = server.start_date + dt.timedelta(days=3)
+    range_end = server.start_date + dt.timedelta(days=4)
+    range_events = load_store_event_json(store_dir, range_start, range_end)
+    assert len(range_events) > 0
+    assert all("2020-01-04" <= event["time"] < "2020-01-06" for event in range_events)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize("compression", get_available_compressions())
+def test_compressed_download_matches_uncompressed(server, tmp_path, compression, stream):
+    plain_save_dir = download_user_data("user", "pass", server.start_date, server.end_date,
+                                        user_id=server.user_ids[0], data_dir=make_data_dir(tmp_path, "plain"),
+                                        api_base_url=server.base_url)
+    save_dir = download_user_data("user", "pass", server.start_date, server.end_date, user_id=server.user_ids[0],
+                                  stream=stream, compression=compression, data_dir=make_data_dir(tmp_path, "packed"),
+                                  api_base_url=server.base_url)
+
+    for filename in [EVENT_DATA_FILENAME, NOTES_FILENAME]:
+        data_path = find_data_file(os.path.join(save_dir, filename))
+        assert detect_compression(data_path) == compression
+        assert load_json_file(data_path) == load_json_file(find_data_file(os.path.join(plain_save_dir, filename)))
+
+    plain_user = load_user_from_files(plain_save_dir, use_columns=False, use_cache=False)
+    user = load_user_from_files(save_dir, use_columns=False, use_cache=False)
+    assert len(user.glucose_timeline) == len(plain_user.glucose_timeline) > 0
+
+
+def test_sync_matches_full_download(server, tmp_path):
+    save_dir = download_partial(server, make_data_dir(tmp_path, "synced"))
+    num_partial_events = len(load_event_json(save_dir))
+
+    synced_dir, num_new_events = sync_user_data("user", "pass", save_dir, end_date=server.end_date,
+                                                api_base_url=server.base_url)
+    synced_event_ids = sorted(event["id"] for event in load_event_json(synced_dir))
+    full_event_ids = download_full_event_ids(server, make_data_dir(tmp_path, "full"))
+
+    assert synced_event_ids == full_event_ids
+    assert num_new_events == len(full_event_ids) - num_partial_events
+    assert sync_user_data("user", "pass", synced_dir, end_date=server.end_date,
+                          api_base_url=server.base_url) == (synced_dir, 0)
+
+    creation_metadata = json.load(open(os.path.join(synced_dir, CREATION_META_FILENAME)))
+    assert creation_metadata["data_end_date"] == server.end_date.strftime(DATESTAMP_FORMAT)
+
+
+def test_sync_renames_dir_to_new_date_range(server, tmp_path):
+    save_dir = download_partial(server, str(tmp_path))
+
+    synced_dir, _ = sync_user_data("user", "pass", save_dir, end_date=server.end_date, api_base_url=server.base_url)
+
+    assert not os.path.exists(save_dir)
+    assert synced_dir == os.path.join(str(tmp_path), get_user_dir_name(server.user_ids[0], server.start_date,
+                                                                       server.end_date))
+    assert os.listdir(str(tmp_path)) == [os.path.basename(synced_dir)]
+
+
+def test_sync_keeps_custom_dir_name(server, tmp_path):
+    save_dir = download_partial(server, str(tmp_path))
+    custom_dir = os.path.join(str(tmp_path), "custom")
+    os.rename(save_dir, custom_dir)
+
+    synced_dir, _ = sync_user_data("user", "pass", custom_dir, end_date=server.end_date, api_base_url=server.base_url)
+
+    assert synced_dir == custom_dir
+
+
+def test_sync_refuses_to_rename_over_existing_dir(server, tmp_path):
+    save_dir = download_partial(server, str(tmp_path))
+    os.makedirs(os.path.join(str(tmp_path), get_user_dir_name(server.user_ids[0], server.start_date,
+                                                              server.end_date)))
+
+    with pytest.raises(Exception):
+        sync_user_data("user", "pass", save_dir, end_date=server.end_date, api_base_url=server.base_url)
+    assert os.path.isdir(save_dir)
+
+
+@pytest.mark.parametrize("missing_filename", [EVENT_DATA_FILENAME, NOTES_FILENAME])
+def test_sync_with_missing_file_downloads_full_range(server, tmp_path, missing_filename):
+    save_dir = download_partial(server, make_data_dir(tmp_path, "synced"))
+    os.remove(find_data_file(os.path.join(save_dir, missing_filename)))
+
+    synced_dir, num_new_events = sync_user_data("user", "pass", save_dir, end_date=server.end_date,
+                                                api_base_url=server.base_url)
+    full_event_ids = download_full_event_ids(server, make_data_dir(tmp_path, "full"))
+
+    assert sorted(event["id"] for event in load_event_json(synced_dir)) == full_event_ids
+    assert num_new_events == len(full_event_ids)
+    assert os.path.isfile(find_data_file(os.path.join(synced_dir, NOTES_FILENAME)))
@@ -0,0 +1,140 @@
+"""
+Tests for the on-disk response cache and its use by TidepoolAPI.
+"""
+
+import os
+import time
+import datetime as dt
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.response_cache import (
+    ResponseCache, DEFAULT_RESPONSE_TTL_SEC, CACHE_FILE_EXTENSION
+)
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+BODY = b"x" * 100
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return os.path.join(str(tmp_path), "response_cache")
+
+
+def get_entry_size(body):
+    return len(b'{"expires_at": null}\n') + len(body)
+
+
+def test_get_returns_set_body(cache_dir):
+    response_cache = ResponseCache(cache_dir)
+    key = response_cache.get_key("notes", "observer", "https://api.example.org/message/notes/user1")
+
+    assert response_cache.get(key) is None
+    response_cache.set(key, BODY)
+
+    assert response_cache.get(key) == BODY
+    assert response_cache.get_stats()["hits"] == 1
+    assert response_cache.get_stats()["misses"] == 1
+
+
+def test_keys_differ_by_endpoint_account_and_url():
+    keys = {
+        ResponseCache.get_key("notes", "observer", "url"),
+        ResponseCache.get_key("user_data", "observer", "url"),
+        ResponseCache.get_key("notes", "other", "url"),
+        ResponseCache.get_key("notes", "observer", "other url"),
+    }
+
+    assert len(keys) == 4
+
+
+def test_least_recently_used_entry_is_evicted(cache_dir):
+    response_cache = ResponseCache(cache_dir, max_bytes=3 * get_entry_size(BODY))
+    for key in ["a", "b", "c"]:
+        response_cache.set(key, BODY)
+    assert response_cache.get("a") == BODY
+
+    response_cache.set("d", BODY)
+
+    assert response_cache.get("b") is None
+    assert all(response_cache.get(key) == BODY for key in ["a", "c", "d"])
+    stats = response_cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["num_entries"] == 3
+    assert stats["num_bytes"] == 3 * get_entry_size(BODY)
+    assert len([name for name in os.listdir(cache_dir) if name.endswith(CACHE_FILE_EXTENSION)]) == 3
+
+
+def test_reopened_cache_keeps_lru_order(cache_dir):
+    response_cache = ResponseCache(cache_dir, max_bytes=2 * get_entry_size(BODY))
+    response_cache.set("a", BODY)
+    response_cache.set("b", BODY)
+    time.sleep(0.01)
+    assert response_cache.get("a") == BODY
+
+    reopened_cache = ResponseCache(cache_dir, max_bytes=2 * get_entry_size(BODY))
+    assert reopened_cache.get_stats()["num_bytes"] == 2 * get_entry_size(BODY)
+    reopened_cache.set("c", BODY)
+
+    assert reopened_cache.get("b") is None
+    assert reopened_cache.get("a") == BODY
+
+
+def test_entries_expire_after_ttl(cache_dir):
+    response_cache = ResponseCache(cache_dir)
+    response_cache.set("a", BODY, ttl_sec=0.05)
+    response_cache.set("b", BODY, ttl_sec=None)
+    assert response_cache.get("a") == BODY
+
+    time.sleep(0.1)
+
+    assert response_cache.get("a") is None
+    assert response_cache.get("b") == BODY
+    assert response_cache.get_stats()["num_entries"] == 1
+
+
+def test_historical_ranges_never_expire(cache_dir):
+    response_cache = ResponseCache(cache_dir, ttl_sec={"notes": 5}, historical_after_days=30)
+    now = dt.datetime.now()
+
+    assert response_cache.get_ttl_sec("user_data", now - dt.timedelta(days=60)) is None
+    assert response_cache.get_ttl_sec("notes", now - dt.timedelta(days=31)) is None
+    assert response_cache.get_ttl_sec("user_data", now - dt.timedelta(days=5)) == DEFAULT_RESPONSE_TTL_SEC["user_data"]
+    assert response_cache.get_ttl_sec("notes", now - dt.timedelta(days=5)) == 5
+    assert response_cache.get_ttl_sec("users_sharing_with") == DEFAULT_RESPONSE_TTL_SEC["users_sharing_with"]
+
+
+def test_clear_removes_entries(cache_dir):
+    response_cache = ResponseCache(cache_dir)
+    response_cache.set("a", BODY)
+    response_cache.clear()
+
+    assert response_cache.get("a") is None
+    assert response_cache.get_stats()["num_bytes"] == 0
+
+
+def test_cache_hit_makes_no_request(cache_dir):
+    response_cache = ResponseCache(cache_dir)
+    with MockTidepoolServer(num_users=2, num_days=3) as server:
+        tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url, response_cache=response_cache)
+        tp_api.login()
+
+        def get_responses():
+            user_id = server.user_ids[0]
+            return (tp_api.get_user_event_data(server.start_date, server.end_date, observed_user_id=user_id),
+                    tp_api.get_notes(server.start_date, server.end_date, observed_user_id=user_id),
+                    tp_api.get_users_sharing_with())
+
+        responses = get_responses()
+        num_requests = server.num_requests
+        cached_responses = get_responses()
+
+        assert server.num_requests == num_requests
+        tp_api.logout()
+        tp_api.close()
+
+    assert cached_responses == responses
+    assert len(responses[0]) > 0
+    assert response_cache.get_stats()["hits"] == 3
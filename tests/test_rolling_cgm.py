@@ -0,0 +1,121 @@
+"""
+Tests for RollingCGMMetrics against rescanning the window at every sample.
+"""
+
+import random
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from data_science_tidepool_api_python.models.rolling_cgm import RollingCGMMetrics, METRIC_NAMES, MS_PER_HOUR
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser
+from data_science_tidepool_api_python.models.tidepool_timeline import TidepoolTimeline
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+
+def make_random_cgm(seed, num_samples=600):
+    rng = random.Random(seed)
+    times = []
+    values = []
+    time = dt.datetime(2020, 1, 1)
+    value = 120.0
+    for _ in range(num_samples):
+        # Mostly 5 minute readings with duplicates in value and occasional gaps
+        time += dt.timedelta(minutes=rng.choice([5, 5, 5, 5, 10, 60]))
+        value = min(max(value + rng.choice([-25, -10, 0, 0, 10, 25]), 40.0), 400.0)
+        times.append(time)
+        values.append(value)
+    return np.array(times, dtype="datetime64[ms]"), np.array(values)
+
+
+def count_episodes_rescan(times_ms, is_in_episode, end_index, window_start_ms, min_duration_ms):
+    episode_starts_ms = []
+    run_start_ms = None
+    for time_ms, is_in in zip(times_ms[:end_index + 1], is_in_episode[:end_index + 1]):
+        if not is_in:
+            run_start_ms = None
+            continue
+        if run_start_ms is None:
+            run_start_ms = time_ms
+        if time_ms - run_start_ms >= min_duration_ms and run_start_ms not in episode_starts_ms:
+            episode_starts_ms.append(run_start_ms)
+    return sum(start_ms > window_start_ms for start_ms in episode_starts_ms)
+
+
+def compute_metrics_rescan(times, values, window_hours, min_episode_minutes=15):
+    times_ms = times.astype(np.int64)
+    window_ms = window_hours * MS_PER_HOUR
+    min_duration_ms = min_episode_minutes * 60 * 1000
+
+    rows = []
+    for i, time_ms in enumerate(times_ms):
+        window_start_ms = time_ms - window_ms
+        in_window = (times_ms > window_start_ms) & (times_ms <= time_ms)
+        window_values = values[in_window]
+        mean = window_values.mean()
+        rows.append({
+            "num_samples": len(window_values),
+            "mean": mean,
+            "std": window_values.std(),
+            "cv": window_values.std() / mean,
+            "min": window_values.min(),
+            "max": window_values.max(),
+            "time_very_low": np.mean(window_values < 54),
+            "time_below_range": np.mean(window_values < 70),
+            "time_in_range": np.mean((window_values >= 70) & (window_values <= 180)),
+            "time_above_range": np.mean(window_values > 180),
+            "time_very_high": np.mean(window_values > 250),
+            "num_hypo_episodes": count_episodes_rescan(times_ms, values < 70, i, window_start_ms, min_duration_ms),
+            "num_hyper_episodes": count_episodes_rescan(times_ms, values > 180, i, window_start_ms, min_duration_ms),
+        })
+    return rows
+
+
+@pytest.mark.parametrize("seed, window_hours", [(0, 1), (1, 3), (2, 24)])
+def test_batch_and_streaming_match_rescan(seed, window_hours):
+    times, values = make_random_cgm(seed)
+    expected_rows = compute_metrics_rescan(times, values, window_hours)
+
+    batch_metrics = RollingCGMMetrics(window_hours).compute(times, values)
+    engine = RollingCGMMetrics(window_hours)
+    streaming_rows = [engine.update(time, value) for time, value in zip(times, values)]
+
+    assert set(batch_metrics) == set(METRIC_NAMES)
+    for i, expected_row in enumerate(expected_rows):
+        for metric_name, expected_value in expected_row.items():
+            assert batch_metrics[metric_name][i] == pytest.approx(expected_value, abs=1e-9), metric_name
+            assert streaming_rows[i][metric_name] == pytest.approx(expected_value, abs=1e-9), metric_name
+        assert batch_metrics["gmi"][i] == pytest.approx(3.31 + 0.02392 * expected_row["mean"])
+
+
+def test_compute_continues_from_updates():
+    times, values = make_random_cgm(3, num_samples=200)
+
+    engine = RollingCGMMetrics(2)
+    for time, value in zip(times[:50], values[:50]):
+        engine.update(time, value)
+    continued_metrics = engine.compute(times[50:], values[50:])
+
+    all_metrics = RollingCGMMetrics(2).compute(times, values)
+    for metric_name in METRIC_NAMES:
+        np.testing.assert_allclose(continued_metrics[metric_name], all_metrics[metric_name][50:])
+
+
+def test_out_of_order_samples_raise():
+    engine = RollingCGMMetrics()
+    engine.update(dt.datetime(2020, 1, 1, 1), 100)
+
+    with pytest.raises(Exception):
+        engine.update(dt.datetime(2020, 1, 1), 100)
+
+
+def test_user_metrics_from_items_timeline():
+    user = TidepoolUser(make_synthetic_user_events(3))
+    expected_metrics = user.get_rolling_cgm_metrics(window_hours=6)
+
+    user.glucose_timeline = TidepoolTimeline.from_items(user.glucose_timeline.items())
+    metrics = user.get_rolling_cgm_metrics(window_hours=6)
+
+    np.testing.assert_array_equal(metrics["time"], expected_metrics["time"])
+    np.testing.assert_allclose(metrics["mean"], expected_metrics["mean"])
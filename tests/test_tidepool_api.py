@@ -0,0 +1,69 @@
+"""
+Tests for TidepoolAPI downloads against the local mock server.
+"""
+
+import os
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI
+from data_science_tidepool_api_python.makedata.json_stream import iter_json_array_file
+from data_science_tidepool_api_python.makedata.compression import (
+    get_available_compressions, get_compressed_path, detect_compression
+)
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockTidepoolServer(num_users=2, num_days=10) as mock_server:
+        yield mock_server
+
+
+@pytest.fixture
+def tp_api(server):
+    tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url)
+    tp_api.login()
+    yield tp_api
+    tp_api.logout()
+    tp_api.close()
+
+
+def get_plain_events(tp_api, server):
+    user_id = server.user_ids[0]
+    return tp_api.get_user_event_data(server.start_date, server.end_date, observed_user_id=user_id)
+
+
+def sort_events(events):
+    return sorted(events, key=lambda event: (event["time"], event["id"]))
+
+
+@pytest.mark.parametrize("window_days", [1, 3, 7, 30])
+def test_windowed_download_matches_plain(server, tp_api, window_days):
+    plain_events = get_plain_events(tp_api, server)
+    windowed_events = tp_api.get_user_event_data(server.start_date, server.end_date,
+                                                 observed_user_id=server.user_ids[0], window_days=window_days)
+
+    assert len(plain_events) > 0
+    assert len({event["id"] for event in windowed_events}) == len(windowed_events)
+    assert [event["time"] for event in windowed_events] == sorted(event["time"] for event in windowed_events)
+    assert sort_events(windowed_events) == sort_events(plain_events)
+
+
+def test_streamed_download_matches_plain(server, tp_api):
+    plain_events = get_plain_events(tp_api, server)
+    streamed_events = tp_api.get_user_event_data(server.start_date, server.end_date,
+                                                 observed_user_id=server.user_ids[0], stream=True)
+
+    assert list(streamed_events) == plain_events
+
+
+@pytest.mark.parametrize("compression", get_available_compressions())
+def test_download_to_file_matches_plain(server, tp_api, tmp_path, compression):
+    plain_events = get_plain_events(tp_api, server)
+    path = get_compressed_path(os.path.join(str(tmp_path), "event_data.json"), compression)
+    tp_api.download_user_event_data(server.start_date, server.end_date, path, observed_user_id=server.user_ids[0],
+                                    compression=compression)
+
+    assert detect_compression(path) == compression
+    assert list(iter_json_array_file(path)) == plain_events
@@ -0,0 +1,113 @@
+"""
+Tests for TidepoolTimeline range queries and prefix sum window totals against scans of the events.
+"""
+
+import random
+import datetime as dt
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from data_science_tidepool_api_python.models.tidepool_timeline import TidepoolTimeline, to_datetime64
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolBolus
+
+START_TIME = dt.datetime(2020, 1, 1)
+
+
+def make_random_items(seed, num_events=300):
+    rng = random.Random(seed)
+    items = OrderedDict()
+    for _ in range(num_events):
+        # Whole minutes so window edges often land exactly on events
+        time = START_TIME + dt.timedelta(minutes=rng.randint(0, 10 * 24 * 60))
+        items[time] = TidepoolBolus(round(rng.uniform(0.1, 10), 2), "Units")
+    return sorted(items.items())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_range_queries_match_scan(seed):
+    items = make_random_items(seed)
+    timeline = TidepoolTimeline.from_items(items)
+    rng = random.Random(seed)
+
+    for _ in range(50):
+        start_time = START_TIME + dt.timedelta(minutes=rng.randint(-60, 11 * 24 * 60))
+        end_time = start_time + dt.timedelta(minutes=rng.randint(0, 3 * 24 * 60))
+        expected_items = [(time, event) for time, event in items if start_time <= time <= end_time]
+
+        start_index, end_index = timeline.get_index_range(start_time, end_time)
+        assert end_index - start_index == len(expected_items)
+        assert timeline.get_times(start_time, end_time).tolist() == [time for time, _ in expected_items]
+        assert timeline.get_values(start_time, end_time).tolist() == pytest.approx(
+            [event.get_value() for _, event in expected_items])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_totals_matches_scan(seed):
+    items = make_random_items(seed)
+    timeline = TidepoolTimeline.from_items(items)
+    rng = random.Random(seed)
+
+    start_times = [START_TIME + dt.timedelta(minutes=rng.randint(-60, 11 * 24 * 60)) for _ in range(100)]
+    end_times = [start_time + dt.timedelta(minutes=rng.randint(0, 3 * 24 * 60)) for start_time in start_times]
+
+    totals, counts = timeline.get_totals(("value",), start_times, end_times)
+
+    for start_time, end_time, total, count in zip(start_times, end_times, totals, counts):
+        values = [event.get_value() for time, event in items if start_time <= time <= end_time]
+        assert total == pytest.approx(sum(values))
+        assert count == len(values)
+
+
+def test_get_totals_single_window_and_product_columns():
+    timeline = TidepoolTimeline(np.array([0, 1000, 2000], dtype=np.int64),
+                                {"value": np.array([1.0, 2.0, 3.0]), "duration_hours": np.array([2.0, 0.5, 1.0])},
+                                lambda *row: row)
+
+    total, count = timeline.get_totals(("value", "duration_hours"), np.datetime64(1000, "ms"),
+                                       np.datetime64(2000, "ms"))
+
+    assert total == pytest.approx(2.0 * 0.5 + 3.0 * 1.0)
+    assert count == 2
+
+
+def test_get_index_range_sub_millisecond_edges():
+    timeline = TidepoolTimeline(np.array([0, 1, 2], dtype=np.int64), {"value": np.array([1.0, 2.0, 3.0])},
+                                lambda *row: row)
+    epoch = dt.datetime(1970, 1, 1)
+
+    # A start just after an event excludes it and an end just after an event includes it
+    assert timeline.get_index_range(epoch + dt.timedelta(microseconds=500),
+                                    epoch + dt.timedelta(microseconds=1500)) == (1, 2)
+    assert timeline.get_index_range(epoch + dt.timedelta(milliseconds=3)) == (3, 3)
+    assert timeline.get_index_range(end_time=epoch - dt.timedelta(milliseconds=1)) == (0, 0)
+
+
+def test_unsorted_times_keep_last_of_duplicates():
+    times = np.array(["2020-01-02", "2020-01-01", "2020-01-02"], dtype="datetime64[ms]")
+    timeline = TidepoolTimeline(times, {"value": np.array([1.0, 2.0, 3.0])}, lambda value: value)
+
+    assert timeline.get_values().tolist() == [2.0, 3.0]
+    assert timeline[dt.datetime(2020, 1, 2)] == 3.0
+
+
+def test_mapping_view_matches_items():
+    items = make_random_items(0, num_events=20)
+    timeline = TidepoolTimeline.from_items(items)
+
+    assert timeline.items() == items
+    assert list(timeline) == [time for time, _ in items]
+    assert items[5][0] in timeline
+    assert items[5][0] + dt.timedelta(seconds=1) not in timeline
+    assert timeline.get(items[5][0] + dt.timedelta(seconds=1)) is None
+
+
+def test_get_day_bins():
+    times = to_datetime64([START_TIME + dt.timedelta(hours=hours) for hours in [-1, 0, 23.5, 24, 47, 48]])
+    timeline = TidepoolTimeline(times, {"value": np.ones(len(times))}, lambda value: value)
+
+    day_indices, day_slice = timeline.get_day_bins(START_TIME, 2)
+
+    assert day_indices.tolist() == [0, 0, 1, 1]
+    assert (day_slice.start, day_slice.stop) == (1, 5)
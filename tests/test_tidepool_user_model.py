@@ -0,0 +1,232 @@
+"""
+Tests for TidepoolUser analysis methods against the per-event loops they replaced.
+"""
+
+import sys
+import pickle
+import random
+import datetime as dt
+from collections import defaultdict
+from operator import itemgetter
+
+import numpy as np
+import pytest
+from scipy.stats import gmean, gstd
+
+from data_science_tidepool_api_python.models.tidepool_user_model import (
+    TidepoolUser, TidepoolCGMGlucoseMeasurement, TidepoolManualGlucoseMeasurement, TidepoolFood, TidepoolBasal,
+    TidepoolBolus, TidepoolTimeChange, TidepoolNote, TIMELINE_COLUMNS
+)
+from data_science_tidepool_api_python.models.event_columns import events_to_columns
+from data_science_tidepool_api_python.benchmarks.synthetic_data import (
+    make_synthetic_user_events, format_api_time, DEFAULT_SYNTHETIC_START_DATE
+)
+
+
+def make_food_events(times):
+    return [{
+        "id": "food{}".format(i),
+        "type": "food",
+        "time": format_api_time(time),
+        "nutrition": {"carbohydrate": {"net": 30, "units": "grams"}},
+    } for i, time in enumerate(times)]
+
+
+def detect_circadian_hr_loop(user, start_time=dt.datetime.min, end_time=dt.datetime.max, win_radius=3):
+    """
+    The previous dict count, for comparison.
+    """
+    carb_times = user.food_timeline.get_times(start_time, end_time).tolist()
+
+    hour_ctr = defaultdict(int)
+    for carb_time in carb_times:
+        for radius in range(-win_radius, win_radius + 1):
+            hour_ctr[(carb_time.hour + radius) % 24] += 1
+
+    min_hr, _ = min(hour_ctr.items(), key=itemgetter(1))
+    return min_hr
+
+
+@pytest.mark.parametrize("win_radius", [0, 1, 3, 11, 12, 30])
+def test_detect_circadian_hr_matches_loop_on_synthetic_user(win_radius):
+    user = TidepoolUser(make_synthetic_user_events(30))
+
+    assert user.detect_circadian_hr(win_radius=win_radius) == detect_circadian_hr_loop(user, win_radius=win_radius)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_detect_circadian_hr_matches_loop_on_random_intakes(seed):
+    rng = random.Random(seed)
+    times = [DEFAULT_SYNTHETIC_START_DATE + dt.timedelta(minutes=rng.randint(0, 10 * 24 * 60))
+             for _ in range(rng.randint(1, 12))]
+    user = TidepoolUser(make_food_events(times))
+    win_radius = rng.randint(0, 4)
+
+    assert user.detect_circadian_hr(win_radius=win_radius) == detect_circadian_hr_loop(user, win_radius=win_radius)
+
+
+def test_detect_circadian_hr_skips_hours_without_carbs_nearby():
+    # Meals at 7 and 18 reach hours 4-10 and 15-21, so midnight is never a candidate
+    times = [DEFAULT_SYNTHETIC_START_DATE + dt.timedelta(days=day, hours=hour)
+             for day in range(3) for hour in [7, 18]]
+    user = TidepoolUser(make_food_events(times))
+
+    assert detect_circadian_hr_loop(user) == 4
+    assert user.detect_circadian_hr() == 4
+
+
+def test_detect_circadian_hr_with_time_range_and_cache():
+    user = TidepoolUser(make_synthetic_user_events(30))
+    start_time = DEFAULT_SYNTHETIC_START_DATE + dt.timedelta(days=10)
+    end_time = start_time + dt.timedelta(days=5)
+
+    expected = detect_circadian_hr_loop(user, start_time, end_time)
+    assert user.detect_circadian_hr(start_time, end_time) == expected
+    assert user.detect_circadian_hr(start_time, end_time) == expected
+
+
+def test_detect_circadian_hr_without_carbs():
+    assert TidepoolUser([]).detect_circadian_hr() == 0
+
+
+def compute_daily_stats_scan(user, start_date, end_date, circadian_hour):
+    """
+    Daily totals and cgm stats by scanning the events of each day, for comparison.
+    """
+    num_days = int((end_date - start_date).total_seconds() / 3600 / 24)
+    first_day_start = dt.datetime(start_date.year, start_date.month, start_date.day, circadian_hour)
+
+    daily_stats = []
+    for i in range(num_days):
+        day_start = first_day_start + dt.timedelta(days=i)
+        day_end = day_start + dt.timedelta(days=1)
+
+        def get_day_values(timeline):
+            return [event.get_value() for time, event in timeline.items() if day_start <= time < day_end]
+
+        total_basal = 0.0
+        for time, event in user.basal_timeline.items():
+            segment_end = time + dt.timedelta(hours=event.get_duration_hours())
+            overlap_hours = (min(segment_end, day_end) - max(time, day_start)).total_seconds() / 3600
+            total_basal += event.get_value() * max(overlap_hours, 0.0)
+
+        cgm_values = get_day_values(user.glucose_timeline)
+        daily_stats.append({
+            "date": day_start,
+            "total_bolus": sum(get_day_values(user.bolus_timeline)),
+            "total_basal": total_basal,
+            "total_carbs": sum(get_day_values(user.food_timeline)),
+            "cgm_geo_mean": gmean(cgm_values) if cgm_values else np.nan,
+            "cgm_geo_std": gstd(cgm_values) if len(cgm_values) > 1 else np.nan,
+        })
+
+    return daily_stats
+
+
+@pytest.mark.parametrize("use_circadian", [True, False])
+def test_compute_daily_stats_matches_scan(use_circadian):
+    user = TidepoolUser(make_synthetic_user_events(20))
+    start_date = DEFAULT_SYNTHETIC_START_DATE - dt.timedelta(days=1)
+    end_date = DEFAULT_SYNTHETIC_START_DATE + dt.timedelta(days=21)
+    circadian_hour = user.detect_circadian_hr() if use_circadian else 0
+
+    daily_stats = user.compute_daily_stats(start_date, end_date, use_circadian=use_circadian)
+    expected_daily_stats = compute_daily_stats_scan(user, start_date, end_date, circadian_hour)
+
+    assert len(daily_stats) == len(expected_daily_stats) == 22
+    for day_stats, expected_day_stats in zip(daily_stats, expected_daily_stats):
+        assert day_stats["date"] == expected_day_stats.pop("date")
+        for stat_name, expected_value in expected_day_stats.items():
+            assert day_stats[stat_name] == pytest.approx(expected_value, nan_ok=True), stat_name
+        assert day_stats["total_insulin"] == pytest.approx(day_stats["total_bolus"] + day_stats["total_basal"])
+        assert day_stats["residual_cgm"] == pytest.approx(day_stats["cgm_geo_mean"] - 100, nan_ok=True)
+
+
+def count_calls(monkeypatch, name):
+    """
+    Count calls to a static parser of TidepoolUser.
+    """
+    parser = getattr(TidepoolUser, name)
+    num_calls = [0]
+
+    def counted_parser(*args, **kwargs):
+        num_calls[0] += 1
+        return parser(*args, **kwargs)
+
+    monkeypatch.setattr(TidepoolUser, name, staticmethod(counted_parser))
+    return num_calls
+
+
+@pytest.mark.parametrize("from_columns", [False, True])
+def test_timelines_are_parsed_once_on_first_access(monkeypatch, from_columns):
+    num_glucose_parses = count_calls(monkeypatch, "parse_glucose_columns_v1" if from_columns
+                                     else "parse_glucose_events_v1")
+    events = make_synthetic_user_events(3)
+    if from_columns:
+        user = TidepoolUser.from_event_columns(events_to_columns(events, skip_unknown=True))
+    else:
+        user = TidepoolUser(events)
+
+    assert num_glucose_parses[0] == 0
+    assert not any(user.is_timeline_parsed(timeline_name) for timeline_name in TIMELINE_COLUMNS)
+
+    glucose_timeline = user.glucose_timeline
+    assert len(glucose_timeline) > 0
+    assert user.is_timeline_parsed("glucose_timeline")
+    assert not user.is_timeline_parsed("bolus_timeline")
+
+    assert user.glucose_timeline is glucose_timeline
+    assert user.get_timeline("glucose_timeline") is glucose_timeline
+    assert num_glucose_parses[0] == 1
+
+
+def test_missing_timeline_is_empty_and_parsed():
+    user = TidepoolUser(make_food_events([DEFAULT_SYNTHETIC_START_DATE]))
+
+    assert len(user.bolus_timeline) == 0
+    assert user.is_timeline_parsed("bolus_timeline")
+    assert not user.is_timeline_parsed("food_timeline")
+
+
+SLOTTED_EVENTS = [
+    TidepoolCGMGlucoseMeasurement(5.5, "mmol/L"),
+    TidepoolManualGlucoseMeasurement(110.0, "mg/dL"),
+    TidepoolFood(30.0, "grams"),
+    TidepoolBasal(0.8, "Units/hour", 1.5),
+    TidepoolBolus(2.5, "Units"),
+    TidepoolTimeChange("America/Los_Angeles", "America/New_York"),
+    TidepoolNote(dt.datetime(2020, 1, 1), dt.datetime(2020, 1, 2), "#exercise run"),
+]
+
+
+def get_slot_values(obj):
+    return {slot: getattr(obj, slot) for cls in type(obj).__mro__ for slot in getattr(cls, "__slots__", ())}
+
+
+@pytest.mark.parametrize("event", SLOTTED_EVENTS, ids=lambda event: type(event).__name__)
+def test_slotted_events_pickle_and_compare_as_before(event):
+    assert not hasattr(event, "__dict__")
+
+    unpickled_event = pickle.loads(pickle.dumps(event))
+
+    assert type(unpickled_event) is type(event)
+    assert get_slot_values(unpickled_event) == get_slot_values(event)
+    # No __eq__ is defined, so events compare by identity as they did before slots
+    assert event == event
+    assert unpickled_event != event
+
+
+def test_units_and_time_zones_are_interned():
+    units = "".join(["mg/", "dL"])
+    time_zone = "".join(["UTC", "+1"])
+
+    assert TidepoolBolus(1.0, units).units is sys.intern(units)
+    assert TidepoolTimeChange(time_zone, time_zone).to_tz is sys.intern(time_zone)
+
+
+@pytest.mark.parametrize("units", [None, 1, b"Units"])
+def test_non_str_units_are_kept(units):
+    assert TidepoolBolus(1.0, units).units is units
+    time_change = TidepoolTimeChange(None, units)
+    assert time_change.from_tz is None
+    assert time_change.to_tz is units
@@ -0,0 +1,198 @@
+"""
+Tests for the memory-mapped timeline cache and its use by load_user_from_files.
+"""
+
+import os
+import json
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from data_science_tidepool_api_python.models.tidepool_user_model import TidepoolUser, TIMELINE_COLUMNS
+from data_science_tidepool_api_python.models.timeline_cache import (
+    save_timeline_cache, load_timeline_cache, is_timeline_cache_valid, load_array, TIMELINE_CACHE_DIRNAME,
+    TIMELINE_CACHE_META_FILENAME
+)
+from data_science_tidepool_api_python.makedata import make_user
+from data_science_tidepool_api_python.makedata.make_user import (
+    save_user_data, load_user_from_files, EVENT_DATA_FILENAME
+)
+from data_science_tidepool_api_python.benchmarks.synthetic_data import make_synthetic_user_events
+
+
+@pytest.fixture
+def events():
+    return make_synthetic_user_events(5)
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = os.path.join(str(tmp_path), EVENT_DATA_FILENAME)
+    with open(path, "w") as file_to_write:
+        file_to_write.write("[1, 2, 3]")
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return os.path.join(str(tmp_path), TIMELINE_CACHE_DIRNAME)
+
+
+@pytest.fixture
+def save_dir(tmp_path, events):
+    return save_user_data("user1", events, {"messages": []}, dt.datetime(2020, 1, 1), dt.datetime(2020, 1, 5),
+                          data_dir=str(tmp_path))
+
+
+def make_timeline_arrays():
+    return {
+        "bolus": {"time": np.arange(5, dtype=np.int64), "value": np.linspace(0, 1, 5)},
+        "food": {"time": np.array([], dtype=np.int64), "value": np.array([], dtype=np.float64)},
+    }
+
+
+def assert_users_equal(user, expected_user):
+    for timeline_name, (column_names, _) in TIMELINE_COLUMNS.items():
+        timeline = user.get_timeline(timeline_name)
+        expected_timeline = expected_user.get_timeline(timeline_name)
+
+        np.testing.assert_array_equal(timeline.times, expected_timeline.times)
+        for column_name in column_names:
+            np.testing.assert_array_equal(timeline.columns[column_name], expected_timeline.columns[column_name])
+
+
+def is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def rewrite_keeping_mtime(path, content):
+    stat = os.stat(path)
+    with open(path, "w") as file_to_write:
+        file_to_write.write(content)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_load_maps_saved_arrays_read_only(cache_dir, source_path):
+    timeline_arrays = make_timeline_arrays()
+    save_timeline_cache(timeline_arrays, cache_dir, source_path)
+
+    loaded_arrays = load_timeline_cache(cache_dir, source_path)
+
+    assert sorted(loaded_arrays) == sorted(timeline_arrays)
+    for timeline_name, table in timeline_arrays.items():
+        for column_name, column in table.items():
+            loaded_column = loaded_arrays[timeline_name][column_name]
+            np.testing.assert_array_equal(loaded_column, column)
+            assert loaded_column.dtype == column.dtype
+            assert not loaded_column.flags.writeable
+
+    assert isinstance(loaded_arrays["bolus"]["value"], np.memmap)
+    assert len(load_array(os.path.join(cache_dir, "food.time.npy"))) == 0
+
+
+def test_missing_cache_or_source_is_invalid(cache_dir, source_path):
+    assert load_timeline_cache(cache_dir, source_path) is None
+
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path)
+    assert load_timeline_cache(cache_dir, None) is None
+    os.remove(source_path)
+    assert load_timeline_cache(cache_dir, source_path) is None
+
+
+def test_saving_again_replaces_cache(cache_dir, source_path):
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path)
+    save_timeline_cache({"bolus": {"time": np.array([7], dtype=np.int64)}}, cache_dir, source_path)
+
+    assert load_timeline_cache(cache_dir, source_path) == {"bolus": {"time": [7]}}
+    assert sorted(os.listdir(os.path.dirname(cache_dir))) == sorted([TIMELINE_CACHE_DIRNAME, EVENT_DATA_FILENAME])
+
+
+def test_changed_size_invalidates_cache(cache_dir, source_path):
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path)
+    rewrite_keeping_mtime(source_path, "[1, 2, 3, 4]")
+
+    assert not is_timeline_cache_valid(cache_dir, source_path)
+
+
+def test_changed_mtime_invalidates_cache_without_hash(cache_dir, source_path):
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path)
+    stat = os.stat(source_path)
+    os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert not is_timeline_cache_valid(cache_dir, source_path)
+
+
+def test_hash_ignores_mtime_and_detects_same_size_edits(cache_dir, source_path):
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path, use_hash=True)
+    stat = os.stat(source_path)
+    os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert is_timeline_cache_valid(cache_dir, source_path)
+
+    rewrite_keeping_mtime(source_path, "[1, 2, 4]")
+    assert not is_timeline_cache_valid(cache_dir, source_path)
+
+
+def test_same_size_edit_is_missed_without_hash(cache_dir, source_path):
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path)
+    rewrite_keeping_mtime(source_path, "[1, 2, 4]")
+
+    assert is_timeline_cache_valid(cache_dir, source_path)
+
+
+def test_old_cache_version_is_invalid(cache_dir, source_path):
+    save_timeline_cache(make_timeline_arrays(), cache_dir, source_path)
+    meta_path = os.path.join(cache_dir, TIMELINE_CACHE_META_FILENAME)
+    cache_meta = json.load(open(meta_path))
+    cache_meta["version"] -= 1
+    json.dump(cache_meta, open(meta_path, "w"))
+
+    assert not is_timeline_cache_valid(cache_dir, source_path)
+
+
+def test_load_user_does_not_write_cache_by_default(save_dir):
+    load_user_from_files(save_dir)
+
+    assert not os.path.exists(os.path.join(save_dir, TIMELINE_CACHE_DIRNAME))
+
+
+@pytest.mark.parametrize("validate_cache_hash", [False, True])
+def test_load_user_hits_cache(save_dir, events, monkeypatch, validate_cache_hash):
+    parsed_user = load_user_from_files(save_dir, use_cache=True, validate_cache_hash=validate_cache_hash)
+    assert os.path.isdir(os.path.join(save_dir, TIMELINE_CACHE_DIRNAME))
+
+    def fail_parse(*args, **kwargs):
+        raise AssertionError("Parsed instead of loading the cache")
+
+    monkeypatch.setattr(TidepoolUser, "from_event_columns", classmethod(fail_parse))
+    monkeypatch.setattr(make_user, "load_event_columns", fail_parse)
+    cached_user = load_user_from_files(save_dir, use_cache=True)
+
+    assert is_memory_mapped(cached_user.get_timeline("glucose_timeline").times)
+    assert_users_equal(cached_user, parsed_user)
+    assert_users_equal(cached_user, TidepoolUser(events))
+
+
+def test_load_user_rebuilds_stale_cache(save_dir, events):
+    load_user_from_files(save_dir, use_cache=True)
+    edited_events = events[:len(events) // 2]
+    event_data_path = os.path.join(save_dir, EVENT_DATA_FILENAME)
+    json.dump(edited_events, open(event_data_path, "w"))
+
+    user = load_user_from_files(save_dir, use_columns=False, use_cache=True)
+
+    assert_users_equal(user, TidepoolUser(edited_events))
+    assert_users_equal(load_user_from_files(save_dir, use_cache=True), TidepoolUser(edited_events))
+
+
+def test_load_user_from_columns_only_skips_cache(save_dir, events):
+    os.remove(os.path.join(save_dir, EVENT_DATA_FILENAME))
+
+    user = load_user_from_files(save_dir, use_cache=True)
+
+    assert_users_equal(user, TidepoolUser(events))
+    assert not os.path.exists(os.path.join(save_dir, TIMELINE_CACHE_DIRNAME))
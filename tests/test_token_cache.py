@@ -0,0 +1,148 @@
+"""
+Tests for the session token cache and re-login on rejected tokens.
+"""
+
+import os
+import stat
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+from data_science_tidepool_api_python.makedata.tidepool_api import TidepoolAPI
+from data_science_tidepool_api_python.makedata.token_cache import SessionTokenCache, _FileLock
+from data_science_tidepool_api_python.benchmarks.mock_tidepool_server import MockTidepoolServer, MOCK_SESSION_TOKEN
+
+
+API_BASE_URL = "https://api.example.org"
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return os.path.join(str(tmp_path), "tidepool", "session_tokens.json")
+
+
+def get_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def set_tokens(cache_path, process_num, num_tokens):
+    token_cache = SessionTokenCache(path=cache_path)
+    for i in range(num_tokens):
+        token_cache.set(API_BASE_URL, "user{}-{}".format(process_num, i), "token", "user_id")
+
+
+def test_cache_file_is_private(cache_path):
+    SessionTokenCache(path=cache_path).set(API_BASE_URL, "user", "token", "user_id")
+
+    assert get_mode(cache_path) == 0o600
+    assert get_mode(os.path.dirname(cache_path)) == 0o700
+    with open(cache_path) as cache_file:
+        assert "user" not in cache_file.read().replace("user_id", "")
+
+
+def test_tokens_are_shared_through_the_file(cache_path):
+    SessionTokenCache(path=cache_path).set(API_BASE_URL, "user", "token", "user_id")
+    token_cache = SessionTokenCache(path=cache_path)
+
+    assert token_cache.get(API_BASE_URL, "user") == ("token", "user_id")
+    assert token_cache.get(API_BASE_URL, "other") is None
+    assert token_cache.get("https://other.example.org", "user") is None
+
+    SessionTokenCache(path=cache_path).invalidate(API_BASE_URL, "user")
+    assert SessionTokenCache(path=cache_path).get(API_BASE_URL, "user") is None
+
+
+def test_tokens_expire(cache_path):
+    token_cache = SessionTokenCache(path=cache_path, ttl_sec=0.05)
+    token_cache.set(API_BASE_URL, "user", "token", "user_id")
+    assert token_cache.get(API_BASE_URL, "user") == ("token", "user_id")
+
+    time.sleep(0.1)
+    assert token_cache.get(API_BASE_URL, "user") is None
+    assert SessionTokenCache(path=cache_path).get(API_BASE_URL, "user") is None
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    lock_path = os.path.join(str(tmp_path), "tokens.lock")
+    acquired = threading.Event()
+
+    def acquire():
+        with _FileLock(lock_path):
+            acquired.set()
+
+    with _FileLock(lock_path):
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.2)
+
+    thread.join(5)
+    assert acquired.is_set()
+
+
+def test_concurrent_processes_keep_all_tokens(cache_path):
+    num_processes, num_tokens = 4, 10
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=set_tokens, args=(cache_path, process_num, num_tokens))
+                 for process_num in range(num_processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    token_cache = SessionTokenCache(path=cache_path)
+    for process_num in range(num_processes):
+        for i in range(num_tokens):
+            assert token_cache.get(API_BASE_URL, "user{}-{}".format(process_num, i)) == ("token", "user_id")
+
+
+def test_rejected_cached_token_logs_in_again():
+    with MockTidepoolServer(num_users=4, num_days=2) as server:
+        login = server.httpd.login
+        num_logins = [0]
+
+        def count_login(query):
+            num_logins[0] += 1
+            return login(query)
+
+        server.httpd.login = count_login
+
+        token_cache = SessionTokenCache()
+        token_cache.set(server.base_url, "user", "stale-token", "mockobserver")
+        tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url, token_cache=token_cache)
+        tp_api.login()
+        assert num_logins[0] == 0
+
+        user_events = {}
+
+        def download(user_id):
+            user_events[user_id] = tp_api.get_user_event_data(server.start_date, server.end_date,
+                                                              observed_user_id=user_id)
+
+        threads = [threading.Thread(target=download, args=(user_id,)) for user_id in server.user_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tp_api.logout()
+        tp_api.close()
+
+    assert all(events is not None and len(events) > 0 for events in user_events.values())
+    assert len(user_events) == len(server.user_ids)
+    assert num_logins[0] == 1
+    assert token_cache.get(server.base_url, "user") == (MOCK_SESSION_TOKEN, "mockobserver")
+
+
+def test_rejected_token_without_cache_is_not_retried():
+    with MockTidepoolServer(num_users=1, num_days=2) as server:
+        tp_api = TidepoolAPI("user", "pass", api_base_url=server.base_url)
+        tp_api.login()
+        tp_api._login_headers["x-tidepool-session-token"] = "stale-token"
+        num_requests = server.num_requests
+
+        assert tp_api.get_user_event_data(server.start_date, server.end_date,
+                                          observed_user_id=server.user_ids[0]) is None
+        assert server.num_requests == num_requests + 1
+        tp_api.close()